@@ -1,4 +1,9 @@
+import json
+import logging
+import httpx
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 from bddpg import User, UserLogin, UserCreate, get_session_sync
 from schemas import success_response
@@ -6,14 +11,18 @@ from auth import get_current_active_user, require_admin, require_user_or_admin
 from services import DPEServices
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1/dpe", tags=["Diagnostic DPE"])
 
 @router.get("/recent")
-def get_recent_dpes(cp: str, nb_jour: int = 30):
+async def get_recent_dpes(cp: str, nb_jour: int = 30, stream: bool = False, limit: Optional[int] = None):
     
-    """Récupérer tous les dpe depuis une date """
+    """Récupérer tous les dpe depuis une date (stream=true : tous les DPE en NDJSON, au plus `limit`)"""
+    if stream:
+        return await stream_recent_dpes(cp, nb_jour, limit)
     try:
-        dpes = DPEServices.retrieve_recent_dpe_by_cp(cp, nb_jour)
+        dpes = await DPEServices.aretrieve_recent_dpe_by_cp(cp, nb_jour)
         if dpes is None:
             raise HTTPException(status_code=404, detail="Aucun DPE trouvé pour ce code postal")
         return dpes
@@ -22,15 +31,54 @@ def get_recent_dpes(cp: str, nb_jour: int = 30):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Erreur lors de la récupération des utilisateurs")
 
+@router.get("/cache/stats")
+def get_dpe_cache_stats():
+    """Statistiques du cache des réponses ADEME (taux de réponses servies par le cache)"""
+    return DPEServices.cache_stats()
+
+@router.get("/client/stats")
+def get_dpe_client_stats():
+    """Statistiques des appels à l'API ADEME (latences, erreurs, appels en cours)"""
+    return DPEServices.client_stats()
+
 @router.get("/{num_dpe}")
-def get_dpe_by_num(num_dpe: str):
+async def get_dpe_by_num(num_dpe: str):
     """Récupérer un DPE spécifique par son numéro de DPE"""
     try:
-        dpe = DPEServices.retrieve_dpe_by_num_dpe(num_dpe)
+        dpe = await DPEServices.aretrieve_dpe_by_num_dpe(num_dpe)
         if not dpe:
             raise HTTPException(status_code=404, detail="DPE non trouvé")
         return dpe
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) 
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Erreur lors de la récupération du DPE")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Erreur lors de la récupération du DPE")
+
+
+async def stream_recent_dpes(cp: str, nb_jour: int, limit: Optional[int]) -> StreamingResponse:
+    """
+    Renvoie les DPE récents en NDJSON (un DPE par ligne) au fur et à mesure des pages ADEME.
+    La première page est demandée avant de répondre pour renvoyer les erreurs avec le bon statut
+    et le nombre total de DPE dans l'en-tête X-Total-Count.
+    """
+    try:
+        pages = DPEServices.stream_recent_dpe_by_cp(cp, nb_jour, limit)
+        first_page = await anext(pages, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="Erreur lors de la récupération des DPE")
+    total = first_page[0] if first_page else 0
+
+    async def ndjson_lines():
+        if first_page is None:
+            return
+        yield ''.join(json.dumps(dpe, ensure_ascii=False) + '\n' for dpe in first_page[1])
+        try:
+            async for _, results in pages:
+                yield ''.join(json.dumps(dpe, ensure_ascii=False) + '\n' for dpe in results)
+        except httpx.HTTPError as e:
+            # Les en-têtes sont déjà envoyés : le flux s'arrête, X-Total-Count permet de détecter la coupure
+            logger.error(f"Flux des DPE récents interrompu pour {cp}: {e}")
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson", headers={"X-Total-Count": str(total)})
@@ -4,6 +4,7 @@ from .commune import CommuneCRUD, commune_crud
 from .bien_immobilier import BienImmobilierCRUD, bien_immobilier_crud
 from .transaction_dvf import TransactionDVFCRUD, transaction_dvf_crud
 from .dpe import DPECRUD, dpe_crud
+from .ingestion_checkpoint import IngestionCheckpointCRUD, ingestion_checkpoint_crud
 
 __all__ = [
     # Classes CRUD
@@ -11,10 +12,12 @@ __all__ = [
     "BienImmobilierCRUD", 
     "TransactionDVFCRUD",
     "DPECRUD",
+    "IngestionCheckpointCRUD",
     # Instances globales
     "commune_crud",
     "bien_immobilier_crud",
     "transaction_dvf_crud",
     "dpe_crud",
+    "ingestion_checkpoint_crud",
 ]
 
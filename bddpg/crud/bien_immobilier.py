@@ -1,10 +1,18 @@
 # crud/bien_immobilier.py
 from sqlmodel import Session, select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from ..models.bien_immobilier import BienImmobilier, BienImmobilierCreate, BienImmobilierUpdate
+from typing import List, Optional, Tuple
+from ..models.bien_immobilier import (
+    BienImmobilier, BienImmobilierCreate, BienImmobilierUpdate,
+    BIEN_IMMOBILIER_NATURAL_KEY, BIEN_IMMOBILIER_UNIQUE
+)
+from .upsert import insert_on_conflict, UPSERT_BATCH_SIZE
+from .rollup_dirty import mark_biens_dirty
 #from ..models.commune import Commune
 
+# Colonnes lues par les statistiques pré-agrégées : leur modification impose un recalcul de la commune
+ROLLUP_FIELDS = {'surface_reelle_bati', 'type_bien', 'id_commune'}
+
 class BienImmobilierCRUD:
     """Classe CRUD pour les opérations sur les biens immobiliers"""
     
@@ -47,6 +55,38 @@ class BienImmobilierCRUD:
         )
         return session.exec(statement).first()
 
+    def upsert(self, session: Session, bien_data: BienImmobilierCreate) -> Tuple[int, bool]:
+        """
+        Crée un bien immobilier s'il n'existe pas déjà (contrainte d'unicité sur la clé naturelle)
+
+        Returns:
+            tuple: (id_bien du bien créé ou existant, True si le bien a été créé)
+        """
+        result = self.upsert_many(session, [bien_data], with_created=True)
+        return next(iter(result.values()))
+
+    def upsert_many(self, session: Session, biens: List[BienImmobilierCreate], batch_size: int = UPSERT_BATCH_SIZE,
+                    with_created: bool = False) -> dict:
+        """
+        Crée par lots les biens absents et renvoie l'identifiant de chaque bien, créé ou existant
+
+        Returns:
+            dict: {clé naturelle (tuple): id_bien}, ou {clé: (id_bien, créé)} si with_created
+        """
+        rows = insert_on_conflict(
+            session, BienImmobilier, [bien.model_dump() for bien in biens],
+            constraint=BIEN_IMMOBILIER_UNIQUE,
+            key_columns=BIEN_IMMOBILIER_NATURAL_KEY,
+            returning=[BienImmobilier.id_bien],
+            fetch_existing=True,
+            batch_size=batch_size
+        )
+        session.commit()
+        return {
+            tuple(row._mapping[col] for col in BIEN_IMMOBILIER_NATURAL_KEY): (row.id_bien, row.inserted) if with_created else row.id_bien
+            for row in rows
+        }
+
     def get_by_id_commune(self, session: Session, id_commune: str) -> List[BienImmobilier]:
         """Récupère tous les biens d'une commune"""
         statement = select(BienImmobilier).where(
@@ -90,8 +130,13 @@ class BienImmobilierCRUD:
             return None
         
         bien_data = bien_update.model_dump(exclude_unset=True)
+        rollup_changed = ROLLUP_FIELDS & bien_data.keys()
+        if rollup_changed:
+            mark_biens_dirty(session, [id_bien])
         for field, value in bien_data.items():
             setattr(db_bien, field, value)
+        if rollup_changed:
+            mark_biens_dirty(session, [id_bien])
         
         session.add(db_bien)
         session.commit()
@@ -104,6 +149,7 @@ class BienImmobilierCRUD:
         if not db_bien:
             return False
         
+        mark_biens_dirty(session, [id_bien])
         session.delete(db_bien)
         session.commit()
         return True
@@ -1,8 +1,13 @@
 # bddpg/crud/commune.py
 
-from sqlmodel import Session, select
+from sqlmodel import Session, select, func
 from typing import Optional
-from ..models.commune import Commune, CommuneCreate
+from ..models.commune import Commune, CommuneCreate, COMMUNE_NATURAL_KEY, COMMUNE_UNIQUE
+from .upsert import insert_on_conflict, UPSERT_BATCH_SIZE
+from .rollup_dirty import mark_communes_dirty
+
+# Colonnes lues par les statistiques pré-agrégées : leur modification impose un recalcul de la commune
+ROLLUP_FIELDS = {'code_insee_commune', 'code_postal', 'nom_commune'}
 
 class CommuneCRUD:
     
@@ -13,25 +18,29 @@ class CommuneCRUD:
     ) -> Commune:
         """Récupère ou crée une commune"""
         
-        # Chercher sur tous les cvhamps si existe déjà
-        existing = session.exec(
-            select(Commune).where(
-                Commune.code_insee_commune == commune_to_create.code_insee_commune,
-                Commune.code_postal == commune_to_create.code_postal,
-                Commune.nom_commune == commune_to_create.nom_commune  # Comparaison exacte
-            )
-        ).first()
-        
-        if existing:
-            return existing
-        
-        #  Elle n'existe pas => on la crée
-        commune = Commune.model_validate(commune_to_create.model_dump())
-        session.add(commune)
+        # Insertion ou récupération en une requête grâce à la contrainte d'unicité sur tous les champs
+        row = insert_on_conflict(
+            session, Commune, [commune_to_create.model_dump()],
+            constraint=COMMUNE_UNIQUE,
+            key_columns=COMMUNE_NATURAL_KEY,
+            returning=[Commune.id_commune],
+            fetch_existing=True
+        )[0]
         session.commit()
-        session.refresh(commune)
-        
-        return commune
+        return session.get(Commune, row.id_commune)
+
+    @staticmethod
+    def insert_many(session: Session, communes: list[CommuneCreate], batch_size: int = UPSERT_BATCH_SIZE) -> int:
+        """Crée par lots les communes absentes (ON CONFLICT DO NOTHING) et renvoie le nombre de communes créées"""
+        rows = insert_on_conflict(
+            session, Commune, [commune.model_dump() for commune in communes],
+            constraint=COMMUNE_UNIQUE,
+            key_columns=COMMUNE_NATURAL_KEY,
+            returning=[Commune.id_commune],
+            batch_size=batch_size
+        )
+        session.commit()
+        return len(rows)
     
     
     @staticmethod
@@ -55,6 +64,14 @@ class CommuneCRUD:
             select(Commune).where(Commune.code_insee_commune == code_insee, Commune.code_postal == cp)
         ).first()
 
+    @staticmethod
+    def get_id_by_code_insee_and_cp(session: Session) -> list[tuple]:
+        """Récupère tous les couples (code INSEE, code postal) avec le plus petit id_commune associé"""
+        return session.exec(
+            select(Commune.code_insee_commune, Commune.code_postal, func.min(Commune.id_commune))
+            .group_by(Commune.code_insee_commune, Commune.code_postal)
+        ).all()
+
 commune_crud = CommuneCRUD()
 
 
@@ -108,8 +125,11 @@ class CommuneCRUD:
             return None
         
         commune_data = commune_update.model_dump(exclude_unset=True)
+        previous = (db_commune.code_insee_commune, db_commune.code_postal)
         for field, value in commune_data.items():
             setattr(db_commune, field, value)
+        if ROLLUP_FIELDS & commune_data.keys():
+            mark_communes_dirty(session, [previous, (db_commune.code_insee_commune, db_commune.code_postal)])
         
         session.add(db_commune)
         session.commit()
@@ -122,6 +142,7 @@ class CommuneCRUD:
         if not db_commune:
             return False
         
+        mark_communes_dirty(session, [(db_commune.code_insee_commune, db_commune.code_postal)])
         session.delete(db_commune)
         session.commit()
         return True
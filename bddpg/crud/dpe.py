@@ -2,7 +2,12 @@
 from sqlmodel import Session, select
 from typing import List, Optional
 from datetime import date
-from ..models.dpe import DPE, DPECreate, DPEUpdate
+from ..models.dpe import DPE, DPECreate, DPEUpdate, DPE_UNIQUE
+from .upsert import insert_on_conflict, UPSERT_BATCH_SIZE
+from .rollup_dirty import mark_biens_dirty
+
+# Colonnes lues par les statistiques pré-agrégées : leur modification impose un recalcul de la commune
+ROLLUP_FIELDS = {'etiquette_dpe', 'id_bien'}
 
 class DPECRUD:
     """Classe CRUD pour les opérations sur les DPE"""
@@ -33,6 +38,23 @@ class DPECRUD:
         return session.exec(statement).first()
     
     
+    def insert_many(self, session: Session, dpes: List[DPECreate], batch_size: int = UPSERT_BATCH_SIZE) -> int:
+        """
+        Crée par lots les DPE dont le numéro n'existe pas encore (ON CONFLICT DO NOTHING)
+
+        Returns:
+            int: Nombre de DPE créés
+        """
+        rows = insert_on_conflict(
+            session, DPE, [dpe.model_dump() for dpe in dpes],
+            constraint=DPE_UNIQUE,
+            key_columns=['numero_dpe'],
+            returning=[DPE.id_dpe],
+            batch_size=batch_size
+        )
+        session.commit()
+        return len(rows)
+
     def get_by_bien(self, session: Session, id_bien: int) -> List[DPE]:
         """Récupère tous les DPE d'un bien"""
         statement = select(DPE).where(
@@ -122,8 +144,13 @@ class DPECRUD:
             return None
         
         dpe_data = dpe_update.model_dump(exclude_unset=True)
+        rollup_changed = ROLLUP_FIELDS & dpe_data.keys()
+        if rollup_changed:
+            mark_biens_dirty(session, [db_dpe.id_bien])
         for field, value in dpe_data.items():
             setattr(db_dpe, field, value)
+        if rollup_changed:
+            mark_biens_dirty(session, [db_dpe.id_bien])
         
         session.add(db_dpe)
         session.commit()
@@ -136,6 +163,7 @@ class DPECRUD:
         if not db_dpe:
             return False
         
+        mark_biens_dirty(session, [db_dpe.id_bien])
         session.delete(db_dpe)
         session.commit()
         return True
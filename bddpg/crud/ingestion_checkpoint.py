@@ -0,0 +1,93 @@
+# crud/ingestion_checkpoint.py
+from sqlmodel import Session, select
+from typing import List, Optional
+from datetime import datetime
+from ..models.ingestion_checkpoint import IngestionCheckpoint, IngestionCheckpointCreate
+
+# Avancement d'un lot, exécuté avec un curseur DB-API dans la transaction du lot :
+# le point de reprise est validé en même temps que les données du lot.
+RECORD_BATCH_SQL = """
+UPDATE ingestion_checkpoint
+SET last_batch = %(batch)s,
+    next_row = %(next_row)s,
+    rows_inserted = rows_inserted + %(inserted)s,
+    rows_skipped = rows_skipped + %(skipped)s,
+    rows_failed = rows_failed + %(failed)s,
+    updated_at = NOW()
+WHERE file_hash = %(file_hash)s
+"""
+
+
+class IngestionCheckpointCRUD:
+    """Classe CRUD pour le journal de reprise du chargement DVF"""
+
+    def get_by_hash(self, session: Session, file_hash: str) -> Optional[IngestionCheckpoint]:
+        """Récupère le point de reprise d'un fichier par l'empreinte de son contenu"""
+        statement = select(IngestionCheckpoint).where(IngestionCheckpoint.file_hash == file_hash)
+        return session.exec(statement).first()
+
+    def get_or_create(self, session: Session, checkpoint_data: IngestionCheckpointCreate) -> IngestionCheckpoint:
+        """Récupère le point de reprise d'un fichier ou en crée un vierge"""
+        existing = self.get_by_hash(session, checkpoint_data.file_hash)
+        if existing:
+            return existing
+        checkpoint = IngestionCheckpoint.model_validate(checkpoint_data.model_dump())
+        session.add(checkpoint)
+        session.commit()
+        session.refresh(checkpoint)
+        return checkpoint
+
+    def get_all(self, session: Session) -> List[IngestionCheckpoint]:
+        """Récupère tous les points de reprise, du plus récent au plus ancien"""
+        statement = select(IngestionCheckpoint).order_by(IngestionCheckpoint.updated_at.desc())
+        return list(session.exec(statement).all())
+
+    @staticmethod
+    def record_batch(cursor, file_hash: str, batch: int, next_row: int, inserted: int = 0, skipped: int = 0, failed: int = 0) -> None:
+        """Enregistre l'avancement d'un lot dans la transaction courante du curseur (sans commit)"""
+        cursor.execute(RECORD_BATCH_SQL, {
+            'file_hash': file_hash, 'batch': batch, 'next_row': next_row,
+            'inserted': inserted, 'skipped': skipped, 'failed': failed
+        })
+
+    def mark_completed(self, session: Session, file_hash: str) -> Optional[IngestionCheckpoint]:
+        """Marque le chargement d'un fichier comme terminé"""
+        checkpoint = self.get_by_hash(session, file_hash)
+        if not checkpoint:
+            return None
+        checkpoint.completed = True
+        checkpoint.updated_at = datetime.now()
+        session.add(checkpoint)
+        session.commit()
+        session.refresh(checkpoint)
+        return checkpoint
+
+    def reset_progress(self, session: Session, file_hash: str) -> Optional[IngestionCheckpoint]:
+        """Remet l'avancement à zéro : le prochain chargement repartira de la première ligne"""
+        checkpoint = self.get_by_hash(session, file_hash)
+        if not checkpoint:
+            return None
+        checkpoint.last_batch = -1
+        checkpoint.next_row = 0
+        checkpoint.rows_inserted = 0
+        checkpoint.rows_skipped = 0
+        checkpoint.rows_failed = 0
+        checkpoint.completed = False
+        checkpoint.updated_at = datetime.now()
+        session.add(checkpoint)
+        session.commit()
+        session.refresh(checkpoint)
+        return checkpoint
+
+    def delete(self, session: Session, file_hash: str) -> bool:
+        """Supprime le point de reprise d'un fichier (le prochain chargement repartira du début)"""
+        checkpoint = self.get_by_hash(session, file_hash)
+        if not checkpoint:
+            return False
+        session.delete(checkpoint)
+        session.commit()
+        return True
+
+
+# Instance globale
+ingestion_checkpoint_crud = IngestionCheckpointCRUD()
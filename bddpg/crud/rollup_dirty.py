@@ -0,0 +1,49 @@
+# crud/rollup_dirty.py
+
+# Signalement des communes dont les statistiques pré-agrégées (prix_m2_rollup, prix_m2_cube) sont à recalculer
+# après une modification ou une suppression en place : le rafraîchissement incrémental (data_process/price_rollup.py)
+# ne détecte par lui-même que les lignes ajoutées (identifiants au-delà du dernier rafraîchissement).
+# Les insertions sont faites dans la transaction de l'appelant, validées avec la modification.
+
+from sqlmodel import Session, select
+from sqlalchemy.dialects.postgresql import insert
+from typing import Iterable
+from ..models.commune import Commune
+from ..models.bien_immobilier import BienImmobilier
+from ..models.prix_m2_rollup import PrixM2RollupDirty
+
+DIRTY_COLUMNS = ['code_insee_commune', 'code_postal']
+
+
+def mark_communes_dirty(session: Session, communes: Iterable[tuple]) -> None:
+    """
+    Signale des communes à recalculer (sans commit).
+
+    Args:
+        session (Session): Session SQLModel
+        communes (Iterable): Couples (code INSEE, code postal)
+    """
+    rows = [{'code_insee_commune': insee, 'code_postal': cp} for insee, cp in set(communes) if insee and cp]
+    if rows:
+        session.execute(insert(PrixM2RollupDirty).values(rows).on_conflict_do_nothing())
+
+
+def mark_biens_dirty(session: Session, id_biens: Iterable[int]) -> None:
+    """
+    Signale les communes de biens immobiliers à recalculer (sans commit).
+    A appeler avant la modification pour l'état d'origine, et après pour le nouvel état (lu après flush).
+
+    Args:
+        session (Session): Session SQLModel
+        id_biens (Iterable): Identifiants des biens
+    """
+    id_biens = {id_bien for id_bien in id_biens if id_bien is not None}
+    if not id_biens:
+        return
+    communes = (
+        select(Commune.code_insee_commune, Commune.code_postal)
+        .join(BienImmobilier, BienImmobilier.id_commune == Commune.id_commune)
+        .where(BienImmobilier.id_bien.in_(id_biens))
+        .distinct()
+    )
+    session.execute(insert(PrixM2RollupDirty).from_select(DIRTY_COLUMNS, communes).on_conflict_do_nothing())
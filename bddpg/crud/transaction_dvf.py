@@ -1,9 +1,17 @@
 # crud/transaction_dvf.py
 from sqlmodel import Session, select
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import date
 from decimal import Decimal
-from ..models.transaction_dvf import TransactionDVF, TransactionDVFCreate, TransactionDVFUpdate
+from ..models.transaction_dvf import (
+    TransactionDVF, TransactionDVFCreate, TransactionDVFUpdate,
+    TRANSACTION_DVF_NATURAL_KEY, TRANSACTION_DVF_UNIQUE
+)
+from .upsert import insert_on_conflict, UPSERT_BATCH_SIZE
+from .rollup_dirty import mark_biens_dirty
+
+# Colonnes lues par les statistiques pré-agrégées : leur modification impose un recalcul de la commune
+ROLLUP_FIELDS = {'valeur_fonciere', 'id_bien'}
 
 class TransactionDVFCRUD:
     """Classe CRUD pour les opérations sur les transactions DVF"""
@@ -37,6 +45,40 @@ class TransactionDVFCRUD:
         )
         return session.exec(statement).first()
     
+    def upsert(self, session: Session, transaction_data: TransactionDVFCreate) -> Tuple[int, bool]:
+        """
+        Crée une transaction DVF si elle n'existe pas déjà (contrainte d'unicité sur la clé naturelle)
+
+        Returns:
+            tuple: (id_transaction créée ou existante, True si la transaction a été créée)
+        """
+        row = insert_on_conflict(
+            session, TransactionDVF, [transaction_data.model_dump()],
+            constraint=TRANSACTION_DVF_UNIQUE,
+            key_columns=TRANSACTION_DVF_NATURAL_KEY,
+            returning=[TransactionDVF.id_transaction],
+            fetch_existing=True
+        )[0]
+        session.commit()
+        return row.id_transaction, row.inserted
+
+    def insert_many(self, session: Session, transactions: List[TransactionDVFCreate], batch_size: int = UPSERT_BATCH_SIZE) -> int:
+        """
+        Crée par lots les transactions absentes (ON CONFLICT DO NOTHING)
+
+        Returns:
+            int: Nombre de transactions créées
+        """
+        rows = insert_on_conflict(
+            session, TransactionDVF, [transaction.model_dump() for transaction in transactions],
+            constraint=TRANSACTION_DVF_UNIQUE,
+            key_columns=TRANSACTION_DVF_NATURAL_KEY,
+            returning=[TransactionDVF.id_transaction],
+            batch_size=batch_size
+        )
+        session.commit()
+        return len(rows)
+
     def get_by_bien(self, session: Session, id_bien: int) -> List[TransactionDVF]:
         """Récupère toutes les transactions d'un bien"""
         statement = select(TransactionDVF).where(
@@ -95,8 +137,13 @@ class TransactionDVFCRUD:
             return None
         
         transaction_data = transaction_update.model_dump(exclude_unset=True)
+        rollup_changed = ROLLUP_FIELDS & transaction_data.keys()
+        if rollup_changed:
+            mark_biens_dirty(session, [db_transaction.id_bien])
         for field, value in transaction_data.items():
             setattr(db_transaction, field, value)
+        if rollup_changed:
+            mark_biens_dirty(session, [db_transaction.id_bien])
         
         session.add(db_transaction)
         session.commit()
@@ -109,6 +156,7 @@ class TransactionDVFCRUD:
         if not db_transaction:
             return False
         
+        mark_biens_dirty(session, [db_transaction.id_bien])
         session.delete(db_transaction)
         session.commit()
         return True
@@ -0,0 +1,74 @@
+# crud/upsert.py
+
+# Insertions par lots avec INSERT ... ON CONFLICT ON CONSTRAINT ... DO NOTHING RETURNING (PostgreSQL).
+# Le contrôle des doublons est fait par la contrainte d'unicité de la clé naturelle,
+# soit une seule recherche dans l'index pendant l'insertion au lieu d'un SELECT préalable.
+# Les contraintes doivent exister en base (bases antérieures : python -m bddpg.migrate_unique_constraints).
+
+from sqlmodel import Session
+from sqlalchemy import and_, or_, select, true, false
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Optional
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def insert_on_conflict(
+    session: Session,
+    model,
+    rows: List[dict],
+    constraint: str,
+    key_columns: List[str],
+    returning: Optional[list] = None,
+    fetch_existing: bool = False,
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> list:
+    """
+    Insère des lignes par lots en ignorant celles dont la clé naturelle existe déjà (ON CONFLICT DO NOTHING).
+
+    Sans fetch_existing, seules les lignes créées sont renvoyées.
+    Avec fetch_existing, les lignes déjà présentes sont relues par un SELECT sur leur clé (une requête par lot,
+    seulement s'il y en a), sans réécrire la ligne existante. Chaque ligne renvoyée porte les colonnes de la clé
+    et la colonne `inserted` (True si la ligne vient d'être créée).
+    Aucun commit n'est fait : la transaction reste à la charge de l'appelant.
+
+    Args:
+        session (Session): Session SQLModel
+        model: Modèle de table SQLModel
+        rows (list): Lignes à insérer (dictionnaires colonne -> valeur)
+        constraint (str): Nom de la contrainte d'unicité
+        key_columns (list): Colonnes de la clé naturelle (doublons retirés de chaque lot)
+        returning (list): Colonnes à renvoyer
+        fetch_existing (bool): Renvoyer aussi les lignes déjà présentes
+        batch_size (int): Nombre de lignes par requête
+
+    Returns:
+        list: Lignes renvoyées
+    """
+    # Une même requête ne doit pas contenir deux fois la même clé
+    unique_rows = list({tuple(row.get(col) for col in key_columns): row for row in rows}.values())
+    columns = list(returning or [])
+    names = {column.key for column in columns}
+    columns += [model.__table__.c[col] for col in key_columns if col not in names]
+
+    results = []
+    for start in range(0, len(unique_rows), batch_size):
+        batch = unique_rows[start:start + batch_size]
+        statement = insert(model).values(batch).on_conflict_do_nothing(constraint=constraint)
+        inserted = session.execute(statement.returning(*columns, true().label("inserted"))).all()
+        results.extend(inserted)
+        if not fetch_existing or len(inserted) == len(batch):
+            continue
+
+        # Lignes déjà présentes : relecture par la clé (= ou IS NULL, utilisables par l'index)
+        inserted_keys = {tuple(row._mapping[col] for col in key_columns) for row in inserted}
+        existing = [row for row in batch if tuple(row.get(col) for col in key_columns) not in inserted_keys]
+        conditions = [
+            and_(*[
+                model.__table__.c[col].is_(None) if row.get(col) is None else model.__table__.c[col] == row.get(col)
+                for col in key_columns
+            ])
+            for row in existing
+        ]
+        results.extend(session.execute(select(*columns, false().label("inserted")).where(or_(*conditions))).all())
+    return results
@@ -0,0 +1,106 @@
+# bddpg/migrate_unique_constraints.py
+
+# Migration ponctuelle des bases existantes (créées avant les contraintes d'unicité sur les clés naturelles,
+# ou restaurées avec restore_pgsql.sh) : create_db_and_tables (SQLModel.metadata.create_all) n'ajoute pas
+# de contrainte à une table qui existe déjà, or les insertions ON CONFLICT ON CONSTRAINT en ont besoin.
+# Pour chaque table, les doublons de la clé naturelle sont fusionnés (les références des tables filles
+# sont reportées sur la ligne conservée, celle de plus petit identifiant), puis la contrainte est ajoutée.
+# Le script est idempotent : une contrainte déjà présente n'est pas recréée.
+#
+# A lancer une fois, avant les chargements (fill_communes, fill_dvf...) :
+#     python -m bddpg.migrate_unique_constraints
+
+import logging
+from .database import engine
+from .models.commune import COMMUNE_NATURAL_KEY, COMMUNE_UNIQUE
+from .models.bien_immobilier import BIEN_IMMOBILIER_NATURAL_KEY, BIEN_IMMOBILIER_UNIQUE
+from .models.transaction_dvf import TRANSACTION_DVF_NATURAL_KEY, TRANSACTION_DVF_UNIQUE
+from .models.dpe import DPE_UNIQUE
+
+logger = logging.getLogger(__name__)
+
+# Dans l'ordre : la fusion des communes peut créer des biens en double, celle des biens des transactions en double
+MIGRATIONS = [
+    {
+        'table': 'commune', 'id': 'id_commune', 'key': COMMUNE_NATURAL_KEY, 'constraint': COMMUNE_UNIQUE,
+        'nulls_not_distinct': False, 'children': [('bien_immobilier', 'id_commune')]
+    },
+    {
+        'table': 'bien_immobilier', 'id': 'id_bien', 'key': BIEN_IMMOBILIER_NATURAL_KEY, 'constraint': BIEN_IMMOBILIER_UNIQUE,
+        'nulls_not_distinct': True, 'children': [('transaction_dvf', 'id_bien'), ('dpe', 'id_bien')]
+    },
+    {
+        'table': 'transaction_dvf', 'id': 'id_transaction', 'key': TRANSACTION_DVF_NATURAL_KEY,
+        'constraint': TRANSACTION_DVF_UNIQUE, 'nulls_not_distinct': True, 'children': [('dvf_fingerprint', 'id_transaction')]
+    },
+    {
+        'table': 'dpe', 'id': 'id_dpe', 'key': ['numero_dpe'], 'constraint': DPE_UNIQUE,
+        'nulls_not_distinct': False, 'children': []
+    },
+]
+
+CONSTRAINT_EXISTS_SQL = "SELECT 1 FROM pg_constraint WHERE conname = %s"
+
+# Correspondance ancien identifiant -> identifiant conservé pour chaque ligne en double
+# (les NULL sont regroupés par PARTITION BY, comme avec NULLS NOT DISTINCT)
+CREATE_DEDUP_MAP_SQL = """
+CREATE TEMP TABLE dedup_map ON COMMIT DROP AS
+SELECT old_id, new_id
+FROM (
+    SELECT {id} AS old_id, MIN({id}) OVER (PARTITION BY {key}) AS new_id
+    FROM {table}
+    {where}
+) d
+WHERE old_id <> new_id
+"""
+
+REPOINT_CHILDREN_SQL = "UPDATE {child} c SET {fk} = m.new_id FROM dedup_map m WHERE c.{fk} = m.old_id"
+DELETE_DUPLICATES_SQL = "DELETE FROM {table} t USING dedup_map m WHERE t.{id} = m.old_id"
+ADD_CONSTRAINT_SQL = "ALTER TABLE {table} ADD CONSTRAINT {constraint} UNIQUE {nulls} ({key})"
+
+
+def migrate_unique_constraints() -> dict:
+    """
+    Fusionne les doublons des clés naturelles et ajoute les contraintes d'unicité manquantes,
+    table par table (une transaction par table).
+
+    Returns:
+        dict: Nombre de doublons supprimés par table (None si la contrainte existait déjà)
+    """
+    report = {}
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for migration in MIGRATIONS:
+            table = migration['table']
+            cursor.execute(CONSTRAINT_EXISTS_SQL, (migration['constraint'],))
+            if cursor.fetchone():
+                logger.info(f"{table} : contrainte {migration['constraint']} déjà présente")
+                report[table] = None
+                continue
+
+            key = ', '.join(migration['key'])
+            # Sans NULLS NOT DISTINCT, les lignes dont la clé est NULL ne sont pas des doublons
+            where = "" if migration['nulls_not_distinct'] else "WHERE " + " AND ".join(f"{col} IS NOT NULL" for col in migration['key'])
+            cursor.execute(CREATE_DEDUP_MAP_SQL.format(id=migration['id'], key=key, table=table, where=where))
+            for child, fk in migration['children']:
+                cursor.execute(REPOINT_CHILDREN_SQL.format(child=child, fk=fk))
+            cursor.execute(DELETE_DUPLICATES_SQL.format(table=table, id=migration['id']))
+            report[table] = cursor.rowcount
+            cursor.execute(ADD_CONSTRAINT_SQL.format(
+                table=table, constraint=migration['constraint'], key=key,
+                nulls="NULLS NOT DISTINCT" if migration['nulls_not_distinct'] else ""
+            ))
+            connection.commit()
+            logger.info(f"{table} : {report[table]} doublons fusionnés, contrainte {migration['constraint']} ajoutée")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    migrate_unique_constraints()
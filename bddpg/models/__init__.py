@@ -14,6 +14,12 @@ from .transaction_dvf import (
 from .dpe import (
     DPE, DPEBase, DPECreate, DPERead, DPEUpdate, DPEReadWithBien
 )
+from .dvf_fingerprint import DVFFingerprint
+from .dpe_ademe import DPEAdeme, DPEAdemeHarvest
+from .prix_m2_rollup import PrixM2Rollup, PrixM2Cube, PrixM2RollupState, PrixM2RollupDirty
+from .ingestion_checkpoint import (
+    IngestionCheckpoint, IngestionCheckpointBase, IngestionCheckpointCreate, IngestionCheckpointRead
+)
 
 from .user import User, UserLogin, UserCreate, UserResponse, Token
 
@@ -29,6 +35,14 @@ __all__ = [
     "TransactionDVFRead", "TransactionDVFUpdate", "TransactionDVFReadWithBien",
     # DPE
     "DPE", "DPEBase", "DPECreate", "DPERead", "DPEUpdate", "DPEReadWithBien",
+    # Copie locale ADEME
+    "DPEAdeme", "DPEAdemeHarvest",
+    # Statistiques de prix pré-agrégées
+    "PrixM2Rollup", "PrixM2Cube", "PrixM2RollupState", "PrixM2RollupDirty",
+    # DVF fingerprint
+    "DVFFingerprint",
+    # Ingestion checkpoint
+    "IngestionCheckpoint", "IngestionCheckpointBase", "IngestionCheckpointCreate", "IngestionCheckpointRead",
     # User
     "User", "UserLogin", "UserCreate", "UserResponse", "Token"
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 # models/bien_immobilier.py
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import UniqueConstraint
 from typing import Optional, List, TYPE_CHECKING
 from datetime import date
 
@@ -8,6 +9,13 @@ if TYPE_CHECKING:
     from .transaction_dvf import TransactionDVF
     from .dpe import DPE
 
+# Clé naturelle d'un bien : unicité garantie par la base (les NULL sont considérés égaux, PostgreSQL >= 15)
+BIEN_IMMOBILIER_NATURAL_KEY = [
+    'id_commune', 'adresse_normalisee', 'reference_cadastrale_parcelle', 'type_bien',
+    'surface_reelle_bati', 'nombre_pieces_principales', 'surface_terrain_totale'
+]
+BIEN_IMMOBILIER_UNIQUE = "uq_bien_immobilier_cle_naturelle"
+
 class BienImmobilierBase(SQLModel):
     """Classe de base pour BienImmobilier"""
     id_commune: Optional[int] = Field(default=None,foreign_key="commune.id_commune")
@@ -23,6 +31,9 @@ class BienImmobilierBase(SQLModel):
 class BienImmobilier(BienImmobilierBase, table=True):
     """Modèle BienImmobilier pour la base de données"""
     __tablename__ = "bien_immobilier"
+    __table_args__ = (
+        UniqueConstraint(*BIEN_IMMOBILIER_NATURAL_KEY, name=BIEN_IMMOBILIER_UNIQUE, postgresql_nulls_not_distinct=True),
+    )
     
     id_bien: Optional[int] = Field(default=None, primary_key=True)
     
@@ -1,11 +1,16 @@
 # bddpg/models/commune.py
 
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import UniqueConstraint
 from typing import Optional, List, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .bien_immobilier import BienImmobilier
 
+# Clé naturelle d'une commune : une ligne par (code INSEE, code postal, nom)
+COMMUNE_NATURAL_KEY = ['code_insee_commune', 'code_postal', 'nom_commune']
+COMMUNE_UNIQUE = "uq_commune_cle_naturelle"
+
 class CommuneBase(SQLModel):
     """Classe de base pour Commune"""
     code_insee_commune: str = Field(max_length=10, index=True)
@@ -15,6 +20,7 @@ class CommuneBase(SQLModel):
 class Commune(CommuneBase, table=True):
     """Modèle Commune simplifié avec redondance acceptable"""
     __tablename__ = "commune"
+    __table_args__ = (UniqueConstraint(*COMMUNE_NATURAL_KEY, name=COMMUNE_UNIQUE),)
     
     id_commune: Optional[int] = Field(default=None, primary_key=True)  # PK auto-générée
     
@@ -1,11 +1,15 @@
 # models/dpe.py
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import UniqueConstraint
 from typing import Optional, TYPE_CHECKING
 from datetime import date
 
 if TYPE_CHECKING:
     from .bien_immobilier import BienImmobilier
 
+# Un DPE est identifié par son numéro ADEME
+DPE_UNIQUE = "uq_dpe_numero_dpe"
+
 class DPEBase(SQLModel):
     """Classe de base pour DPE"""
     id_bien: Optional[int] = Field(default=None, foreign_key="bien_immobilier.id_bien")
@@ -23,6 +27,7 @@ class DPEBase(SQLModel):
 class DPE(DPEBase, table=True):
     """Modèle DPE pour la base de données"""
     __tablename__ = "dpe"
+    __table_args__ = (UniqueConstraint('numero_dpe', name=DPE_UNIQUE),)
     
     id_dpe: Optional[int] = Field(default=None, primary_key=True)
     
@@ -0,0 +1,46 @@
+# models/dpe_ademe.py
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import date, datetime
+
+# Colonnes de l'API ADEME copiées dans dpe_ademe (data_process/dpe_mirror.py, services/dpe_services.py)
+MIRROR_COLUMNS = [
+    'numero_dpe',
+    'date_etablissement_dpe',
+    'etiquette_dpe',
+    'etiquette_ges',
+    'adresse_ban',
+    'identifiant_ban',
+    'surface_habitable_logement',
+    'adresse_brut',
+    'code_postal_brut',
+    'score_ban'
+]
+
+
+class DPEAdeme(SQLModel, table=True):
+    """
+    Copie locale du jeu de données ADEME dpe03existant (colonnes utiles à l'enrichissement).
+    Alimentée par data_process/dpe_mirror.py ; les biens DVF y sont rapprochés par identifiant BAN en SQL.
+    """
+    __tablename__ = "dpe_ademe"
+
+    numero_dpe: str = Field(primary_key=True, max_length=50)
+    date_etablissement_dpe: Optional[date] = Field(default=None, index=True)
+    etiquette_dpe: Optional[str] = Field(default=None, max_length=5)
+    etiquette_ges: Optional[str] = Field(default=None, max_length=5)
+    adresse_ban: Optional[str] = Field(default=None)
+    identifiant_ban: Optional[str] = Field(default=None, max_length=50, index=True)
+    surface_habitable_logement: Optional[float] = Field(default=None)
+    adresse_brut: Optional[str] = Field(default=None)
+    code_postal_brut: Optional[str] = Field(default=None, max_length=10)
+    score_ban: Optional[float] = Field(default=None)
+
+
+class DPEAdemeHarvest(SQLModel, table=True):
+    """Journal de la copie locale : une ligne par date d'établissement récupérée"""
+    __tablename__ = "dpe_ademe_harvest"
+
+    date_etablissement_dpe: date = Field(primary_key=True)
+    nb_dpe: int = Field(default=0)
+    harvested_at: datetime = Field(default_factory=datetime.now)
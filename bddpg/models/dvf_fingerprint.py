@@ -0,0 +1,18 @@
+# models/dvf_fingerprint.py
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger
+from typing import Optional
+
+
+class DVFFingerprint(SQLModel, table=True):
+    """
+    Empreinte de chaque ligne DVF chargée, pour le chargement incrémental (delta) des nouvelles publications.
+    row_key : empreinte de la clé naturelle de la ligne (clé de transaction DVF)
+    content_hash : empreinte de l'ensemble des colonnes nettoyées
+    """
+    __tablename__ = "dvf_fingerprint"
+
+    source: str = Field(primary_key=True, max_length=100)  # Fichier d'origine, ex. ValeursFoncieres-2023
+    row_key: int = Field(primary_key=True, sa_type=BigInteger)
+    content_hash: int = Field(sa_type=BigInteger)
+    id_transaction: Optional[int] = Field(default=None, foreign_key="transaction_dvf.id_transaction", index=True)
@@ -0,0 +1,40 @@
+# models/ingestion_checkpoint.py
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class IngestionCheckpointBase(SQLModel):
+    """Classe de base pour IngestionCheckpoint"""
+    file_name: str = Field(max_length=255)
+    batch_size: int = Field(gt=0)
+    last_batch: int = Field(default=-1)  # -1 : aucun lot validé
+    next_row: int = Field(default=0)  # Première ligne (du DataFrame nettoyé) restant à traiter
+    rows_inserted: int = Field(default=0)
+    rows_skipped: int = Field(default=0)
+    rows_failed: int = Field(default=0)
+    completed: bool = Field(default=False)
+
+
+class IngestionCheckpoint(IngestionCheckpointBase, table=True):
+    """
+    Journal de reprise du chargement d'un fichier DVF, identifié par l'empreinte SHA-256 de son contenu
+    et de la version du nettoyage (voir data_process/dvf_bulk.checkpoint_key)
+    """
+    __tablename__ = "ingestion_checkpoint"
+
+    file_hash: str = Field(primary_key=True, max_length=64)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class IngestionCheckpointCreate(SQLModel):
+    """Schéma pour la création d'un point de reprise"""
+    file_hash: str = Field(max_length=64)
+    file_name: str = Field(max_length=255)
+    batch_size: int = Field(gt=0)
+
+
+class IngestionCheckpointRead(IngestionCheckpointBase):
+    """Schéma pour la lecture d'un point de reprise"""
+    file_hash: str
+    updated_at: datetime
@@ -0,0 +1,66 @@
+# models/prix_m2_rollup.py
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+# Largeur des tranches de surface de prix_m2_cube (m²) : la tranche t contient les surfaces de t à t + SURFACE_BUCKET - 1
+SURFACE_BUCKET = 5
+
+
+class PrixM2Rollup(SQLModel, table=True):
+    """
+    Statistiques pré-agrégées du prix au m² (transactions DVF avec DPE) par commune, code postal,
+    type de bien et étiquette DPE. Alimentée par data_process/price_rollup.py, lue par les évaluations.
+    Les sommes sont additives : la moyenne et l'écart-type de plusieurs lignes se déduisent des sommes.
+    """
+    __tablename__ = "prix_m2_rollup"
+
+    code_insee_commune: str = Field(primary_key=True, max_length=10)
+    code_postal: str = Field(primary_key=True, max_length=5, index=True)
+    type_bien: str = Field(primary_key=True, max_length=50)
+    etiquette_dpe: str = Field(primary_key=True, max_length=5)  # '' si non renseignée
+    nom_commune: str = Field(max_length=255)
+    nb_transactions: int = Field(default=0)
+    somme_prix_m2: float = Field(default=0)
+    somme_prix_m2_carre: float = Field(default=0)
+    prix_m2_min: Optional[float] = Field(default=None)
+    prix_m2_max: Optional[float] = Field(default=None)
+
+
+class PrixM2RollupState(SQLModel, table=True):
+    """Dernières transactions et derniers DPE pris en compte par les tables prix_m2_rollup et prix_m2_cube (une seule ligne)"""
+    __tablename__ = "prix_m2_rollup_state"
+
+    id: int = Field(default=1, primary_key=True)
+    last_id_transaction: int = Field(default=0)
+    last_id_dpe: int = Field(default=0)
+    refreshed_at: datetime = Field(default_factory=datetime.now)
+
+
+class PrixM2RollupDirty(SQLModel, table=True):
+    """Communes dont des transactions ont été supprimées depuis le dernier rafraîchissement des statistiques pré-agrégées"""
+    __tablename__ = "prix_m2_rollup_dirty"
+
+    code_insee_commune: str = Field(primary_key=True, max_length=10)
+    code_postal: str = Field(primary_key=True, max_length=5)
+
+
+class PrixM2Cube(SQLModel, table=True):
+    """
+    Mêmes statistiques que PrixM2Rollup, détaillées par tranche de surface (tranche_surface = borne basse en m²,
+    tranches de largeur SURFACE_BUCKET). Une fourchette de surfaces alignée sur
+    les tranches est obtenue en additionnant les lignes des tranches.
+    """
+    __tablename__ = "prix_m2_cube"
+
+    code_insee_commune: str = Field(primary_key=True, max_length=10)
+    code_postal: str = Field(primary_key=True, max_length=5, index=True)
+    type_bien: str = Field(primary_key=True, max_length=50)
+    etiquette_dpe: str = Field(primary_key=True, max_length=5)  # '' si non renseignée
+    tranche_surface: int = Field(primary_key=True)
+    nom_commune: str = Field(max_length=255)
+    nb_transactions: int = Field(default=0)
+    somme_prix_m2: float = Field(default=0)
+    somme_prix_m2_carre: float = Field(default=0)
+    prix_m2_min: Optional[float] = Field(default=None)
+    prix_m2_max: Optional[float] = Field(default=None)
@@ -1,5 +1,6 @@
 # models/transaction_dvf.py
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import UniqueConstraint
 from typing import Optional, TYPE_CHECKING
 from datetime import date
 
@@ -8,6 +9,10 @@ from datetime import date
 if TYPE_CHECKING:
     from .bien_immobilier import BienImmobilier
 
+# Clé naturelle d'une transaction : unicité garantie par la base (les NULL sont considérés égaux)
+TRANSACTION_DVF_NATURAL_KEY = ['id_bien', 'date_mutation', 'nature_mutation', 'valeur_fonciere']
+TRANSACTION_DVF_UNIQUE = "uq_transaction_dvf_cle_naturelle"
+
 class TransactionDVFBase(SQLModel):
     """Classe de base pour TransactionDVF"""
     id_bien: int = Field(foreign_key="bien_immobilier.id_bien")
@@ -18,6 +23,9 @@ class TransactionDVFBase(SQLModel):
 class TransactionDVF(TransactionDVFBase, table=True):
     """Modèle TransactionDVF pour la base de données"""
     __tablename__ = "transaction_dvf"
+    __table_args__ = (
+        UniqueConstraint(*TRANSACTION_DVF_NATURAL_KEY, name=TRANSACTION_DVF_UNIQUE, postgresql_nulls_not_distinct=True),
+    )
     
     id_transaction: Optional[int] = Field(default=None, primary_key=True)
     
@@ -0,0 +1,18 @@
+# common/__init__.py
+
+# Outils partagés par le pipeline d'ingestion (data_process) et l'API (services) :
+# les importer ne charge pas data_process (configuration des logs, dépendances du pipeline).
+
+from .metrics import StageStats, PipelineMetrics, pipeline_metrics
+from .http_client import HttpClient, http_client
+from .rate_limiter import TokenBucket, AsyncTokenBucket
+
+__all__ = [
+    'StageStats',
+    'PipelineMetrics',
+    'pipeline_metrics',
+    'HttpClient',
+    'http_client',
+    'TokenBucket',
+    'AsyncTokenBucket'
+]
@@ -0,0 +1,157 @@
+# common/http_client.py
+
+# Client HTTP partagé pour tous les appels sortants (API BAN, API ADEME, scraping Wikipedia, services de l'API).
+# Une seule session requests avec un pool de connexions par hôte (keep-alive) : les appels successifs
+# vers un même hôte réutilisent la connexion TCP/TLS au lieu de refaire la négociation à chaque requête.
+# Délais d'attente par défaut sur toutes les requêtes, retentatives avec délai exponentiel
+# pour les méthodes idempotentes, et compteurs par hôte (requêtes, erreurs, retentatives, latences,
+# connexions ouvertes / réutilisées).
+
+import time
+import random
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from typing import Optional
+from .metrics import StageStats
+
+logger = logging.getLogger(__name__)
+
+# (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_POOL_CONNECTIONS = 10  # Nombre d'hôtes dont le pool est conservé
+DEFAULT_POOL_MAXSIZE = 32  # Connexions conservées par hôte (>= nombre de threads concurrents)
+DEFAULT_MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class HttpClient:
+    """
+    Client HTTP avec pools de connexions par hôte, délais d'attente et retentatives.
+    La session est partagée entre threads (les pools de connexions urllib3 sont thread-safe).
+    """
+
+    def __init__(self, timeout: tuple = DEFAULT_TIMEOUT, max_retries: int = DEFAULT_MAX_RETRIES,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        # Les retentatives sont gérées ici (et non par urllib3) pour être comptées et désactivables par appel
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._retries = {}
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, timeout=None, **kwargs) -> requests.Response:
+        """
+        Envoie une requête en réutilisant les connexions ouvertes vers l'hôte.
+        Les méthodes idempotentes sont retentées sur erreur réseau, délai dépassé et réponses 429 / 5xx
+        (en respectant l'en-tête Retry-After) ; la dernière réponse est renvoyée telle quelle.
+
+        Parameters:
+            method (str): Méthode HTTP
+            url (str): URL appelée
+            retries (int): Nombre de retentatives (par défaut max_retries ; 0 si l'appelant gère ses propres retentatives)
+            timeout: Délai d'attente (secondes ou tuple (connexion, lecture)), DEFAULT_TIMEOUT par défaut
+            **kwargs: Paramètres transmis à requests (params, data, files, headers...)
+
+        Returns:
+            requests.Response: La réponse (le statut n'est pas vérifié)
+
+        Raises:
+            requests.RequestException: Erreur réseau ou délai dépassé après toutes les retentatives
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        max_retries = self.max_retries if retries is None else retries
+        if method not in IDEMPOTENT_METHODS:
+            max_retries = 0
+
+        for attempt in range(max_retries + 1):
+            delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(host, time.perf_counter() - start, error=True, retry=attempt < max_retries)
+                if attempt == max_retries:
+                    raise
+                time.sleep(delay)
+                continue
+
+            retry = response.status_code in RETRY_STATUS and attempt < max_retries
+            self._record(host, time.perf_counter() - start, error=not response.ok, retry=retry)
+            if not retry:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.info(f"{host} : {response.status_code} pour {method} {url}, nouvelle tentative dans {delay:.1f} s")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Requête GET (voir request)"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """Requête POST, sans retentative (voir request)"""
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, host: str, seconds: float, error: bool, retry: bool) -> None:
+        with self._lock:
+            self._hosts.setdefault(host, StageStats()).add(seconds, error=error)
+            self._retries[host] = self._retries.get(host, 0) + int(retry)
+
+    def _connection_counts(self) -> dict:
+        """Connexions ouvertes et requêtes envoyées par hôte, lues dans les pools urllib3"""
+        counts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port not in (80, 443) else pool.host
+            opened, sent = counts.get(host, (0, 0))
+            counts[host] = (opened + pool.num_connections, sent + pool.num_requests)
+        return counts
+
+    def stats(self) -> dict:
+        """
+        Compteurs par hôte : requêtes, erreurs, retentatives, latences (p50/p95/p99),
+        connexions ouvertes et requêtes servies par une connexion réutilisée.
+
+        Returns:
+            dict: {hôte: compteurs}
+        """
+        connections = self._connection_counts()
+        with self._lock:
+            hosts = {host: (stats.summary(), self._retries.get(host, 0)) for host, stats in self._hosts.items()}
+        result = {}
+        for host, (summary, retries) in sorted(hosts.items()):
+            opened, sent = connections.get(host, (0, 0))
+            result[host] = {
+                "requests": summary["calls"],
+                "errors": summary["errors"],
+                "retries": retries,
+                "connections_opened": opened,
+                "connections_reused": max(sent - opened, 0),
+                "wall_seconds": summary["wall_seconds"],
+                "p50_ms": summary["p50_ms"],
+                "p95_ms": summary["p95_ms"],
+                "p99_ms": summary["p99_ms"],
+            }
+        return result
+
+    def close(self) -> None:
+        """Ferme les connexions du pool"""
+        self.session.close()
+
+
+# Instance globale
+http_client = HttpClient()
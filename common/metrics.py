@@ -0,0 +1,197 @@
+# common/metrics.py
+
+# Instrumentation du pipeline d'ingestion : temps, nombre d'appels, lignes/s et latences (p50/p95/p99)
+# par étape et par API externe, plus le pic de mémoire (RSS) du processus.
+# Le résumé est émis en JSON dans les logs et ajouté (une ligne JSON par émission) au fichier PIPELINE_METRICS_PATH.
+
+import sys
+import math
+import json
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from config import PIPELINE_METRICS_PATH
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux émissions périodiques (secondes)
+DEFAULT_EMIT_INTERVAL = 60
+# Nombre maximal de durées conservées par étape pour le calcul des percentiles (échantillon aléatoire uniforme)
+RESERVOIR_SIZE = 1024
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus en Mo (None si indisponible)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    """Percentile par rang le plus proche sur une liste triée"""
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+class StageStats:
+    """
+    Mesures d'une étape : nombre d'appels, durée cumulée et maximale, lignes traitées et erreurs.
+    Les percentiles sont estimés sur un échantillon borné de RESERVOIR_SIZE durées (reservoir sampling),
+    la mémoire reste donc constante quel que soit le nombre d'appels (processus de longue durée).
+    """
+
+    def __init__(self, reservoir_size: int = RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self.reservoir = []
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.errors = 0
+
+    def add(self, seconds: float, rows: int = 0, error: bool = False) -> None:
+        """Enregistre un appel (l'appelant protège l'accès s'il est partagé entre threads)"""
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        self.errors += int(error)
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(seconds)
+        else:
+            # Chaque durée a une probabilité reservoir_size / calls d'être conservée
+            slot = random.randrange(self.calls)
+            if slot < self.reservoir_size:
+                self.reservoir[slot] = seconds
+
+    def summary(self) -> dict:
+        durations = sorted(self.reservoir)
+        total = self.total_seconds
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "wall_seconds": round(total, 3),
+            "rows_per_second": round(self.rows / total, 1) if total > 0 else None,
+            "p50_ms": round(_percentile(durations, 50) * 1000, 2) if durations else None,
+            "p95_ms": round(_percentile(durations, 95) * 1000, 2) if durations else None,
+            "p99_ms": round(_percentile(durations, 99) * 1000, 2) if durations else None,
+            "max_ms": round(self.max_seconds * 1000, 2) if self.calls else None,
+        }
+
+
+class PipelineMetrics:
+    """
+    Collecteur de mesures partagé entre threads.
+    Les étapes sont nommées librement, par convention "etape" ou "api.<service>.<appel>".
+    """
+
+    def __init__(self, output_path: Optional[str] = PIPELINE_METRICS_PATH, emit_interval: float = DEFAULT_EMIT_INTERVAL):
+        self.output_path = output_path
+        self.emit_interval = emit_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Remet les compteurs à zéro"""
+        with self._lock:
+            self._stages = {}
+            self._started_at = time.time()
+            self._last_emit = time.monotonic()
+
+    def record(self, name: str, seconds: float, rows: int = 0, error: bool = False) -> None:
+        """
+        Enregistre un appel d'une étape.
+
+        Parameters:
+            name (str): Nom de l'étape
+            seconds (float): Durée de l'appel
+            rows (int): Nombre de lignes traitées
+            error (bool): L'appel a échoué
+        """
+        with self._lock:
+            self._stages.setdefault(name, StageStats()).add(seconds, rows, error)
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """
+        Mesure la durée du bloc et l'enregistre sous `name` (en erreur si le bloc lève une exception).
+
+        Exemple:
+            with pipeline_metrics.stage("copy_staging", rows=len(df)):
+                ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(name, time.perf_counter() - start, rows, error=True)
+            raise
+        self.record(name, time.perf_counter() - start, rows)
+
+    def summary(self, **context) -> dict:
+        """
+        Résumé des mesures.
+
+        Parameters:
+            **context: Champs ajoutés au résumé (ex. file="ValeursFoncieres-2023.txt")
+
+        Returns:
+            dict: Résumé sérialisable en JSON
+        """
+        with self._lock:
+            stages = {name: stats.summary() for name, stats in sorted(self._stages.items())}
+            elapsed = time.time() - self._started_at
+        return {
+            **context,
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "elapsed_seconds": round(elapsed, 2),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+
+    def emit(self, reset: bool = False, **context) -> dict:
+        """
+        Emet le résumé en JSON (log + fichier JSON lines).
+
+        Parameters:
+            reset (bool): Remettre les compteurs à zéro après l'émission (ex. à la fin d'un fichier)
+            **context: Champs ajoutés au résumé
+
+        Returns:
+            dict: Le résumé émis
+        """
+        summary = self.summary(**context)
+        line = json.dumps(summary, ensure_ascii=False)
+        logger.info(f"Mesures du pipeline : {line}")
+        if self.output_path:
+            try:
+                with open(self.output_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                logger.warning(f"Impossible d'écrire les mesures dans {self.output_path}: {e}")
+        if reset:
+            self.reset()
+        else:
+            self._last_emit = time.monotonic()
+        return summary
+
+    def maybe_emit(self, **context) -> Optional[dict]:
+        """Emet le résumé si emit_interval secondes se sont écoulées depuis la dernière émission (longs traitements)"""
+        if time.monotonic() - self._last_emit < self.emit_interval:
+            return None
+        return self.emit(periodic=True, **context)
+
+
+# Instance globale
+pipeline_metrics = PipelineMetrics()
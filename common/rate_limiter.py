@@ -0,0 +1,81 @@
+# common/rate_limiter.py
+
+# Limiteur de débit "token bucket" partagé entre threads,
+# utilisé pour respecter les quotas des API externes (ex. ADEME : 600 requêtes / 60 secondes),
+# et sa variante asynchrone pour les routes FastAPI `async def`.
+
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Seau à jetons : `capacity` jetons au maximum, rechargés à `rate` jetons par seconde.
+    Chaque requête consomme un jeton ; acquire() bloque tant qu'aucun jeton n'est disponible.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_quota(cls, max_requests: int, period: float, burst: int = 10) -> "TokenBucket":
+        """
+        Construit un seau qui ne dépasse jamais `max_requests` sur une fenêtre glissante de `period` secondes.
+
+        Parameters:
+            max_requests (int): Nombre maximal de requêtes sur la période
+            period (float): Durée de la période en secondes
+            burst (int): Nombre de requêtes pouvant partir d'un coup
+
+        Returns:
+            TokenBucket: le limiteur
+        """
+        # Sur une fenêtre de `period` secondes : burst + rate * period <= max_requests
+        return cls(rate=(max_requests - burst) / period, capacity=burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self) -> float:
+        """
+        Tente de consommer un jeton.
+
+        Returns:
+            float: 0 si le jeton est obtenu, sinon le temps d'attente estimé en secondes
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Consomme un jeton, en attendant si nécessaire"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+
+class AsyncTokenBucket(TokenBucket):
+    """
+    Seau à jetons pour une boucle d'événements asyncio : acquire() attend sans bloquer la boucle.
+    Construit comme TokenBucket (ex. AsyncTokenBucket.from_quota(600, 60)).
+    """
+
+    async def acquire(self) -> None:
+        """Consomme un jeton, en attendant si nécessaire"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 # Path
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = os.path.join(BASE_DIR, "data")
+GEOCODE_CACHE_PATH = os.path.join(DATA_DIR, "geocode_cache.sqlite")  # Cache persistant des géocodages BAN
+DVF_STAGING_DIR = os.path.join(DATA_DIR, "staging")  # Cache Parquet des fichiers DVF nettoyés
+PIPELINE_METRICS_PATH = os.path.join(DATA_DIR, "pipeline_metrics.jsonl")  # Mesures du pipeline d'ingestion (JSON lines)
 
 # Loading environment variables
 load_dotenv(os.path.join(BASE_DIR, ".env"), override=True)
@@ -25,6 +28,11 @@ NEO4J_USER = os.getenv("NEO4J_USER")  # Exemple : un utilisateur dédié à votr
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")  # Assurez-vous d'utiliser un mot de passe sécurisé
 
 
+# API ADEME : quota de 600 requêtes par intervalle de 60 secondes (pipeline et API)
+ADEME_MAX_REQUESTS = 600
+ADEME_PERIOD = 60
+
+
 #FastAPI
 
 API_TITLE = "conseil immo"
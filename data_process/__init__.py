@@ -5,4 +5,5 @@ from .utils import *
 from .fill_communes import fill_communes
 from .fill_dvf import fill_dvf
 from .fill_graphe import fill_graphe
-
+from .dpe_mirror import harvest_dpe_mirror, backfill_dpe_mirror
+from .price_rollup import refresh_price_rollup
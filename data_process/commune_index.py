@@ -0,0 +1,70 @@
+# data_process/commune_index.py
+
+# Dimension commune chargée en mémoire pour l'ingestion DVF.
+# La table commune (~39 000 lignes) est lue une seule fois par chargement ; la correspondance
+# (code INSEE, code postal) -> id_commune est ensuite faite sur le DataFrame entier par jointure,
+# au lieu d'un SELECT par transaction.
+
+import logging
+import pandas as pd
+from typing import Optional
+from sqlmodel import Session
+from bddpg import engine, commune_crud
+
+logger = logging.getLogger(__name__)
+
+
+class CommuneIndex:
+    """
+    Correspondance (code INSEE, code postal) -> id_commune.
+    Comme pour le chargement en masse, le plus petit id_commune est retenu si un couple apparaît plusieurs fois.
+    """
+
+    def __init__(self, rows):
+        self.frame = pd.DataFrame(rows, columns=['code_insee_commune', 'code_postal', 'id_commune']).astype(
+            {'code_insee_commune': object, 'code_postal': object, 'id_commune': 'int64'}
+        )
+        self._ids = dict(zip(zip(self.frame['code_insee_commune'], self.frame['code_postal']), self.frame['id_commune']))
+
+    @classmethod
+    def load(cls) -> "CommuneIndex":
+        """
+        Charge la dimension commune depuis PostgreSQL.
+
+        Returns:
+            CommuneIndex: l'index chargé
+        """
+        with Session(engine) as session:
+            index = cls(commune_crud.get_id_by_code_insee_and_cp(session))
+        logger.info(f"Dimension commune chargée en mémoire : {len(index)} couples (code INSEE, code postal)")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, code_insee: str, code_postal: str) -> Optional[int]:
+        """
+        Recherche l'id_commune d'un couple (code INSEE, code postal).
+
+        Returns:
+            int: l'id_commune ou None si le couple est inconnu
+        """
+        return self._ids.get((code_insee, code_postal))
+
+    def join(self, df: pd.DataFrame, code_insee_col: str = 'code_insee_commune', code_postal_col: str = 'Code postal') -> pd.DataFrame:
+        """
+        Ajoute la colonne id_commune au DataFrame par jointure sur (code INSEE, code postal).
+
+        Parameters:
+            df (pd.DataFrame): DataFrame DVF nettoyé
+            code_insee_col (str): Colonne du code INSEE
+            code_postal_col (str): Colonne du code postal
+
+        Returns:
+            pd.DataFrame: DataFrame avec la colonne id_commune (Int64, <NA> si la commune est inconnue), index conservé
+        """
+        keys = pd.MultiIndex.from_arrays([df[code_insee_col].astype(object), df[code_postal_col].astype(object)])
+        lookup = self.frame.set_index(['code_insee_commune', 'code_postal'])['id_commune']
+        df = df.copy()
+        df['id_commune'] = pd.array(lookup.reindex(keys).to_numpy(), dtype='Int64')
+        return df
@@ -0,0 +1,255 @@
+# data_process/dpe_mirror.py
+
+# Copie locale du jeu de données ADEME dpe03existant (table dpe_ademe).
+# Les DPE sont récupérés date d'établissement par date d'établissement, plusieurs dates en parallèle
+# (quota ADEME partagé via le token bucket de dpe_enrichment), en suivant les liens `next` de l'API.
+# Chaque page est écrite dès réception (générateur dpe_stream.iter_dpe_pages_by_date) :
+# COPY dans une table temporaire puis insertion ensembliste.
+# Les biens DVF sont ensuite rapprochés des DPE par une jointure SQL sur l'identifiant BAN
+# (voir dvf_bulk, dpe_source='mirror'), sans appel HTTP par bien.
+# Pour une reprise d'historique (plusieurs mois), backfill_dpe_mirror récupère la période par tranches
+# en parallèle au lieu de suivre les liens `next` date par date.
+
+import io
+import time
+import logging
+import pandas as pd
+from datetime import date, timedelta
+from collections import Counter
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from bddpg import engine
+from bddpg.models.dpe_ademe import MIRROR_COLUMNS
+from common.metrics import pipeline_metrics
+from data_process.external_api.dpe_stream import iter_dpe_pages_by_date
+from data_process.external_api.dpe_shards import iter_sharded_dpe_pages
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# Reprise d'historique : requêtes simultanées sur les tranches (débit borné par le quota ADEME)
+DEFAULT_SHARD_WORKERS = 8
+# Les DPE sont publiés avec retard : les dates récentes sont toujours récupérées à nouveau
+REFRESH_DAYS = 15
+
+CREATE_STAGING_MIRROR_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS staging_dpe_ademe (
+    numero_dpe VARCHAR(50),
+    date_etablissement_dpe DATE,
+    etiquette_dpe VARCHAR(5),
+    etiquette_ges VARCHAR(5),
+    adresse_ban TEXT,
+    identifiant_ban VARCHAR(50),
+    surface_habitable_logement DOUBLE PRECISION,
+    adresse_brut TEXT,
+    code_postal_brut VARCHAR(10),
+    score_ban DOUBLE PRECISION
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_MIRROR_SQL = f"COPY staging_dpe_ademe ({', '.join(MIRROR_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Un DPE déjà copié est mis à jour (l'ADEME peut corriger une ligne publiée)
+UPSERT_MIRROR_SQL = f"""
+INSERT INTO dpe_ademe ({', '.join(MIRROR_COLUMNS)})
+SELECT DISTINCT ON (s.numero_dpe) {', '.join('s.' + col for col in MIRROR_COLUMNS)}
+FROM staging_dpe_ademe s
+WHERE s.numero_dpe IS NOT NULL
+ORDER BY s.numero_dpe
+ON CONFLICT (numero_dpe) DO UPDATE SET
+{', '.join(f'{col} = EXCLUDED.{col}' for col in MIRROR_COLUMNS[1:])}
+"""
+
+RECORD_HARVEST_SQL = """
+INSERT INTO dpe_ademe_harvest (date_etablissement_dpe, nb_dpe, harvested_at)
+VALUES (%s, %s, NOW())
+ON CONFLICT (date_etablissement_dpe) DO UPDATE
+SET nb_dpe = EXCLUDED.nb_dpe, harvested_at = EXCLUDED.harvested_at
+"""
+
+SELECT_HARVESTED_SQL = """
+SELECT date_etablissement_dpe
+FROM dpe_ademe_harvest
+WHERE date_etablissement_dpe BETWEEN %s AND %s
+AND harvested_at::date > date_etablissement_dpe + %s
+"""
+
+
+def copy_dpe_page(cursor, results: list) -> int:
+    """
+    Ecrit une page de DPE dans dpe_ademe (COPY puis insertion ou mise à jour).
+
+    Parameters:
+        cursor: Curseur psycopg2 (la transaction est validée par l'appelant)
+        results (list): Lignes renvoyées par l'API ADEME
+
+    Returns:
+        int: Nombre de DPE insérés ou mis à jour
+    """
+    if not results:
+        return 0
+    df_page = pd.DataFrame.from_records(results).reindex(columns=MIRROR_COLUMNS)
+    # Le code postal brut peut être renvoyé comme un nombre par l'API
+    df_page['code_postal_brut'] = df_page['code_postal_brut'].astype('string').str[:10]
+    for col in ['etiquette_dpe', 'etiquette_ges']:
+        df_page[col] = df_page[col].astype('string').str[:5]
+
+    buffer = io.StringIO()
+    df_page.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_STAGING_MIRROR_SQL, buffer)
+    cursor.execute(UPSERT_MIRROR_SQL)
+    return cursor.rowcount
+
+
+def harvest_dpe_date(date_etablissement: str) -> int:
+    """
+    Copie dans dpe_ademe tous les DPE établis à une date, page par page (liens `next` de l'API).
+    La date n'est inscrite au journal dpe_ademe_harvest qu'une fois toutes les pages écrites.
+
+    Parameters:
+        date_etablissement (str): Date d'établissement au format 'YYYY-MM-DD'
+
+    Returns:
+        int: Nombre de DPE écrits
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée (les pages déjà écrites sont conservées)
+    """
+    start_time = time.time()
+    nb_dpe = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(CREATE_STAGING_MIRROR_SQL)
+        connection.commit()
+        for page in iter_dpe_pages_by_date(date_etablissement):
+            with pipeline_metrics.stage('dpe_mirror.copy_page', rows=len(page['results'])):
+                nb_dpe += copy_dpe_page(cursor, page['results'])
+                connection.commit()
+
+        cursor.execute(RECORD_HARVEST_SQL, (date_etablissement, nb_dpe))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info(f"{date_etablissement} : {nb_dpe} DPE copiés en {(time.time() - start_time):.2f} s")
+    return nb_dpe
+
+
+def _dates_to_harvest(start_date: date, end_date: date, refresh: bool) -> list:
+    """Dates de la période restant à récupérer (hors dates déjà copiées au moins REFRESH_DAYS jours après)"""
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    if refresh:
+        return dates
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(SELECT_HARVESTED_SQL, (start_date, end_date, REFRESH_DAYS))
+        harvested = {row[0] for row in cursor.fetchall()}
+    finally:
+        connection.close()
+    return [day for day in dates if day not in harvested]
+
+
+def harvest_dpe_mirror(start_date: str, end_date: Optional[str] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                       refresh: bool = False) -> dict:
+    """
+    Met à jour la copie locale des DPE ADEME sur une période, plusieurs dates en parallèle.
+    Les dates déjà copiées sont ignorées, sauf les REFRESH_DAYS jours suivant leur date d'établissement
+    (publication tardive) ou si refresh est vrai.
+
+    Parameters:
+        start_date (str): Première date d'établissement ('YYYY-MM-DD')
+        end_date (str): Dernière date d'établissement incluse (par défaut : aujourd'hui)
+        max_workers (int): Nombre de dates récupérées simultanément
+        refresh (bool): Récupérer à nouveau toutes les dates de la période
+
+    Returns:
+        dict: {date: nombre de DPE copiés} pour les dates traitées (None si la date est en erreur)
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date) if end_date else date.today()
+    dates = _dates_to_harvest(start, end, refresh)
+    logger.info(f"Copie locale ADEME : {len(dates)} dates à récupérer entre {start} et {end} ({max_workers} en parallèle)")
+
+    start_time = time.time()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(harvest_dpe_date, day.isoformat()): day.isoformat() for day in dates}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                results[day] = future.result()
+            except requests.RequestException as e:
+                # La date n'est pas inscrite au journal : elle sera reprise au prochain lancement
+                results[day] = None
+                logger.error(f"Erreur lors de la copie des DPE du {day}: {e}")
+
+    nb_dpe = sum(count for count in results.values() if count)
+    nb_errors = sum(count is None for count in results.values())
+    logger.info(
+        f"Copie locale ADEME terminée en {(time.time() - start_time):.2f} s : "
+        f"{nb_dpe} DPE copiés, {nb_errors} dates en erreur"
+    )
+    pipeline_metrics.emit(reset=True, job='dpe_mirror', dpe=nb_dpe)
+    return dict(sorted(results.items()))
+
+
+def backfill_dpe_mirror(start_date: str, end_date: Optional[str] = None,
+                        max_workers: int = DEFAULT_SHARD_WORKERS) -> int:
+    """
+    Remplit la copie locale sur une longue période (reprise d'historique) par tranches de moins de 10 000 DPE
+    récupérées en parallèle (voir external_api/dpe_shards.py). Les pages sont écrites dès réception par un seul
+    écrivain ; les dates de la période ne sont inscrites au journal qu'une fois toutes les pages écrites,
+    sauf celles qui n'ont pas pu être récupérées en entier (reprises par un prochain harvest_dpe_mirror).
+
+    Parameters:
+        start_date (str): Première date d'établissement ('YYYY-MM-DD')
+        end_date (str): Dernière date d'établissement incluse (par défaut : aujourd'hui)
+        max_workers (int): Nombre de requêtes simultanées
+
+    Returns:
+        int: Nombre de DPE écrits
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée (les pages déjà écrites sont conservées)
+    """
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date) if end_date else date.today()
+    start_time = time.time()
+    nb_dpe = 0
+    counts_by_date = Counter()
+    incomplete_days = set()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(CREATE_STAGING_MIRROR_SQL)
+        connection.commit()
+        for results in iter_sharded_dpe_pages(start.isoformat(), end.isoformat(), max_workers=max_workers,
+                                              incomplete_days=incomplete_days):
+            with pipeline_metrics.stage('dpe_mirror.copy_page', rows=len(results)):
+                nb_dpe += copy_dpe_page(cursor, results)
+                connection.commit()
+            counts_by_date.update(dpe.get('date_etablissement_dpe') for dpe in results)
+
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        days = [day for day in days if day not in incomplete_days]
+        if incomplete_days:
+            logger.warning(f"{len(incomplete_days)} journées incomplètes non inscrites au journal : "
+                           f"{', '.join(sorted(day.isoformat() for day in incomplete_days))}")
+        cursor.executemany(RECORD_HARVEST_SQL, [(day, counts_by_date[day.isoformat()]) for day in days])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    logger.info(f"Reprise d'historique ADEME du {start} au {end} : {nb_dpe} DPE copiés en {(time.time() - start_time):.2f} s")
+    pipeline_metrics.emit(reset=True, job='dpe_mirror_backfill', dpe=nb_dpe)
+    return nb_dpe
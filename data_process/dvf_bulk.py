@@ -0,0 +1,534 @@
+# data_process/dvf_bulk.py
+
+# Chargement en masse des transactions DVF dans PostgreSQL.
+# Les lignes nettoyées sont copiées par lots (COPY FROM STDIN) dans une table temporaire,
+# puis les biens et les transactions sont insérés de manière ensembliste depuis cette table,
+# dans la même transaction SQL que le lot.
+# Les DPE des biens du lot sont ensuite récupérés en parallèle (quota ADEME respecté)
+# et insérés en une seule fois dans une seconde transaction, ou, avec dpe_source='mirror',
+# rapprochés de la copie locale dpe_ademe par une jointure SQL dans la transaction du lot.
+
+import io
+import os
+import hashlib
+import time
+import logging
+import pandas as pd
+from typing import Optional
+from sqlmodel import Session
+from bddpg import engine
+from bddpg import IngestionCheckpointCreate, ingestion_checkpoint_crud
+from bddpg.models.bien_immobilier import BIEN_IMMOBILIER_UNIQUE
+from bddpg.models.transaction_dvf import TRANSACTION_DVF_UNIQUE
+from bddpg.models.dpe import DPE_UNIQUE
+from data_process.utils import file_sha256
+from common.metrics import pipeline_metrics
+from data_process.external_api import retrieve_id_ban_batch, retrieve_dpe_by_identifiants_ban
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Colonnes de la table temporaire alimentée par COPY (dans l'ordre du COPY)
+STAGING_COLUMNS = [
+    'code_insee_commune',
+    'code_postal',
+    'adresse_normalisee',
+    'reference_cadastrale_parcelle',
+    'type_bien',
+    'surface_reelle_bati',
+    'nombre_pieces_principales',
+    'surface_terrain_totale',
+    'date_mutation',
+    'nature_mutation',
+    'valeur_fonciere',
+    'id_ban',
+    'row_key',
+    'content_hash'
+]
+
+# La table temporaire est vidée automatiquement à chaque commit (un lot = une transaction)
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS staging_dvf (
+    code_insee_commune VARCHAR(10),
+    code_postal VARCHAR(5),
+    adresse_normalisee TEXT,
+    reference_cadastrale_parcelle VARCHAR(50),
+    type_bien VARCHAR(50),
+    surface_reelle_bati INTEGER,
+    nombre_pieces_principales INTEGER,
+    surface_terrain_totale INTEGER,
+    date_mutation DATE,
+    nature_mutation VARCHAR(50),
+    valeur_fonciere INTEGER,
+    id_ban VARCHAR(50),
+    row_key BIGINT,
+    content_hash BIGINT,
+    id_commune INTEGER,
+    id_bien INTEGER
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_SQL = f"COPY staging_dvf ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Résolution des communes : une seule commune par couple (code INSEE, code postal)
+RESOLVE_COMMUNE_SQL = """
+UPDATE staging_dvf s
+SET id_commune = c.id_commune
+FROM (
+    SELECT code_insee_commune, code_postal, MIN(id_commune) AS id_commune
+    FROM commune
+    GROUP BY code_insee_commune, code_postal
+) c
+WHERE c.code_insee_commune = s.code_insee_commune
+AND c.code_postal = s.code_postal
+"""
+
+# Création des biens absents de la base : les doublons sont écartés par la contrainte d'unicité
+# de la clé naturelle (NULLS NOT DISTINCT)
+INSERT_BIENS_SQL = f"""
+INSERT INTO bien_immobilier (
+    id_commune, adresse_normalisee, reference_cadastrale_parcelle, type_bien,
+    surface_reelle_bati, nombre_pieces_principales, surface_terrain_totale, source_info_principale
+)
+SELECT DISTINCT
+    s.id_commune, s.adresse_normalisee, s.reference_cadastrale_parcelle, s.type_bien,
+    s.surface_reelle_bati, s.nombre_pieces_principales, s.surface_terrain_totale, 'DVF'
+FROM staging_dvf s
+WHERE s.id_commune IS NOT NULL
+ON CONFLICT ON CONSTRAINT {BIEN_IMMOBILIER_UNIQUE} DO NOTHING
+"""
+
+# Récupération des id_bien (nouveaux ou existants) pour toutes les lignes du lot.
+# Les colonnes de la clé pouvant être NULL, elles sont comparées avec IS NOT DISTINCT FROM, qu'un index btree
+# ne sait pas utiliser : seul le préfixe id_commune de l'index de la clé naturelle sert à la jointure,
+# les autres colonnes sont filtrées parmi les biens de la commune.
+RESOLVE_BIENS_SQL = """
+UPDATE staging_dvf s
+SET id_bien = b.id_bien
+FROM bien_immobilier b
+WHERE b.id_commune = s.id_commune
+AND b.adresse_normalisee IS NOT DISTINCT FROM s.adresse_normalisee
+AND b.reference_cadastrale_parcelle IS NOT DISTINCT FROM s.reference_cadastrale_parcelle
+AND b.type_bien IS NOT DISTINCT FROM s.type_bien
+AND b.surface_reelle_bati IS NOT DISTINCT FROM s.surface_reelle_bati
+AND b.nombre_pieces_principales IS NOT DISTINCT FROM s.nombre_pieces_principales
+AND b.surface_terrain_totale IS NOT DISTINCT FROM s.surface_terrain_totale
+"""
+
+INSERT_TRANSACTIONS_SQL = f"""
+INSERT INTO transaction_dvf (id_bien, date_mutation, nature_mutation, valeur_fonciere)
+SELECT DISTINCT s.id_bien, s.date_mutation, s.nature_mutation, s.valeur_fonciere
+FROM staging_dvf s
+WHERE s.id_bien IS NOT NULL
+ON CONFLICT ON CONSTRAINT {TRANSACTION_DVF_UNIQUE} DO NOTHING
+"""
+
+# Empreintes des lignes du lot (chargement incrémental) : les lignes non chargées (commune inconnue...)
+# sont aussi enregistrées, sans transaction, pour ne pas être retentées à chaque delta
+RECORD_FINGERPRINTS_SQL = """
+INSERT INTO dvf_fingerprint (source, row_key, content_hash, id_transaction)
+SELECT DISTINCT ON (s.row_key) %(source)s, s.row_key, s.content_hash, t.id_transaction
+FROM staging_dvf s
+LEFT JOIN transaction_dvf t
+    ON t.id_bien = s.id_bien
+    AND t.date_mutation = s.date_mutation
+    AND t.nature_mutation IS NOT DISTINCT FROM s.nature_mutation
+    AND t.valeur_fonciere = s.valeur_fonciere
+WHERE s.row_key IS NOT NULL
+ORDER BY s.row_key, t.id_transaction
+ON CONFLICT (source, row_key) DO UPDATE
+SET content_hash = EXCLUDED.content_hash, id_transaction = EXCLUDED.id_transaction
+"""
+
+# Un identifiant BAN peut correspondre à plusieurs biens (immeuble) : les DPE sont rattachés au premier
+BIENS_BY_BAN_SQL = """
+SELECT id_ban, MIN(id_bien)
+FROM staging_dvf
+WHERE id_ban IS NOT NULL AND id_bien IS NOT NULL
+GROUP BY id_ban
+"""
+
+DPE_COLUMNS = [
+    'id_bien',
+    'numero_dpe',
+    'date_etablissement_dpe',
+    'etiquette_dpe',
+    'etiquette_ges',
+    'adresse_ban',
+    'identifiant_ban',
+    'surface_habitable_logement',
+    'adresse_brut',
+    'code_postal_brut',
+    'score_ban'
+]
+
+CREATE_STAGING_DPE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS staging_dpe (
+    id_bien INTEGER,
+    numero_dpe VARCHAR(50),
+    date_etablissement_dpe DATE,
+    etiquette_dpe VARCHAR(5),
+    etiquette_ges VARCHAR(5),
+    adresse_ban VARCHAR(255),
+    identifiant_ban VARCHAR(50),
+    surface_habitable_logement DOUBLE PRECISION,
+    adresse_brut VARCHAR(255),
+    code_postal_brut VARCHAR(10),
+    score_ban DOUBLE PRECISION
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_DPE_SQL = f"COPY staging_dpe ({', '.join(DPE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+INSERT_DPE_SQL = f"""
+INSERT INTO dpe ({', '.join(DPE_COLUMNS)})
+SELECT DISTINCT ON (s.numero_dpe) {', '.join('s.' + col for col in DPE_COLUMNS)}
+FROM staging_dpe s
+WHERE s.numero_dpe IS NOT NULL
+AND s.date_etablissement_dpe IS NOT NULL
+ORDER BY s.numero_dpe, s.id_bien
+ON CONFLICT ON CONSTRAINT {DPE_UNIQUE} DO NOTHING
+"""
+
+
+# Rapprochement avec la copie locale des DPE ADEME (data_process/dpe_mirror.py), mêmes règles que BIENS_BY_BAN_SQL
+INSERT_DPE_FROM_MIRROR_SQL = f"""
+INSERT INTO dpe ({', '.join(DPE_COLUMNS)})
+SELECT
+    b.id_bien, m.numero_dpe, m.date_etablissement_dpe, m.etiquette_dpe, m.etiquette_ges,
+    LEFT(m.adresse_ban, 255), m.identifiant_ban, m.surface_habitable_logement,
+    LEFT(m.adresse_brut, 255), m.code_postal_brut, m.score_ban
+FROM (
+    SELECT id_ban, MIN(id_bien) AS id_bien
+    FROM staging_dvf
+    WHERE id_ban IS NOT NULL AND id_bien IS NOT NULL
+    GROUP BY id_ban
+) b
+JOIN dpe_ademe m ON m.identifiant_ban = b.id_ban
+WHERE m.date_etablissement_dpe IS NOT NULL
+ON CONFLICT ON CONSTRAINT {DPE_UNIQUE} DO NOTHING
+"""
+
+# Origine des DPE rattachés aux biens
+DPE_SOURCE_API = 'api'
+DPE_SOURCE_MIRROR = 'mirror'
+
+
+def prepare_staging_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Prépare les lignes d'un lot au format de la table temporaire staging_dvf.
+    Les clés du bien sont lues dans les colonnes précalculées par compute_dvf_keys.
+    Les contrôles faits par les modèles Pydantic (valeurs positives) sont appliqués sur les colonnes entières.
+
+    Parameters:
+        df (pd.DataFrame): Lot du DataFrame DVF nettoyé
+
+    Returns:
+        pd.DataFrame: DataFrame aux colonnes STAGING_COLUMNS
+    """
+    staging = pd.DataFrame({
+        'code_insee_commune': df['code_insee_commune'],
+        'code_postal': df['Code postal'],
+        'adresse_normalisee': df['adresse_normalisee'],
+        'reference_cadastrale_parcelle': df['reference_cadastrale_parcelle'],
+        'type_bien': df['Type local'],
+        'surface_reelle_bati': df['Surface reelle bati'],
+        'nombre_pieces_principales': df['Nombre pieces principales'],
+        'surface_terrain_totale': df['Surface terrain'],
+        'date_mutation': pd.to_datetime(df['Date mutation']).dt.strftime('%Y-%m-%d'),
+        'nature_mutation': df['Nature mutation'],
+        'valeur_fonciere': df['Valeur fonciere'],
+        'id_ban': df['id_ban'] if 'id_ban' in df.columns else None,
+        'row_key': df['row_key'] if 'row_key' in df.columns else None,
+        'content_hash': df['content_hash'] if 'content_hash' in df.columns else None
+    })
+
+    # Equivalent des contraintes ge=0 / gt=0 des modèles
+    valid = (
+        staging['code_insee_commune'].notna()
+        & (staging['valeur_fonciere'] > 0)
+        & (staging['surface_reelle_bati'] >= 0)
+        & (staging['nombre_pieces_principales'] >= 0)
+        & (staging['surface_terrain_totale'] >= 0)
+    )
+    return staging[valid]
+
+
+def copy_to_staging(cursor, staging: pd.DataFrame) -> None:
+    """
+    Copie un lot dans la table temporaire staging_dvf avec COPY FROM STDIN.
+
+    Parameters:
+        cursor: Curseur psycopg2
+        staging (pd.DataFrame): Lot au format STAGING_COLUMNS
+    """
+    buffer = io.StringIO()
+    # En CSV, une valeur vide non quotée est interprétée comme NULL par PostgreSQL
+    staging.to_csv(buffer, columns=STAGING_COLUMNS, header=False, index=False)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_STAGING_SQL, buffer)
+
+
+def load_batch(cursor, df_batch: pd.DataFrame, source: Optional[str] = None, link_mirror_dpe: bool = False) -> dict:
+    """
+    Enregistre un lot de lignes DVF (biens et transactions) à partir de la table temporaire.
+
+    Parameters:
+        cursor: Curseur psycopg2 (la transaction est validée par l'appelant)
+        df_batch (pd.DataFrame): Lot du DataFrame DVF nettoyé
+        source (str): Fichier d'origine ; si fourni, les empreintes row_key/content_hash du lot sont enregistrées
+        link_mirror_dpe (bool): Rattache les DPE de la copie locale dpe_ademe aux biens du lot (jointure sur id_ban)
+
+    Returns:
+        dict: Compteurs du lot (staged, skipped, biens, transactions, dpe) et correspondance biens_by_ban
+    """
+    with pipeline_metrics.stage('bulk.prepare_staging', rows=len(df_batch)):
+        staging = prepare_staging_rows(df_batch)
+    with pipeline_metrics.stage('bulk.copy_staging', rows=len(staging)):
+        copy_to_staging(cursor, staging)
+
+    with pipeline_metrics.stage('bulk.resolve_commune', rows=len(staging)):
+        cursor.execute(RESOLVE_COMMUNE_SQL)
+        cursor.execute("SELECT COUNT(*) FROM staging_dvf WHERE id_commune IS NULL")
+        sans_commune = cursor.fetchone()[0]
+
+    with pipeline_metrics.stage('bulk.insert_biens', rows=len(staging)):
+        cursor.execute(INSERT_BIENS_SQL)
+        nb_biens = cursor.rowcount
+        cursor.execute(RESOLVE_BIENS_SQL)
+    with pipeline_metrics.stage('bulk.insert_transactions', rows=len(staging)):
+        cursor.execute(INSERT_TRANSACTIONS_SQL)
+        nb_transactions = cursor.rowcount
+    if source and 'row_key' in df_batch.columns:
+        with pipeline_metrics.stage('bulk.record_fingerprints', rows=len(staging)):
+            cursor.execute(RECORD_FINGERPRINTS_SQL, {'source': source})
+
+    nb_dpe = 0
+    biens_by_ban = {}
+    if link_mirror_dpe:
+        with pipeline_metrics.stage('bulk.insert_dpe_mirror', rows=len(staging)):
+            cursor.execute(INSERT_DPE_FROM_MIRROR_SQL)
+            nb_dpe = cursor.rowcount
+    else:
+        # La table temporaire est vidée au commit : on récupère avant les biens à enrichir
+        cursor.execute(BIENS_BY_BAN_SQL)
+        biens_by_ban = dict(cursor.fetchall())
+
+    return {
+        'staged': len(staging),
+        'skipped': (len(df_batch) - len(staging)) + sans_commune,
+        'biens': nb_biens,
+        'transactions': nb_transactions,
+        'dpe': nb_dpe,
+        'biens_by_ban': biens_by_ban
+    }
+
+
+def insert_dpe_batch(cursor, dpes_by_ban: dict, biens_by_ban: dict) -> int:
+    """
+    Insère en une fois les DPE récupérés pour un lot (COPY puis insertion des DPE inconnus).
+
+    Parameters:
+        cursor: Curseur psycopg2 (la transaction est validée par l'appelant)
+        dpes_by_ban (dict): {identifiant_ban: liste des DPE} renvoyé par retrieve_dpe_by_identifiants_ban
+        biens_by_ban (dict): {identifiant_ban: id_bien}
+
+    Returns:
+        int: Nombre de DPE insérés
+    """
+    # Le code postal brut peut être renvoyé comme un nombre par l'API
+    records = [
+        {
+            **dpe,
+            'id_bien': biens_by_ban[id_ban],
+            'code_postal_brut': str(dpe['code_postal_brut']) if dpe.get('code_postal_brut') is not None else None
+        }
+        for id_ban, dpes in dpes_by_ban.items()
+        for dpe in dpes
+    ]
+    if not records:
+        return 0
+
+    df_dpe = pd.DataFrame.from_records(records).reindex(columns=DPE_COLUMNS)
+    for col in ['adresse_ban', 'adresse_brut']:
+        df_dpe[col] = df_dpe[col].astype('string').str[:255]
+    df_dpe['code_postal_brut'] = df_dpe['code_postal_brut'].str[:10]
+
+    with pipeline_metrics.stage('bulk.insert_dpe', rows=len(df_dpe)):
+        buffer = io.StringIO()
+        df_dpe.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(COPY_STAGING_DPE_SQL, buffer)
+        cursor.execute(INSERT_DPE_SQL)
+        return cursor.rowcount
+
+
+def load_dvf_to_PG_bulk(df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE, enrich_dpe: bool = True,
+                        file_hash: Optional[str] = None, start_row: int = 0, source: Optional[str] = None,
+                        dpe_source: str = DPE_SOURCE_API) -> dict:
+    """
+    Enregistre le DataFrame DVF dans PostgreSQL par lots (COPY + insertions ensemblistes).
+    Chaque lot est validé dans sa propre transaction ; un lot en erreur est annulé et ignoré.
+    Si enrich_dpe est vrai, les adresses du lot sont géocodées (BAN) et les DPE correspondants
+    sont récupérés en parallèle puis insérés après la validation du lot (dpe_source='api'),
+    ou rapprochés de la copie locale dpe_ademe dans la transaction du lot (dpe_source='mirror').
+    Si file_hash est fourni, l'avancement est enregistré dans ingestion_checkpoint dans la même transaction que le lot.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame contenant les données DVF nettoyées
+        batch_size (int): Nombre de lignes par lot
+        enrich_dpe (bool): Géocodage BAN et ajout des DPE
+        file_hash (str): Empreinte du fichier source pour le journal de reprise
+        start_row (int): Position (iloc) de la première ligne à traiter, multiple de batch_size
+        source (str): Fichier d'origine pour l'enregistrement des empreintes (colonnes row_key/content_hash)
+        dpe_source (str): 'api' (appels ADEME par identifiant BAN) ou 'mirror' (copie locale dpe_ademe)
+
+    Returns:
+        dict: Compteurs cumulés (staged, skipped, failed, biens, transactions, dpe)
+    """
+    totals = {'staged': 0, 'skipped': 0, 'failed': 0, 'biens': 0, 'transactions': 0, 'dpe': 0}
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(CREATE_STAGING_SQL)
+        cursor.execute(CREATE_STAGING_DPE_SQL)
+        connection.commit()
+
+        for start in range(start_row, len(df), batch_size):
+            batch = start // batch_size
+            df_batch = df.iloc[start:start + batch_size]
+            next_row = start + len(df_batch)
+            batch_start = time.time()
+            try:
+                if enrich_dpe:
+                    with pipeline_metrics.stage('ban_geocoding', rows=len(df_batch)):
+                        df_batch = retrieve_id_ban_batch(df_batch)
+                counts = load_batch(
+                    cursor, df_batch, source=source, link_mirror_dpe=enrich_dpe and dpe_source == DPE_SOURCE_MIRROR
+                )
+                if file_hash:
+                    ingestion_checkpoint_crud.record_batch(
+                        cursor, file_hash, batch, next_row,
+                        inserted=counts['transactions'], skipped=len(df_batch) - counts['transactions']
+                    )
+                with pipeline_metrics.stage('bulk.commit', rows=len(df_batch)):
+                    connection.commit()
+            except Exception as e:
+                connection.rollback()
+                totals['failed'] += len(df_batch)
+                logger.error(f"Erreur sur le lot {start}-{next_row - 1}: {e}")
+                if file_hash:
+                    # Le lot en erreur est compté et dépassé pour ne pas bloquer la reprise
+                    ingestion_checkpoint_crud.record_batch(cursor, file_hash, batch, next_row, failed=len(df_batch))
+                    connection.commit()
+                continue
+
+            biens_by_ban = counts.pop('biens_by_ban')
+            if enrich_dpe and biens_by_ban:
+                with pipeline_metrics.stage('dpe_enrichment', rows=len(biens_by_ban)):
+                    dpes_by_ban = retrieve_dpe_by_identifiants_ban(biens_by_ban.keys())
+                try:
+                    counts['dpe'] = insert_dpe_batch(cursor, dpes_by_ban, biens_by_ban)
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    logger.error(f"Erreur lors de l'enregistrement des DPE du lot {start}-{next_row - 1}: {e}")
+
+            for key, value in counts.items():
+                totals[key] += value
+            elapsed = time.time() - batch_start
+            logger.info(
+                f"Lot {start}-{next_row - 1} : {counts['transactions']} transactions, "
+                f"{counts['biens']} biens créés, {counts['dpe']} DPE, {counts['skipped']} lignes ignorées en {elapsed:.2f} s "
+                f"({len(df_batch) / elapsed if elapsed > 0 else 0:.0f} lignes/s)"
+            )
+            pipeline_metrics.record('bulk.batch', elapsed, rows=len(df_batch))
+            # Résumé périodique pendant les longs chargements
+            pipeline_metrics.maybe_emit(source=source, next_row=next_row)
+    finally:
+        connection.close()
+
+    logger.info(f"Chargement en masse terminé : {totals}")
+    return totals
+
+
+def dvf_source_name(file_path: str) -> str:
+    """Nom de la source d'un fichier DVF pour les empreintes (ex. ValeursFoncieres-2023)"""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def checkpoint_key(file_hash: str, cleaning_version: Optional[str] = None) -> str:
+    """
+    Identifiant du point de reprise d'un fichier : les numéros de ligne du journal ne valent que pour un même
+    fichier nettoyé par une même version du nettoyage.
+
+    Returns:
+        str: Empreinte hexadécimale (64 caractères)
+    """
+    if cleaning_version is None:
+        return file_hash
+    return hashlib.sha256(f"{file_hash}:{cleaning_version}".encode()).hexdigest()
+
+
+def load_dvf_file_to_PG_bulk(file_path: str, df: pd.DataFrame, batch_size: int = DEFAULT_BATCH_SIZE, enrich_dpe: bool = True,
+                             dpe_source: str = DPE_SOURCE_API, cleaning_version: Optional[str] = None) -> dict:
+    """
+    Enregistre en masse le DataFrame nettoyé d'un fichier DVF en reprenant automatiquement au dernier lot validé.
+    Le point de reprise est identifié par l'empreinte SHA-256 du fichier et la version du nettoyage :
+    un fichier modifié ou nettoyé autrement repart du début, un fichier déjà chargé entièrement est ignoré.
+    Un fichier n'est marqué comme chargé que si aucun lot n'est en erreur ; sinon le lancement suivant
+    le recharge depuis le début (les lignes déjà présentes sont ignorées par les contraintes d'unicité).
+
+    Parameters:
+        file_path (str): Chemin du fichier DVF source
+        df (pd.DataFrame): DataFrame nettoyé issu de ce fichier
+        batch_size (int): Nombre de lignes par lot (celui du point de reprise existant est conservé)
+        enrich_dpe (bool): Géocodage BAN et ajout des DPE
+        dpe_source (str): 'api' ou 'mirror' (voir load_dvf_to_PG_bulk)
+        cleaning_version (str): Version du nettoyage ayant produit df (CLEANING_VERSION de fill_dvf)
+
+    Returns:
+        dict: Compteurs cumulés de cette exécution (vide si le fichier était déjà chargé)
+    """
+    file_hash = checkpoint_key(file_sha256(file_path), cleaning_version)
+    with Session(engine) as session:
+        checkpoint = ingestion_checkpoint_crud.get_or_create(session, IngestionCheckpointCreate(
+            file_hash=file_hash, file_name=os.path.basename(file_path), batch_size=batch_size
+        ))
+        if checkpoint.completed:
+            logger.info(f"{checkpoint.file_name} : déjà chargé entièrement, fichier ignoré")
+            return {}
+        if checkpoint.batch_size != batch_size:
+            # Les numéros de lot du journal n'ont de sens qu'avec la taille de lot d'origine
+            logger.warning(f"{checkpoint.file_name} : reprise avec la taille de lot d'origine ({checkpoint.batch_size})")
+            batch_size = checkpoint.batch_size
+        if checkpoint.next_row >= len(df) and checkpoint.rows_failed:
+            # Tous les lots ont été traités mais certains en erreur : nouvelle passe complète
+            logger.warning(
+                f"{checkpoint.file_name} : {checkpoint.rows_failed} lignes en erreur lors du dernier chargement, "
+                f"rechargement depuis le début"
+            )
+            checkpoint = ingestion_checkpoint_crud.reset_progress(session, file_hash)
+        start_row = checkpoint.next_row
+        if start_row:
+            logger.info(
+                f"{checkpoint.file_name} : reprise au lot {checkpoint.last_batch + 1} (ligne {start_row}), "
+                f"{checkpoint.rows_inserted} insérées, {checkpoint.rows_skipped} ignorées, {checkpoint.rows_failed} en erreur"
+            )
+
+    totals = load_dvf_to_PG_bulk(
+        df, batch_size=batch_size, enrich_dpe=enrich_dpe, file_hash=file_hash, start_row=start_row,
+        source=dvf_source_name(file_path), dpe_source=dpe_source
+    )
+
+    with Session(engine) as session:
+        checkpoint = ingestion_checkpoint_crud.get_by_hash(session, file_hash)
+        if checkpoint.rows_failed:
+            logger.warning(
+                f"{checkpoint.file_name} : {checkpoint.rows_failed} lignes en erreur, fichier non marqué comme chargé "
+                f"(rechargé au prochain lancement)"
+            )
+        else:
+            ingestion_checkpoint_crud.mark_completed(session, file_hash)
+    return totals
@@ -0,0 +1,160 @@
+# data_process/dvf_delta.py
+
+# Chargement incrémental (delta) des publications DVF.
+# Chaque ligne nettoyée reçoit deux empreintes 64 bits :
+#   - row_key : clé naturelle de la ligne (clé de transaction DVF)
+#   - content_hash : contenu complet de la ligne nettoyée
+# Elles sont comparées à la table dvf_fingerprint pour ne charger que les lignes nouvelles ou modifiées
+# et supprimer les transactions retirées de la publication.
+
+import time
+import logging
+import numpy as np
+import pandas as pd
+from bddpg import engine
+from data_process.dvf_bulk import load_dvf_to_PG_bulk, DEFAULT_BATCH_SIZE, DPE_SOURCE_API
+from data_process.price_rollup import MARK_DIRTY_COMMUNES_SQL
+from data_process.dvf_staging import to_default_dtypes
+
+logger = logging.getLogger(__name__)
+
+# Colonnes du DataFrame nettoyé qui ne font pas partie du contenu (numérotation propre à chaque nettoyage)
+EXCLUDED_CONTENT_COLUMNS = ['id_transaction', 'row_key', 'content_hash', 'id_ban', 'score_ban']
+
+SELECT_FINGERPRINTS_SQL = "SELECT row_key, content_hash, id_transaction FROM dvf_fingerprint WHERE source = %s"
+DELETE_FINGERPRINTS_SQL = "DELETE FROM dvf_fingerprint WHERE source = %s AND row_key = ANY(%s) RETURNING id_transaction"
+DELETE_TRANSACTIONS_SQL = "DELETE FROM transaction_dvf WHERE id_transaction = ANY(%s) RETURNING id_bien"
+
+
+def compute_dvf_fingerprints(df: pd.DataFrame, key_columns: list) -> pd.DataFrame:
+    """
+    Ajoute les colonnes row_key et content_hash (entiers 64 bits signés, stockés en BIGINT).
+
+    Parameters:
+        df (pd.DataFrame): DataFrame DVF nettoyé
+        key_columns (list): Colonnes de la clé naturelle d'une ligne
+
+    Returns:
+        pd.DataFrame: DataFrame avec les colonnes row_key et content_hash
+    """
+    # L'empreinte ne dépend que des valeurs : colonnes dans un ordre fixe (le cache Parquet déplace la colonne
+    # de partition en dernier) et types normalisés (catégories, chaînes Arrow)
+    content_columns = sorted(col for col in df.columns if col not in EXCLUDED_CONTENT_COLUMNS)
+    normalized = to_default_dtypes(df[key_columns + [col for col in content_columns if col not in key_columns]])
+    df = df.copy()
+    df['row_key'] = pd.util.hash_pandas_object(normalized[key_columns], index=False).to_numpy().view(np.int64)
+    df['content_hash'] = pd.util.hash_pandas_object(normalized[content_columns], index=False).to_numpy().view(np.int64)
+    return df
+
+
+def load_fingerprints(source: str) -> pd.DataFrame:
+    """
+    Lit les empreintes déjà chargées pour une source.
+
+    Returns:
+        pd.DataFrame: Colonnes row_key, content_hash, id_transaction
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(SELECT_FINGERPRINTS_SQL, (source,))
+        rows = cursor.fetchall()
+    finally:
+        connection.close()
+    return pd.DataFrame(rows, columns=['row_key', 'content_hash', 'id_transaction']).astype(
+        {'row_key': 'int64', 'content_hash': 'int64', 'id_transaction': 'Int64'}
+    )
+
+
+def diff_fingerprints(df: pd.DataFrame, loaded: pd.DataFrame) -> dict:
+    """
+    Compare les lignes nettoyées aux empreintes déjà chargées.
+
+    Returns:
+        dict: masques / clés des lignes 'inserted', 'changed' (sur df), clés 'removed', nombre 'unchanged'
+    """
+    # Type entier nullable : un passage en float64 ferait perdre la précision des empreintes
+    previous = loaded.set_index('row_key')['content_hash'].astype('Int64')
+    previous_hash = previous.reindex(df['row_key'].to_numpy())
+    known = previous_hash.notna().to_numpy()
+    same = previous_hash.reset_index(drop=True).eq(df['content_hash'].reset_index(drop=True)).fillna(False).to_numpy(dtype=bool)
+    removed = np.setdiff1d(loaded['row_key'].to_numpy(), df['row_key'].to_numpy())
+    return {
+        'inserted': ~known,
+        'changed': known & ~same,
+        'removed': removed,
+        'unchanged': int(same.sum())
+    }
+
+
+def delete_rows(source: str, row_keys) -> int:
+    """
+    Supprime les empreintes et les transactions associées de lignes retirées ou modifiées.
+
+    Returns:
+        int: Nombre de transactions supprimées
+    """
+    if len(row_keys) == 0:
+        return 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(DELETE_FINGERPRINTS_SQL, (source, [int(key) for key in row_keys]))
+        id_transactions = [row[0] for row in cursor.fetchall() if row[0] is not None]
+        if id_transactions:
+            cursor.execute(DELETE_TRANSACTIONS_SQL, (id_transactions,))
+            # Communes à recalculer dans les statistiques pré-agrégées (voir price_rollup)
+            id_biens = list({row[0] for row in cursor.fetchall()})
+            cursor.execute(MARK_DIRTY_COMMUNES_SQL, (id_biens,))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return len(id_transactions)
+
+
+def apply_dvf_delta(df: pd.DataFrame, source: str, batch_size: int = DEFAULT_BATCH_SIZE, enrich_dpe: bool = True,
+                    dpe_source: str = DPE_SOURCE_API) -> dict:
+    """
+    Applique une nouvelle publication DVF : seules les lignes nouvelles ou modifiées sont chargées,
+    les transactions des lignes modifiées ou disparues sont supprimées.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame nettoyé avec les colonnes row_key et content_hash (compute_dvf_fingerprints)
+        source (str): Nom de la source (fichier DVF sans extension)
+        batch_size (int): Nombre de lignes par lot pour le chargement en masse
+        enrich_dpe (bool): Géocodage BAN et ajout des DPE pour les lignes chargées
+        dpe_source (str): 'api' ou 'mirror' (voir load_dvf_to_PG_bulk)
+
+    Returns:
+        dict: Rapport (lignes nouvelles, modifiées, supprimées, inchangées, transactions supprimées, compteurs du chargement)
+    """
+    start_time = time.time()
+    diff = diff_fingerprints(df, load_fingerprints(source))
+
+    # Les lignes modifiées sont supprimées puis rechargées comme des nouvelles lignes
+    changed_keys = df.loc[diff['changed'], 'row_key'].to_numpy()
+    deleted = delete_rows(source, np.concatenate([diff['removed'], changed_keys]))
+
+    df_delta = df[diff['inserted'] | diff['changed']].reset_index(drop=True)
+    load = load_dvf_to_PG_bulk(
+        df_delta, batch_size=batch_size, enrich_dpe=enrich_dpe, source=source, dpe_source=dpe_source
+    ) if len(df_delta) else {}
+
+    report = {
+        'source': source,
+        'inserted': int(diff['inserted'].sum()),
+        'changed': int(diff['changed'].sum()),
+        'removed': int(len(diff['removed'])),
+        'unchanged': diff['unchanged'],
+        'transactions_deleted': deleted,
+        'load': load,
+        'seconds': round(time.time() - start_time, 2)
+    }
+    logger.info(
+        f"{source} : delta appliqué en {report['seconds']:.2f} s - {report['inserted']} nouvelles lignes, "
+        f"{report['changed']} modifiées, {report['removed']} supprimées, {report['unchanged']} inchangées"
+    )
+    return report
@@ -0,0 +1,139 @@
+# data_process/dvf_staging.py
+
+# Cache Parquet des DataFrames DVF nettoyés, partitionné par département.
+# Un répertoire par fichier source (ex. data/staging/ValeursFoncieres-2023/) contenant :
+#   - Code departement=XX/*.parquet : les données nettoyées, types conservés
+#   - manifest.json : taille, date de modification et empreinte SHA-256 du fichier source,
+#     version du nettoyage et nombre de lignes
+# Le cache est invalidé si le fichier source ou la version du nettoyage change.
+
+import os
+import json
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from typing import Optional
+from config import DVF_STAGING_DIR
+from data_process.utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = 'Code departement'
+MANIFEST_FILE = 'manifest.json'
+
+
+def staging_path(file_path: str) -> str:
+    """Répertoire du cache Parquet d'un fichier DVF"""
+    return os.path.join(DVF_STAGING_DIR, os.path.splitext(os.path.basename(file_path))[0])
+
+
+def _read_manifest(path: str) -> Optional[dict]:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_staging_valid(file_path: str, cleaning_version: str) -> bool:
+    """
+    Vérifie que le cache Parquet d'un fichier DVF correspond au fichier source et à la version du nettoyage.
+    Si seule la date de modification diffère (copie, touch), l'empreinte du contenu est comparée.
+
+    Parameters:
+        file_path (str): Chemin du fichier DVF source
+        cleaning_version (str): Version courante du code de nettoyage
+
+    Returns:
+        bool: True si le cache peut être utilisé
+    """
+    path = staging_path(file_path)
+    manifest = _read_manifest(path)
+    if manifest is None or manifest.get('cleaning_version') != cleaning_version:
+        return False
+    stat = os.stat(file_path)
+    if manifest.get('size') != stat.st_size:
+        return False
+    if manifest.get('mtime') != stat.st_mtime:
+        if manifest.get('sha256') != file_sha256(file_path):
+            return False
+        # Contenu identique : on met à jour la date pour éviter de recalculer l'empreinte
+        manifest['mtime'] = stat.st_mtime
+        with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    return True
+
+
+def write_staging(file_path: str, df: pd.DataFrame, cleaning_version: str) -> str:
+    """
+    Ecrit le DataFrame nettoyé d'un fichier DVF en Parquet, partitionné par département.
+    L'écriture se fait dans un répertoire temporaire renommé à la fin : un cache interrompu n'est jamais lu.
+
+    Parameters:
+        file_path (str): Chemin du fichier DVF source
+        df (pd.DataFrame): DataFrame nettoyé
+        cleaning_version (str): Version du code de nettoyage
+
+    Returns:
+        str: Répertoire du cache
+    """
+    path = staging_path(file_path)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    df.to_parquet(tmp_path, engine='pyarrow', partition_cols=[PARTITION_COLUMN], index=False)
+
+    stat = os.stat(file_path)
+    manifest = {
+        'source': os.path.basename(file_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': file_sha256(file_path),
+        'cleaning_version': cleaning_version,
+        'rows': len(df)
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"{manifest['source']} : {len(df)} lignes nettoyées mises en cache dans {path}")
+    return path
+
+
+def to_default_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Repasse les colonnes catégories / chaînes Arrow en objets Python (NaN pour les valeurs manquantes)"""
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if isinstance(df[col].dtype, (pd.CategoricalDtype, pd.StringDtype)):
+            values = df[col].astype(object)
+            df[col] = values.mask(values.isna(), np.nan)
+    return df
+
+
+def read_staging(file_path: str, columns: Optional[list] = None, departements: Optional[list] = None) -> pd.DataFrame:
+    """
+    Lit le cache Parquet d'un fichier DVF en ne chargeant que les colonnes et départements demandés.
+
+    Parameters:
+        file_path (str): Chemin du fichier DVF source
+        columns (list): Colonnes à charger (toutes par défaut)
+        departements (list): Codes département à charger (tous par défaut)
+
+    Returns:
+        pd.DataFrame: DataFrame nettoyé
+    """
+    # Sans schéma explicite, pyarrow lirait les codes département '01', '02'... comme des entiers
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive')
+    filters = [(PARTITION_COLUMN, 'in', [str(d) for d in departements])] if departements else None
+    df = pd.read_parquet(
+        staging_path(file_path), engine='pyarrow', columns=columns, filters=filters, partitioning=partitioning
+    )
+    # La colonne de partition peut être relue en catégorie : on retrouve le type d'origine
+    if PARTITION_COLUMN in df.columns:
+        df[PARTITION_COLUMN] = df[PARTITION_COLUMN].astype(str).astype(object)
+    return df.reset_index(drop=True)
@@ -1,9 +1,19 @@
-from .retrieve_id_ban import retrieve_id_ban
+from .retrieve_id_ban import retrieve_id_ban, retrieve_id_ban_batch
 from .retrieve_dpe import retrieve_all_dpe_by_date, retrieve_dpe_by_identifiant_ban
+from .dpe_enrichment import retrieve_dpe_by_identifiants_ban
+from .dpe_stream import iter_dpe_pages, iter_dpe_pages_by_date, iter_dpe_by_date, download_dpe_to_ndjson
+from .dpe_shards import iter_sharded_dpe_pages
 
 __all__ = [
     'retrieve_id_ban',
+    'retrieve_id_ban_batch',
     'retrieve_all_dpe_by_date',
-    'retrieve_dpe_by_identifiant_ban'
+    'retrieve_dpe_by_identifiant_ban',
+    'retrieve_dpe_by_identifiants_ban',
+    'iter_dpe_pages',
+    'iter_dpe_pages_by_date',
+    'iter_dpe_by_date',
+    'download_dpe_to_ndjson',
+    'iter_sharded_dpe_pages'
 ]
 
@@ -0,0 +1,135 @@
+# data_process/external_api/dpe_enrichment.py
+
+# Enrichissement DPE concurrent par identifiant BAN.
+# Les requêtes vers l'API ADEME sont exécutées dans un pool de threads et cadencées par un token bucket
+# réglé sur le quota documenté (600 requêtes par intervalle de 60 secondes).
+# Les réponses 429 et 5xx sont retentées avec un délai exponentiel.
+
+import time
+import random
+import logging
+import requests
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from common.rate_limiter import TokenBucket
+from common.metrics import pipeline_metrics
+from common.http_client import http_client
+from config import ADEME_MAX_REQUESTS, ADEME_PERIOD
+from .retrieve_dpe import fields
+
+logger = logging.getLogger(__name__)
+
+base_url_dpe = "https://data.ademe.fr/data-fair/api/v1/datasets/dpe03existant/lines"
+
+ademe_rate_limiter = TokenBucket.from_quota(ADEME_MAX_REQUESTS, ADEME_PERIOD)
+
+DEFAULT_MAX_WORKERS = 16
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def fetch_ademe_page(url: str, params: Optional[dict] = None, max_retries: int = MAX_RETRIES, context: str = "") -> dict:
+    """
+    Appelle l'API lines de l'ADEME en respectant le quota, avec retentatives.
+
+    Args:
+        url (str): URL de l'API (ou URL `next` renvoyée par la page précédente, params vide).
+        params (dict): Paramètres de la requête.
+        max_retries (int): Nombre maximal de retentatives sur 429 / 5xx / erreur réseau.
+        context (str): Libellé de la requête pour les logs.
+
+    Returns:
+        dict: La réponse JSON (clés 'total', 'results', 'next').
+
+    Raises:
+        requests.RequestException: si la requête échoue après toutes les retentatives.
+    """
+    for attempt in range(max_retries + 1):
+        with pipeline_metrics.stage('ademe.rate_limit_wait'):
+            ademe_rate_limiter.acquire()
+        delay = BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
+        request_start = time.perf_counter()
+        try:
+            # Retentatives gérées ici pour reprendre un jeton du token bucket à chaque tentative
+            response = http_client.get(url, params=params or {}, timeout=30, retries=0)
+        except requests.RequestException:
+            pipeline_metrics.record('api.ademe.lines', time.perf_counter() - request_start, error=True)
+            if attempt == max_retries:
+                raise
+            time.sleep(delay)
+            continue
+        pipeline_metrics.record('api.ademe.lines', time.perf_counter() - request_start, error=not response.ok)
+
+        if response.status_code in RETRY_STATUS and attempt < max_retries:
+            # L'API indique parfois le délai à respecter avant de réessayer
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.info(f"ADEME {response.status_code} pour {context or url}, nouvelle tentative dans {delay:.1f} s")
+            time.sleep(delay)
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+
+def fetch_dpe_by_identifiant_ban(identifiant_ban: str, max_retries: int = MAX_RETRIES) -> list:
+    """
+    Récupère les DPE d'un identifiant BAN en respectant le quota ADEME, avec retentatives.
+
+    Args:
+        identifiant_ban (str): L'identifiant BAN recherché.
+        max_retries (int): Nombre maximal de retentatives sur 429 / 5xx / erreur réseau.
+
+    Returns:
+        list: Les DPE trouvés (liste vide si aucun).
+
+    Raises:
+        requests.RequestException: si la requête échoue après toutes les retentatives.
+    """
+    params = {
+        'qs': f"identifiant_ban:{identifiant_ban}",
+        'select': f"{','.join(fields)}"
+    }
+    return fetch_ademe_page(base_url_dpe, params, max_retries=max_retries, context=identifiant_ban).get('results', [])
+
+
+def retrieve_dpe_by_identifiants_ban(identifiants_ban, max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """
+    Récupère en parallèle les DPE d'un ensemble d'identifiants BAN.
+
+    Args:
+        identifiants_ban: Itérable d'identifiants BAN (les doublons sont ignorés).
+        max_workers (int): Nombre de requêtes simultanées au maximum.
+
+    Returns:
+        dict: {identifiant_ban: liste des DPE}, uniquement pour les identifiants ayant au moins un DPE.
+    """
+    identifiants = {id_ban for id_ban in identifiants_ban if id_ban}
+    results = {}
+    if not identifiants:
+        return results
+
+    start_time = time.time()
+    nb_errors = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_dpe_by_identifiant_ban, id_ban): id_ban for id_ban in identifiants}
+        for future in as_completed(futures):
+            id_ban = futures[future]
+            try:
+                dpes = future.result()
+            except requests.RequestException as e:
+                nb_errors += 1
+                logger.error(f"Erreur lors de la récupération des DPE pour l'identifiant BAN {id_ban}: {e}")
+                continue
+            if dpes:
+                results[id_ban] = dpes
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"{len(identifiants)} identifiants BAN interrogés en {elapsed:.2f} s "
+        f"({len(identifiants) / elapsed if elapsed > 0 else 0:.1f} requêtes/s), "
+        f"{len(results)} avec DPE, {nb_errors} en erreur"
+    )
+    return results
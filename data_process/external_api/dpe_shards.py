@@ -0,0 +1,207 @@
+# data_process/external_api/dpe_shards.py
+
+# Récupération parallèle des DPE ADEME sur une longue période, par tranches ("shards").
+# La pagination par numéro de page est limitée à 10 000 résultats par requête ; les liens `next`
+# n'ont pas cette limite mais imposent un parcours séquentiel.
+# La période est donc découpée en tranches de moins de 10 000 DPE : une tranche trop grande est coupée
+# en deux par dates, puis, pour une seule journée, par plage de codes postaux (plus une tranche pour les DPE
+# sans code postal). Toutes les pages de toutes les tranches sont ensuite demandées en parallèle,
+# le quota ADEME étant respecté par le token bucket partagé.
+# Les journées qui ne peuvent pas être récupérées en entier (tranche indivisible au-delà de 10 000 DPE,
+# sous-tranches dont les totaux n'atteignent pas celui de la tranche découpée) sont signalées à l'appelant
+# pour ne pas être inscrites au journal de la copie locale.
+
+import math
+import logging
+from datetime import date, timedelta
+from typing import Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .retrieve_dpe import fields
+from .dpe_enrichment import fetch_ademe_page, base_url_dpe
+from .dpe_stream import PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de résultats accessibles par pagination par numéro de page
+ADEME_RESULT_CEILING = 10000
+DEFAULT_MAX_WORKERS = 8
+# code_postal_brut est un champ numérique dans l'API : les bornes sont des entiers
+CODE_POSTAL_MIN = 0
+CODE_POSTAL_MAX = 99999
+
+
+class DPEShard:
+    """
+    Tranche de la requête : période [date_start, date_end] et plage de codes postaux [cp_start, cp_end],
+    ou DPE sans code postal exploitable (missing_cp)
+    """
+
+    def __init__(self, date_start: date, date_end: date, cp_start: int = CODE_POSTAL_MIN, cp_end: int = CODE_POSTAL_MAX,
+                 missing_cp: bool = False):
+        self.date_start = date_start
+        self.date_end = date_end
+        self.cp_start = cp_start
+        self.cp_end = cp_end
+        self.missing_cp = missing_cp
+        self.total = None
+        self.parent = None
+
+    def __repr__(self) -> str:
+        return f"DPEShard({self.qs!r}, total={self.total})"
+
+    @property
+    def qs(self) -> str:
+        """Requête ADEME de la tranche (syntaxe Lucene, bornes incluses)"""
+        qs = f"date_etablissement_dpe:[{self.date_start.isoformat()} TO {self.date_end.isoformat()}]"
+        if self.missing_cp:
+            qs += " AND NOT _exists_:code_postal_brut"
+        elif (self.cp_start, self.cp_end) != (CODE_POSTAL_MIN, CODE_POSTAL_MAX):
+            qs += f" AND code_postal_brut:[{self.cp_start} TO {self.cp_end}]"
+        return qs
+
+    @property
+    def days(self) -> list:
+        """Dates d'établissement couvertes par la tranche"""
+        return [self.date_start + timedelta(days=i) for i in range((self.date_end - self.date_start).days + 1)]
+
+    def split(self) -> list:
+        """
+        Coupe la tranche en deux : par dates si elle couvre plusieurs jours, sinon par codes postaux.
+        Au premier découpage d'une journée par codes postaux, une troisième tranche regroupe les DPE
+        sans code postal (absents des plages numériques).
+
+        Returns:
+            list: Les sous-tranches, ou une liste vide si la tranche n'est plus divisible
+        """
+        if self.date_start < self.date_end:
+            middle = self.date_start + timedelta(days=(self.date_end - self.date_start).days // 2)
+            sub_shards = [
+                DPEShard(self.date_start, middle, self.cp_start, self.cp_end),
+                DPEShard(middle + timedelta(days=1), self.date_end, self.cp_start, self.cp_end)
+            ]
+        elif self.cp_start < self.cp_end and not self.missing_cp:
+            middle = (self.cp_start + self.cp_end) // 2
+            sub_shards = [
+                DPEShard(self.date_start, self.date_end, self.cp_start, middle),
+                DPEShard(self.date_start, self.date_end, middle + 1, self.cp_end)
+            ]
+            if (self.cp_start, self.cp_end) == (CODE_POSTAL_MIN, CODE_POSTAL_MAX):
+                sub_shards.append(DPEShard(self.date_start, self.date_end, missing_cp=True))
+        else:
+            return []
+        for sub_shard in sub_shards:
+            sub_shard.parent = self
+        return sub_shards
+
+
+def count_shard(shard: DPEShard) -> DPEShard:
+    """Renseigne le nombre total de DPE de la tranche (requête sans résultat, size=0)"""
+    shard.total = fetch_ademe_page(base_url_dpe, {'qs': shard.qs, 'size': 0}, context=shard.qs).get('total', 0)
+    return shard
+
+
+def plan_shards(date_start: date, date_end: date, executor: ThreadPoolExecutor) -> tuple:
+    """
+    Découpe une période en tranches de moins de ADEME_RESULT_CEILING DPE.
+    Les tranches d'un même niveau de découpage sont comptées en parallèle, et la somme des totaux
+    des sous-tranches est comparée au total de la tranche découpée.
+
+    Parameters:
+        date_start (date): Première date d'établissement
+        date_end (date): Dernière date d'établissement incluse
+        executor (ThreadPoolExecutor): Pool utilisé pour les requêtes de comptage
+
+    Returns:
+        tuple: (tranches non vides avec leur nombre total de DPE,
+                ensemble des dates qui ne pourront pas être récupérées en entier)
+    """
+    shards = []
+    incomplete_days = set()
+    to_count = [DPEShard(date_start, date_end)]
+    while to_count:
+        to_split = []
+        sub_totals = {}
+        for shard in executor.map(count_shard, to_count):
+            if shard.parent is not None:
+                sub_totals[shard.parent] = sub_totals.get(shard.parent, 0) + shard.total
+            if shard.total > ADEME_RESULT_CEILING:
+                sub_shards = shard.split()
+                if sub_shards:
+                    to_split.extend(sub_shards)
+                    continue
+                logger.warning(f"{shard} : tranche indivisible au-delà de {ADEME_RESULT_CEILING} DPE, "
+                               f"résultats tronqués, journée à reprendre")
+                incomplete_days.update(shard.days)
+            if shard.total:
+                shards.append(shard)
+
+        # Des DPE absents de toutes les sous-tranches (code postal hors des plages) seraient perdus sans erreur
+        # (un total supérieur s'explique par des DPE publiés entre les deux comptages)
+        for parent, sub_total in sub_totals.items():
+            if sub_total < parent.total:
+                logger.warning(f"{parent} : {parent.total - sub_total} DPE absents des sous-tranches, journées à reprendre")
+                incomplete_days.update(parent.days)
+        to_count = to_split
+    logger.info(f"{len(shards)} tranches pour {sum(shard.total for shard in shards)} DPE entre {date_start} et {date_end}")
+    return shards, incomplete_days
+
+
+def fetch_shard_page(shard: DPEShard, page: int, page_size: int = PAGE_SIZE) -> list:
+    """
+    Récupère une page d'une tranche (pagination par numéro de page, triée par numero_dpe pour être stable).
+
+    Returns:
+        list: Les DPE de la page
+    """
+    params = {
+        'qs': shard.qs,
+        'size': page_size,
+        'page': page,
+        'sort': 'numero_dpe',
+        'select': ','.join(fields)
+    }
+    return fetch_ademe_page(base_url_dpe, params, context=f"{shard.qs} page {page}").get('results', [])
+
+
+def iter_sharded_dpe_pages(date_start: str, date_end: Optional[str] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                           page_size: int = PAGE_SIZE, incomplete_days: Optional[set] = None) -> Iterator[list]:
+    """
+    Renvoie les pages de DPE d'une période au fur et à mesure de leur réception (ordre non garanti).
+    Au plus 2 x max_workers pages sont en cours ou en attente de traitement par le consommateur.
+
+    Parameters:
+        date_start (str): Première date d'établissement ('YYYY-MM-DD')
+        date_end (str): Dernière date d'établissement incluse (par défaut : aujourd'hui)
+        max_workers (int): Nombre de requêtes simultanées (le débit reste borné par le quota ADEME)
+        page_size (int): Nombre de DPE par page
+        incomplete_days (set): Complété, avant la première page, avec les dates qui ne peuvent pas être
+            récupérées en entier (à ne pas inscrire au journal)
+
+    Yields:
+        list: Les DPE d'une page
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée après les retentatives
+    """
+    start = date.fromisoformat(date_start)
+    end = date.fromisoformat(date_end) if date_end else date.today()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        shards, incomplete = plan_shards(start, end, executor)
+        if incomplete_days is not None:
+            incomplete_days.update(incomplete)
+        tasks = iter([
+            (shard, page)
+            for shard in shards
+            for page in range(1, math.ceil(min(shard.total, ADEME_RESULT_CEILING) / page_size) + 1)
+        ])
+
+        pending = {executor.submit(fetch_shard_page, shard, page, page_size) for _, (shard, page) in zip(range(2 * max_workers), tasks)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results = future.result()
+                task = next(tasks, None)
+                if task is not None:
+                    pending.add(executor.submit(fetch_shard_page, task[0], task[1], page_size))
+                if results:
+                    yield results
@@ -0,0 +1,138 @@
+# data_process/external_api/dpe_stream.py
+
+# Téléchargement en flux des DPE ADEME (API lines paginée par liens `next`).
+# Les générateurs renvoient chaque page (ou chaque DPE) dès sa réception : la mémoire reste constante
+# quel que soit le nombre de DPE, et le consommateur (écriture en base, fichier...) démarre immédiatement.
+# Chaque page porte l'URL `next` de la suivante : un téléchargement interrompu reprend à partir de cette URL.
+
+import os
+import json
+import logging
+from typing import Iterator, Optional
+from .retrieve_dpe import fields
+from .dpe_enrichment import fetch_ademe_page, base_url_dpe
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+def iter_dpe_pages(qs: str, next_url: Optional[str] = None, page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """
+    Parcourt les pages de l'API lines ADEME pour une requête, en suivant les liens `next`.
+
+    Args:
+        qs (str): Requête de filtrage ADEME (ex. "date_etablissement_dpe:2025-05-27")
+        next_url (str): URL `next` d'une page déjà traitée, pour reprendre un téléchargement interrompu
+        page_size (int): Nombre de DPE par page
+
+    Yields:
+        dict: Une page {'results': liste des DPE, 'total': nombre total de DPE, 'next': URL de la page suivante ou None}
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée après les retentatives ;
+            la dernière URL `next` reçue permet de reprendre.
+    """
+    url = next_url or base_url_dpe
+    # L'URL `next` contient déjà tous les paramètres
+    params = None if next_url else {'qs': qs, 'size': page_size, 'select': ','.join(fields)}
+    while url:
+        data = fetch_ademe_page(url, params, context=qs)
+        results = data.get('results', [])
+        if not results:
+            return
+        url, params = data.get('next'), None
+        yield {'results': results, 'total': data.get('total'), 'next': url}
+
+
+def iter_dpe_pages_by_date(date_etablissement: str, next_url: Optional[str] = None, page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """
+    Parcourt les pages des DPE établis à une date (voir iter_dpe_pages).
+
+    Args:
+        date_etablissement (str): Date d'établissement au format 'YYYY-MM-DD'
+        next_url (str): URL `next` à partir de laquelle reprendre
+        page_size (int): Nombre de DPE par page
+    """
+    return iter_dpe_pages(f"date_etablissement_dpe:{date_etablissement}", next_url=next_url, page_size=page_size)
+
+
+def iter_dpe_by_date(date_etablissement: str, next_url: Optional[str] = None) -> Iterator[dict]:
+    """
+    Renvoie un à un les DPE établis à une date.
+
+    Args:
+        date_etablissement (str): Date d'établissement au format 'YYYY-MM-DD'
+        next_url (str): URL `next` à partir de laquelle reprendre
+
+    Yields:
+        dict: Un DPE (colonnes `fields`)
+    """
+    for page in iter_dpe_pages_by_date(date_etablissement, next_url=next_url):
+        yield from page['results']
+
+
+def _state_path(output_path: str) -> str:
+    return output_path + '.state.json'
+
+
+def _write_state(output_path: str, state: dict) -> None:
+    tmp_path = _state_path(output_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(output_path))
+
+
+def download_dpe_to_ndjson(date_etablissement: str, output_path: str, resume: bool = True) -> int:
+    """
+    Enregistre les DPE établis à une date dans un fichier NDJSON (un DPE par ligne), page par page.
+    Après chaque page, l'URL `next` et la taille du fichier sont enregistrées dans `<output_path>.state.json` :
+    après une erreur, un nouvel appel reprend à la page suivante (une page écrite partiellement est tronquée).
+
+    Args:
+        date_etablissement (str): Date d'établissement au format 'YYYY-MM-DD'
+        output_path (str): Chemin du fichier NDJSON
+        resume (bool): Reprendre un téléchargement interrompu ; sinon le fichier est réécrit
+
+    Returns:
+        int: Nombre total de DPE dans le fichier
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée (l'état permet de reprendre)
+    """
+    state = None
+    if resume and os.path.exists(_state_path(output_path)) and os.path.exists(output_path):
+        with open(_state_path(output_path), encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('date_etablissement') != date_etablissement:
+            state = None
+    if state and state['completed']:
+        logger.info(f"{output_path} : déjà complet ({state['count']} DPE)")
+        return state['count']
+    if state is None:
+        state = {'date_etablissement': date_etablissement, 'next': None, 'bytes': 0, 'count': 0, 'completed': False}
+    elif state['next'] is None:
+        # Interrompu avant la fin de la première page : on repart du début
+        state.update(bytes=0, count=0)
+
+    with open(output_path, 'a+b') as f:
+        f.truncate(state['bytes'])
+        f.seek(state['bytes'])
+        for page in iter_dpe_pages_by_date(date_etablissement, next_url=state['next']):
+            f.write(''.join(json.dumps(dpe, ensure_ascii=False) + '\n' for dpe in page['results']).encode('utf-8'))
+            f.flush()
+            state.update(next=page['next'], bytes=f.tell(), count=state['count'] + len(page['results']))
+            _write_state(output_path, state)
+
+    state['completed'] = True
+    _write_state(output_path, state)
+    logger.info(f"{output_path} : {state['count']} DPE du {date_etablissement} enregistrés")
+    return state['count']
+
+
+def iter_ndjson(path: str) -> Iterator[dict]:
+    """Relit un fichier NDJSON ligne par ligne"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,193 @@
+# data_process/external_api/geocode_cache.py
+
+# Cache persistant des géocodages BAN (identifiant_ban et score) dans un fichier SQLite.
+# Clé : couple (adresse normalisée, code INSEE).
+# Les adresses non trouvées sont aussi mises en cache (cache négatif) avec leur propre durée de validité,
+# afin qu'une relance de fill_dvf n'interroge l'API que pour les nouvelles adresses.
+
+import re
+import time
+import sqlite3
+import threading
+import pandas as pd
+from typing import Optional
+from config import GEOCODE_CACHE_PATH
+
+# Durée de validité des adresses non trouvées (la BAN est mise à jour régulièrement)
+NEGATIVE_TTL = 30 * 24 * 3600
+# Durée de validité des adresses trouvées (None = sans expiration)
+POSITIVE_TTL = None
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS geocode (
+    adresse TEXT NOT NULL,
+    code_insee TEXT NOT NULL,
+    id_ban TEXT,
+    score REAL,
+    looked_up_at REAL NOT NULL,
+    PRIMARY KEY (adresse, code_insee)
+)
+"""
+
+
+def normalize_adresse(adresse: str) -> str:
+    """
+    Normalise une adresse pour la clé du cache (majuscules, espaces multiples supprimés).
+
+    Args:
+        adresse (str): Adresse à normaliser.
+
+    Returns:
+        str: Adresse normalisée.
+    """
+    return re.sub(r'\s+', ' ', adresse.strip().upper())
+
+
+def normalize_adresse_series(adresses: pd.Series) -> pd.Series:
+    """
+    Version colonne de normalize_adresse.
+
+    Args:
+        adresses (pd.Series): Adresses à normaliser.
+
+    Returns:
+        pd.Series: Adresses normalisées.
+    """
+    return adresses.str.strip().str.upper().str.replace(r'\s+', ' ', regex=True)
+
+
+class GeocodeCache:
+    """
+    Cache SQLite des résultats de géocodage BAN, partagé entre les exécutions.
+    """
+
+    def __init__(self, db_path: str, negative_ttl: Optional[float] = NEGATIVE_TTL, positive_ttl: Optional[float] = POSITIVE_TTL):
+        self.db_path = db_path
+        self.negative_ttl = negative_ttl
+        self.positive_ttl = positive_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Ouvre la base SQLite à la première utilisation"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(CREATE_TABLE_SQL)
+            self._connection.commit()
+        return self._connection
+
+    def _is_valid(self, id_ban: Optional[str], looked_up_at: float, now: float) -> bool:
+        """Vérifie qu'une entrée n'a pas expiré (TTL différent pour les entrées négatives)"""
+        ttl = self.positive_ttl if id_ban else self.negative_ttl
+        return ttl is None or (now - looked_up_at) < ttl
+
+    def get(self, adresse: str, code_insee: str) -> tuple:
+        """
+        Recherche une adresse dans le cache.
+
+        Args:
+            adresse (str): L'adresse recherchée.
+            code_insee (str): Le code INSEE de la commune.
+
+        Returns:
+            tuple: (trouvé dans le cache, id_ban, score). id_ban est None pour une entrée négative.
+        """
+        with self._lock:
+            row = self._get_connection().execute(
+                "SELECT id_ban, score, looked_up_at FROM geocode WHERE adresse = ? AND code_insee = ?",
+                (normalize_adresse(adresse), code_insee)
+            ).fetchone()
+            if row and self._is_valid(row[0], row[2], time.time()):
+                self.hits += 1
+                if row[0] is None:
+                    self.negative_hits += 1
+                return True, row[0], row[1]
+            self.misses += 1
+            return False, None, None
+
+    def put(self, adresse: str, code_insee: str, id_ban: Optional[str], score: Optional[float]) -> None:
+        """
+        Enregistre le résultat d'un géocodage (id_ban à None pour une adresse non trouvée).
+
+        Args:
+            adresse (str): L'adresse géocodée.
+            code_insee (str): Le code INSEE de la commune.
+            id_ban (str): L'identifiant BAN ou None.
+            score (float): Le score BAN ou None.
+        """
+        self.put_many([(normalize_adresse(adresse), code_insee, id_ban, score)])
+
+    def get_many(self, pairs: pd.DataFrame) -> pd.DataFrame:
+        """
+        Recherche un ensemble de couples (adresse, code INSEE) dans le cache.
+
+        Args:
+            pairs (pd.DataFrame): Colonnes 'adresse' (normalisée) et 'citycode', sans doublons.
+
+        Returns:
+            pd.DataFrame: Les couples trouvés et valides, avec les colonnes 'adresse', 'citycode', 'id_ban', 'score_ban'.
+        """
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (adresse TEXT, code_insee TEXT)")
+            connection.execute("DELETE FROM lookup")
+            connection.executemany(
+                "INSERT INTO lookup VALUES (?, ?)",
+                pairs[['adresse', 'citycode']].itertuples(index=False, name=None)
+            )
+            cached = pd.read_sql_query(
+                """
+                SELECT g.adresse, g.code_insee AS citycode, g.id_ban, g.score AS score_ban, g.looked_up_at
+                FROM lookup l
+                JOIN geocode g ON g.adresse = l.adresse AND g.code_insee = l.code_insee
+                """,
+                connection
+            )
+            connection.execute("DELETE FROM lookup")
+            connection.commit()
+
+            ttl = cached['id_ban'].notna().map({True: self.positive_ttl, False: self.negative_ttl})
+            expired = ttl.notna() & ((now - cached['looked_up_at']) >= ttl.fillna(0))
+            cached = cached[~expired].drop(columns=['looked_up_at'])
+
+            self.hits += len(cached)
+            self.negative_hits += int(cached['id_ban'].isna().sum())
+            self.misses += len(pairs) - len(cached)
+        return cached
+
+    def put_many(self, rows) -> None:
+        """
+        Enregistre plusieurs résultats de géocodage.
+
+        Args:
+            rows: Itérable de tuples (adresse normalisée, code INSEE, id_ban, score).
+        """
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.executemany(
+                "INSERT OR REPLACE INTO geocode (adresse, code_insee, id_ban, score, looked_up_at) VALUES (?, ?, ?, ?, ?)",
+                ((adresse, code_insee, id_ban if isinstance(id_ban, str) and id_ban else None,
+                  None if pd.isna(score) else float(score), now)
+                 for adresse, code_insee, id_ban, score in rows)
+            )
+            connection.commit()
+
+    def stats(self) -> dict:
+        """Retourne les compteurs du cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Instance globale
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH)
@@ -11,7 +11,7 @@
 # (fichiers de données, pièces jointes, etc.) et à 500 kB/s pour les autres appels
 
 import requests
-import time
+from common.http_client import http_client
 
 fields = [
         "numero_dpe",
@@ -35,114 +35,45 @@ def retrieve_all_dpe_by_date(date_etablissement: str) -> list:
         date_etablissement (str): La date d'établissement du DPE au format 'YYYY-MM-DD'.
     Returns:
         list: Une liste complète de tous les DPE de cette date.
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée (pas de résultat partiel).
 
     *** Note : cette méthode utilise l'URL de la page suivante fournie par l'API ***
+    *** Note : tous les DPE sont gardés en mémoire ; pour un traitement en flux, voir dpe_stream.iter_dpe_by_date ***
     """
-    base_url_dpe = "https://data.ademe.fr/data-fair/api/v1/datasets/dpe03existant/lines"
-    all_results = []
-    page_size = 1000
-    next_url = None
-    page_num = 1
-    
-    while True:
-        if next_url:
-            # Utiliser l'URL complète fournie par l'API
-            url = next_url
-            params = {}
-        else:
-            # Première requête
-            url = base_url_dpe
-            params = {
-                'qs': f"date_etablissement_dpe:{date_etablissement}",
-            'size': page_size,
-            'select': f"{','.join(fields)}"
-            }
-        
-        print(f"Page {page_num} - URL: {url}")
-        
-        try:
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = data.get('results', [])
-            if not results:  # Plus de résultats
-                break
-                
-            all_results.extend(results)
-            print(f"Page {page_num}: {len(results)} DPE récupérés (Total: {len(all_results)})")
-            
-            # Récupérer l'URL de la page suivante
-            next_url = data.get('next')
-            if not next_url:  # Plus de pages
-                break
-                
-            page_num += 1
-            time.sleep(0.1)  # Respect des limites API
-            
-        except requests.RequestException as e:
-            print(f"Erreur page {page_num}: {str(e)}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Status code: {e.response.status_code}")
-                print(f"Response text: {e.response.text}")
-            break
-    
+    # Import local : dpe_stream importe `fields` depuis ce module
+    from .dpe_stream import iter_dpe_by_date
+
+    all_results = list(iter_dpe_by_date(date_etablissement))
     print(f"Total final: {len(all_results)} DPE pour le {date_etablissement}")
     return all_results
 
 
 def retrieve_all_dpe_by_date_using_pagination(date_etablissement: str) -> list:
     """
-    Récupère TOUS les DPE émis à une date donnée (avec pagination).
-    *** Limits : L'API ne fournit pqas plus de 10000 résultats avec cette methode. ***
+    Récupère TOUS les DPE émis à une date donnée, page par page, en affichant la progression.
 
     Args:
         date_etablissement (str): La date d'établissement du DPE au format 'YYYY-MM-DD'.
-        
+
     Returns:
         list: Une liste complète de tous les DPE de cette date.
-        
-    *** Note : cette méthode utilise la pagination par page et non l'URL de la page suivante fournie par l'API ***
-    *** Limits : L'API ne fournit pqas plus de 10000 résultats avec cette methode. ***
+
+    Raises:
+        requests.RequestException: si une page ne peut pas être récupérée après les retentatives (pas de résultat partiel).
+
+    *** Note : les pages sont parcourues avec dpe_stream.iter_dpe_pages (liens `next`, sans la limite de 10000 résultats
+    de la pagination par numéro de page), au rythme du quota ADEME partagé ***
+    *** Pour une longue période, voir dpe_shards.iter_sharded_dpe_pages (tranches récupérées en parallèle) ***
     """
-    
-    base_url_dpe = "https://data.ademe.fr/data-fair/api/v1/datasets/dpe03existant/lines"
+    # Import local : dpe_stream importe `fields` depuis ce module
+    from .dpe_stream import iter_dpe_pages_by_date
+
     all_results = []
-    page = 1
-    page_size = 1000
-    
-    
-    while True:
-        params = {
-            'qs': f"date_etablissement_dpe:{date_etablissement}",
-            'size': page_size,
-            'page': page,
-            'select': f"{','.join(fields)}"
-        }
-
-        try:
-            response = requests.get(base_url_dpe, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = data.get('results', [])
-            if not results:  # Plus de résultats
-                break
-                
-            all_results.extend(results)
-            print(f"Page {page + 1}: {len(results)} DPE récupérés (Total: {len(all_results)})")
-            
-            # Vérifier s'il y a encore des pages
-            if len(results) < page_size:  # Dernière page
-                break
-                
-            page += 1
-            time.sleep(0.1)  # Respect des limites API
-            
-        except requests.RequestException as e:
-            print(f"Erreur page {page}: {str(e)}")
-            break
-    
+    for page, data in enumerate(iter_dpe_pages_by_date(date_etablissement), start=1):
+        all_results.extend(data['results'])
+        print(f"Page {page}: {len(data['results'])} DPE récupérés (Total: {len(all_results)}/{data['total']})")
+
     print(f"Total final: {len(all_results)} DPE pour le {date_etablissement}")
     return all_results
 
@@ -163,7 +94,7 @@ def retrieve_dpe_by_identifiant_ban(identifiant_ban: str) -> dict:
     }
     
     try:
-        response = requests.get(base_url_dpe, params=params, timeout=30)
+        response = http_client.get(base_url_dpe, params=params, timeout=30)
         response.raise_for_status()
         data = response.json()
         
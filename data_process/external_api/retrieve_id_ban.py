@@ -3,24 +3,48 @@
 # Requete API pour récupérer l'"id" (identifiant_ban) à partir d'une adresse et du code insee,
 # à partir de : api-adresse.data.gouv.fr/search/
 # LIMITATION :  50 requetes/seconde/IP
-
+#
+# Géocodage par lots via l'endpoint CSV : api-adresse.data.gouv.fr/search/csv/
+# LIMITATION : fichiers de 50 Mo maximum, d'où l'envoi par paquets de BATCH_CHUNK_SIZE adresses
+#
+# Les deux méthodes consultent d'abord le cache persistant geocode_cache (voir geocode_cache.py)
+
+import io
+import logging
 import requests
 import time
+import numpy as np
+import pandas as pd
+from typing import Optional
+from common.metrics import pipeline_metrics
+from common.http_client import http_client
+from .geocode_cache import GeocodeCache, geocode_cache, normalize_adresse_series
+
+logger = logging.getLogger(__name__)
 
-def retrieve_id_ban(adresse:str , code_insee:str) -> tuple:
+BASE_URL_BAN = "https://api-adresse.data.gouv.fr"
+BATCH_CHUNK_SIZE = 5000
+
+def retrieve_id_ban(adresse:str , code_insee:str, cache: Optional[GeocodeCache] = geocode_cache) -> tuple:
     """
     Récupère l'ID BAN et le score pour une adresse donnée et un code INSEE.
     
     Args:
         adresse (str): L'adresse à rechercher.
         code_insee (str): Le code INSEE de la commune.
+        cache (GeocodeCache): Cache persistant consulté avant l'API (None pour le désactiver).
     
     Returns:
         str: L'ID BAN si trouvé, sinon None.
         float: Le score associé à l'ID BAN, ou None si non trouvé.
     """
+    # On consulte d'abord le cache (y compris les adresses déjà connues comme introuvables)
+    if cache is not None and adresse and code_insee:
+        in_cache, id_ban, score_ban = cache.get(adresse, code_insee)
+        if in_cache:
+            return id_ban, score_ban
     
-    base_url_ban = "https://api-adresse.data.gouv.fr/search/"
+    base_url_ban = f"{BASE_URL_BAN}/search/"
     params = {
         'q': adresse,
         'citycode': code_insee,
@@ -28,26 +52,132 @@ def retrieve_id_ban(adresse:str , code_insee:str) -> tuple:
     }
 
     try:
-        response = requests.get(base_url_ban, params=params)
+        with pipeline_metrics.stage('api.ban.search'):
+            response = http_client.get(base_url_ban, params=params)
         
         if response.status_code == 200:
             data = response.json()
             if data['features']:
                 id_ban = data['features'][0]['properties']['id']
                 score_ban = data['features'][0]['properties']['score']
-                return id_ban, score_ban
             else:
-                return None, None
+                id_ban, score_ban = None, None
+            if cache is not None and adresse and code_insee:
+                cache.put(adresse, code_insee, id_ban, score_ban)
+            return id_ban, score_ban
         else:
-            print(f"Erreur lors de la requête: {response.status_code}")
+            logger.warning(f"Erreur lors de la requête BAN pour '{adresse}' ({code_insee}): {response.status_code}")
             return None, None
     except Exception as e:
-        print(f"Exception lors de la récupération de l'ID BAN: {str(e)}")
+        logger.error(f"Exception lors de la récupération de l'ID BAN pour '{adresse}' ({code_insee}): {e}")
         return None, None
     finally:
         # Pause pour éviter de surcharger l'API qui esr limitée à 50 requetes/seconde/IP
         time.sleep(0.02)
 
+def _geocode_csv_chunk(chunk: pd.DataFrame, base_url: str) -> pd.DataFrame:
+    """
+    Envoie un paquet d'adresses à l'endpoint /search/csv/ de la BAN.
+
+    Args:
+        chunk (pd.DataFrame): Paquet d'adresses avec les colonnes 'adresse' et 'citycode'.
+        base_url (str): URL de base de l'API adresse (remplaçable par un serveur local de test).
+
+    Returns:
+        pd.DataFrame: Colonnes 'id_ban' et 'score_ban', dans l'ordre du paquet envoyé.
+    """
+    buffer = io.StringIO()
+    chunk[['adresse', 'citycode']].to_csv(buffer, index=False)
+    with pipeline_metrics.stage('api.ban.search_csv', rows=len(chunk)):
+        response = http_client.post(
+            f"{base_url}/search/csv/",
+            files={'data': ('adresses.csv', buffer.getvalue().encode('utf-8'), 'text/csv')},
+            data={
+                'columns': 'adresse',
+                'citycode': 'citycode',
+                'result_columns': ['result_id', 'result_score']
+            },
+            timeout=300
+        )
+    response.raise_for_status()
+    result = pd.read_csv(io.StringIO(response.text), dtype={'result_id': str})
+    if len(result) != len(chunk):
+        raise ValueError(f"Réponse BAN incomplète : {len(result)} lignes reçues pour {len(chunk)} envoyées")
+
+    return pd.DataFrame({
+        'id_ban': result['result_id'].to_numpy(dtype=object),
+        'score_ban': pd.to_numeric(result['result_score'], errors='coerce').to_numpy()
+    }, index=chunk.index)
+
+
+def retrieve_id_ban_batch(
+    df: pd.DataFrame,
+    adresse_col: str = 'adresse_normalisee',
+    code_insee_col: str = 'code_insee_commune',
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    base_url: str = BASE_URL_BAN,
+    cache: Optional[GeocodeCache] = geocode_cache
+) -> pd.DataFrame:
+    """
+    Géocode toutes les adresses d'un DataFrame via l'endpoint CSV de la BAN.
+    Les couples (adresse, code INSEE) sont dédoublonnés avant l'envoi : une adresse présente
+    plusieurs fois dans le DataFrame n'est géocodée qu'une seule fois.
+    Seuls les couples absents du cache persistant sont envoyés à l'API.
+
+    Args:
+        df (pd.DataFrame): DataFrame contenant les adresses (par ex. DVF nettoyé).
+        adresse_col (str): Nom de la colonne de l'adresse.
+        code_insee_col (str): Nom de la colonne du code INSEE.
+        chunk_size (int): Nombre d'adresses distinctes envoyées par requête.
+        base_url (str): URL de base de l'API adresse (remplaçable par un serveur local de test).
+        cache (GeocodeCache): Cache persistant consulté avant l'API (None pour le désactiver).
+
+    Returns:
+        pd.DataFrame: Le DataFrame d'origine avec les colonnes 'id_ban' et 'score_ban' ajoutées
+        (None / NaN si l'adresse n'a pas été trouvée).
+    """
+    # Clés normalisées, identiques à celles du cache
+    keys = pd.DataFrame({
+        'adresse': normalize_adresse_series(df[adresse_col].astype('string')),
+        'citycode': df[code_insee_col].astype('string')
+    }, index=df.index).astype(object)
+    pairs = keys.dropna().drop_duplicates().reset_index(drop=True)
+    pairs = pairs[pairs['adresse'] != '']
+
+    with pipeline_metrics.stage('ban.cache_lookup', rows=len(pairs)):
+        cached = cache.get_many(pairs) if cache is not None else pairs.iloc[0:0].assign(id_ban=None, score_ban=None)
+    to_geocode = pairs.merge(cached[['adresse', 'citycode']], how='left', on=['adresse', 'citycode'], indicator=True)
+    to_geocode = to_geocode[to_geocode['_merge'] == 'left_only'].drop(columns=['_merge']).reset_index(drop=True)
+    logger.info(f"Géocodage BAN de {len(pairs)} adresses distinctes ({len(df)} lignes) : "
+                f"{len(cached)} dans le cache, {len(to_geocode)} à géocoder")
+
+    geocoded = []
+    for start in range(0, len(to_geocode), chunk_size):
+        chunk = to_geocode.iloc[start:start + chunk_size]
+        try:
+            result = _geocode_csv_chunk(chunk, base_url)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # Le paquet en erreur est laissé sans identifiant BAN et n'est pas mis en cache
+            logger.warning(f"Erreur lors du géocodage du paquet {start}-{start + len(chunk) - 1}: {str(e)}")
+            continue
+        geocoded.append(chunk.join(result))
+        if cache is not None:
+            cache.put_many(zip(chunk['adresse'], chunk['citycode'], result['id_ban'], result['score_ban']))
+
+    resolved = pd.concat([cached] + geocoded, ignore_index=True)
+    if cache is not None:
+        logger.info(f"Cache de géocodage : {cache.stats()}")
+
+    # On rattache les résultats à toutes les lignes partageant le même couple (adresse, code INSEE)
+    merged = keys.merge(resolved, how='left', on=['adresse', 'citycode'])
+    merged.index = df.index
+    merged = df.drop(columns=['id_ban', 'score_ban'], errors='ignore').join(merged[['id_ban', 'score_ban']])
+    # Les adresses non trouvées ont un id_ban à None (et non NaN)
+    id_ban = merged['id_ban'].to_numpy(dtype=object)
+    merged['id_ban'] = np.where(pd.notna(id_ban), id_ban, None)
+    return merged
+
+
 def test():
     """
     Fonction de test de la fonction  retrieve_id_ban(adresse, code_insee)
@@ -57,47 +187,28 @@ def test():
     """
 
 
-    from data_process.fill_dvf import load_dvf_file, clean_dvf_data
+    from data_process.fill_dvf import load_clean_dvf
     import os
-    from data_process.utils.parser import safe_int_conversion
     from config import DATA_DIR
-    import pandas as pd
 
     # Chemin du fichier DVF
     file_path = os.path.join(DATA_DIR,"ValeursFoncieres-2023.txt")
 
-    # Charger et nettoyer les données DVF
-    df = load_dvf_file(file_path)
-    df = clean_dvf_data(df)
+    # Charger les données DVF nettoyées (cache Parquet), uniquement les colonnes utiles
+    df = load_clean_dvf(file_path, columns=['adresse_normalisee', 'code_insee_commune'])
 
 
     # Afficher les 10 premières lignes du DataFrame nettoyé
     df_cleaned = df.head(10)
-    print(df_cleaned)
-    #print(df_cleaned[['adresse_normalisee', 'code_insee_commune']])
+    print(df_cleaned[['adresse_normalisee', 'code_insee_commune']])
 
 
     for _, row in df_cleaned.iterrows():
-        adresse_parts = []
-        if pd.notna(row['No voie']) and row['No voie'].strip():
-            adresse_parts.append(row['No voie'].strip())
-        if pd.notna(row['Type de voie']) and row['Type de voie'].strip():
-            adresse_parts.append(row['Type de voie'].strip())
-        if pd.notna(row['Voie']) and row['Voie'].strip():
-            adresse_parts.append(row['Voie'].strip())
-        adresse_normalisee = ' '.join(adresse_parts) if adresse_parts else None
-    
-        # Construction du code INSEE complet
-        code_dept = safe_int_conversion(row['Code departement']) #convertit string en entier
-        code_commune = safe_int_conversion(row['Code commune']) #convertit string en entier
-        if code_dept is not None and code_commune is not None:
-            code_insee_complet = (code_dept * 1000) + code_commune
-            code_insee_commune = str(code_insee_complet).zfill(5)  # Formatage sur 5 chiffres
-        else:
-            print(f"Le code insee commune n'est pas identifiable, l'enregistrement est ignorée")
-            continue    #On passe à la ligne suivante
+        # Adresse et code INSEE sont précalculés lors du nettoyage
+        adresse_normalisee = row['adresse_normalisee']
+        code_insee_commune = row['code_insee_commune']
 
-        if adresse_normalisee is None or not adresse_normalisee.strip():
+        if not adresse_normalisee:
             print(f"L'adresse normalisée est vide pour l'enregistrement : {row}")
             continue
         # Requête à l'API pour récupérer l'ID BAN
@@ -109,6 +220,22 @@ def test():
         
         print(f"ID BAN trouvé : {id_ban}, score ban : {score}")
     return
+
+
+def test_batch(base_url: str = BASE_URL_BAN):
+    """
+    Fonction de test de la fonction retrieve_id_ban_batch(df).
+    L'URL de base peut pointer vers un serveur local qui simule l'endpoint /search/csv/.
+
+    Returns:
+        None
+    """
+    df = pd.DataFrame({
+        'adresse_normalisee': ['8 BD DU PORT', '8 BD DU PORT', '2 RUE NATIONALE'],
+        'code_insee_commune': ['80021', '80021', '37261']
+    })
+    df = retrieve_id_ban_batch(df, base_url=base_url)
+    print(df)
     
 if __name__ == "__main__":
     
@@ -86,20 +86,20 @@ def load_communes_to_PG(df_communes: pd.DataFrame):
 
     with Session(engine) as session:
         try:
-            for _, row in df_communes.iterrows():
-                commune = CommuneCreate(
+            communes = [
+                CommuneCreate(
                     code_insee_commune=row['#code_commune_insee'],
                     nom_commune=row['nom_de_la_commune'],
                     code_postal=row['code_postal']
                 )
-                
-                # On crée la commune si elle n'existe pas déjà
-                # Le test de l'existence se fait dans la méthode get_or_create_commune
-                commune = commune_crud.get_or_create_commune(
-                    session, commune
-                )
-                
-                logger.info(f"Commune: {commune.nom_commune} ({commune.code_postal}) → ID: {commune.id_commune}")
+                for _, row in df_communes.iterrows()
+            ]
+            
+            # On crée par lots les communes qui n'existent pas déjà
+            # Le test de l'existence est fait par la contrainte d'unicité (INSERT ... ON CONFLICT DO NOTHING)
+            nb_created = commune_crud.insert_many(session, communes)
+            
+            logger.info(f"{nb_created} communes créées sur {len(communes)} lignes")
                 
         except Exception as e:
             logger.error(f"Erreur: {str(e)}")
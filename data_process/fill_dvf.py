@@ -1,18 +1,26 @@
 # data_process/fill_dvf.py
 
 import os
+import numpy as np
 import pandas as pd
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from config import DATA_DIR
 from typing import Optional
 from sqlmodel import Session
 from bddpg import engine
 from bddpg import BienImmobilierCreate, bien_immobilier_crud
 from bddpg import TransactionDVFCreate, transaction_dvf_crud
-from bddpg import commune_crud
 from bddpg import DPECreate, dpe_crud
-from data_process import retrieve_id_ban, retrieve_dpe_by_identifiant_ban
-from data_process import safe_int_conversion
+from data_process import retrieve_id_ban_batch, retrieve_dpe_by_identifiants_ban
+from data_process.commune_index import CommuneIndex
+from common.metrics import pipeline_metrics, peak_rss_mb
+from common.http_client import http_client
+from data_process.dvf_staging import is_staging_valid, read_staging, write_staging, to_default_dtypes
+from data_process.dvf_bulk import load_dvf_to_PG_bulk, load_dvf_file_to_PG_bulk, dvf_source_name, DEFAULT_BATCH_SIZE, DPE_SOURCE_API
+from data_process.dvf_delta import compute_dvf_fingerprints, apply_dvf_delta
+from data_process.price_rollup import refresh_price_rollup
 import logging
 import sys
 
@@ -30,6 +38,114 @@ logger = logging.getLogger(__name__)
 
 
 
+# Colonnes du fichier DVF conservées et leurs types
+DVF_COLUMNS = [
+    'Date mutation',
+    'Nature mutation',
+    'Valeur fonciere',
+    'No voie',
+    'B/T/Q',
+    'Type de voie',
+    'Code voie',
+    'Voie',
+    'Code postal',
+    'Commune',
+    'Code departement',
+    'Code commune',
+    'Prefixe de section',
+    'Section',
+    'No plan',
+    'Code type local',
+    'Type local',
+    'Surface reelle bati',
+    'Nombre pieces principales',
+    'Surface terrain'
+]
+
+DVF_DTYPES = {
+    'Nature mutation' : 'object',
+    'Valeur fonciere' : 'float32',
+    'No voie' : 'object',
+    'B/T/Q' : 'object',
+    'Type de voie' : 'object',
+    'Code voie' : 'object',
+    'Voie' : 'object',
+    'Code postal' : 'object',
+    'Commune' : 'object',
+    'Code departement' : 'object',
+    'Code commune' : 'object',
+    'Prefixe de section' : 'object',
+    'Section' : 'object',
+    'No plan' : 'Int16',
+    'Code type local' : 'Int8',
+    'Type local' : 'object',
+    'Surface reelle bati' : 'Int32',
+    'Nombre pieces principales' : 'Int8',
+    'Surface terrain' : 'Int32'
+}
+
+# Mode mémoire réduite : colonnes texte à faible cardinalité stockées en catégories,
+# les autres colonnes texte en chaînes Arrow
+DVF_CATEGORY_COLUMNS = [
+    'Nature mutation',
+    'B/T/Q',
+    'Type de voie',
+    'Code postal',
+    'Commune',
+    'Code departement',
+    'Code commune',
+    'Prefixe de section',
+    'Section',
+    'Type local'
+]
+
+DVF_LOW_MEMORY_DTYPES = {
+    col: 'category' if col in DVF_CATEGORY_COLUMNS else 'string[pyarrow]' if dtype == 'object' else dtype
+    for col, dtype in DVF_DTYPES.items()
+}
+# Le moteur pyarrow ne gère pas le séparateur décimal ',' : la valeur foncière est convertie après lecture
+DVF_LOW_MEMORY_DTYPES['Valeur fonciere'] = 'string[pyarrow]'
+
+# Colonnes texte complétées par un champ vide au nettoyage
+DVF_FILLNA_TEXT_COLUMNS = ['B/T/Q', 'No voie', 'Type de voie', 'Voie', 'Code postal', 'Prefixe de section', 'Section']
+
+# Colonnes identifiant une transaction (une mutation peut porter sur plusieurs lignes)
+TRANSACTION_KEY = ['Date mutation', 'Valeur fonciere', 'Code departement', 'Code commune', 'Code voie']
+
+# Nombre de lignes lues à la fois en mode streaming
+DEFAULT_CHUNKSIZE = 500000
+
+# Enregistrement ligne à ligne : nombre de lignes dont les DPE sont récupérés avant leur enregistrement
+DPE_BATCH_SIZE = 1000
+
+# Version du nettoyage : à incrémenter à chaque modification de clean_dvf_data / compute_dvf_keys
+# pour invalider le cache Parquet des fichiers nettoyés
+CLEANING_VERSION = "1"
+
+
+def _read_dvf_csv(file_path: str, **kwargs):
+    """
+    Lit le fichier DVF avec les colonnes et types définis dans DVF_COLUMNS et DVF_DTYPES.
+    Les paramètres supplémentaires (ex. chunksize) sont transmis à pd.read_csv.
+    """
+    # Vérification de l'existence du fichier
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
+    # Chargement du fichier DVF
+    logger.info(f"Chargement du fichier DVF depuis {file_path}...")
+
+    return pd.read_csv(
+        file_path,
+        sep='|',  # Le séparateur est une barre verticale
+        decimal=',',  # Le séparateur décimal est une virgule
+        usecols=DVF_COLUMNS,  # On ne garde que les colonnes nécessaires
+        dtype=DVF_DTYPES,  # On spécifie les types de colonnes
+        parse_dates=['Date mutation'],  # On parse la colonne des dates au  format datetime
+        na_values=['NULL', '', '-'],  # Valeurs à considérer comme
+        **kwargs
+    )
+
+
 def load_dvf_file(file_path: str) -> pd.DataFrame:
     """
     Charge le fichier DVF dans un DataFrame pandas.
@@ -40,90 +156,75 @@ def load_dvf_file(file_path: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: DataFrame contenant les données du fichier DVF
     """
-    df = pd.DataFrame()
-    # Vérification de l'existence du fichier
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
-    # Chargement du fichier DVF
-    logger.info(f"Chargement du fichier DVF depuis {file_path}...")
+    return _read_dvf_csv(file_path)
 
-    col_to_keep = [
-        'Date mutation',
-        'Nature mutation',
-        'Valeur fonciere',
-        'No voie',
-        'B/T/Q',
-        'Type de voie',
-        'Code voie',
-        'Voie',
-        'Code postal',
-        'Commune',
-        'Code departement',
-        'Code commune',
-        'Prefixe de section',
-        'Section',
-        'No plan',
-        'Code type local',
-        'Type local',
-        'Surface reelle bati',
-        'Nombre pieces principales',
-        'Surface terrain'
-    ]
+
+def iter_dvf_file(file_path: str, chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    Lit le fichier DVF par morceaux de taille bornée.
     
-    col_type = {
-        'Nature mutation' : 'object',
-        'Valeur fonciere' : 'float32',
-        'No voie' : 'object',
-        'B/T/Q' : 'object',
-        'Type de voie' : 'object',
-        'Code voie' : 'object',
-        'Voie' : 'object',
-        'Code postal' : 'object',
-        'Commune' : 'object',
-        'Code departement' : 'object',
-        'Code commune' : 'object',
-        'Prefixe de section' : 'object',
-        'Section' : 'object',
-        'No plan' : 'Int16',
-        'Code type local' : 'Int8',
-        'Type local' : 'object',
-        'Surface reelle bati' : 'Int32',
-        'Nombre pieces principales' : 'Int8',
-        'Surface terrain' : 'Int32'
-    }
+    Parameters:
+        file_path (str): Chemin vers le fichier DVF
+        chunksize (int): Nombre de lignes par morceau
     
+    Returns:
+        Iterator[pd.DataFrame]: Morceaux successifs du fichier DVF
+    """
+    with _read_dvf_csv(file_path, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def load_dvf_file_low_memory(file_path: str) -> pd.DataFrame:
+    """
+    Charge le fichier DVF avec le moteur CSV pyarrow, les colonnes texte en catégories
+    ou en chaînes Arrow (DVF_LOW_MEMORY_DTYPES) au lieu d'objets Python.
+
+    Parameters:
+        file_path (str): Chemin vers le fichier DVF
+
+    Returns:
+        pd.DataFrame: DataFrame contenant les données du fichier DVF
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Le fichier {file_path} n'existe pas.")
+    logger.info(f"Chargement du fichier DVF (mémoire réduite) depuis {file_path}...")
+
     df = pd.read_csv(
         file_path,
-        sep='|',  # Le séparateur est une barre verticale
-        decimal=',',  # Le séparateur décimal est une virgule
-        usecols=col_to_keep,  # On ne garde que les colonnes nécessaires
-        dtype=col_type,  # On spécifie les types de colonnes
-        parse_dates=['Date mutation'],  # On parse la colonne des dates au  format datetime
-        na_values=['NULL', '', '-']  # Valeurs à considérer comme
+        sep='|',
+        engine='pyarrow',  # Lecture multithread, sans passer par des objets Python
+        usecols=DVF_COLUMNS,
+        dtype=DVF_LOW_MEMORY_DTYPES,
+        na_values=['NULL', '', '-']
     )
+    # Séparateur décimal et format de date convertis ici, le moteur pyarrow ne les gérant pas
+    df['Valeur fonciere'] = pd.to_numeric(
+        df['Valeur fonciere'].str.replace(',', '.', regex=False), errors='coerce'
+    ).to_numpy(dtype='float32', na_value=np.nan)
+    df['Date mutation'] = pd.to_datetime(df['Date mutation'], format='%d/%m/%Y', errors='coerce')
     return df
 
-def clean_dvf_data(df: pd.DataFrame) -> pd.DataFrame:
+
+def filter_dvf_rows(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Nettoie le DataFrame DVF.
+    Etapes de nettoyage qui ne dépendent que de la ligne elle-même (applicables morceau par morceau).
     
     Parameters:
         df (pd.DataFrame): DataFrame contenant les données DVF
     
     Returns:
-        pd.DataFrame: DataFrame nettoyé
+        pd.DataFrame: DataFrame filtré
     """
     # On supprime les lignes dont la nature de mutation est 'Echange'
     df = df[df['Nature mutation'] != 'Echange']
     
     # On élimine les lignes dont les valeurs foncières sont manquantes
-    df = df[df['Valeur fonciere'].notna()]
+    df = df[df['Valeur fonciere'].notna()].copy()
     
     # Les valeurs foncières en virgule flottante ne nous intéressent pas vraiment, on va les convertir en entiers
     df['Valeur fonciere'] = df['Valeur fonciere'].astype('int32')
     
-    # Supprimer les doublons (conserver la première occurrence)
-    df = df.drop_duplicates()
     # On va compléter les NaN des Surfaces et nombre de pièces par 0
     df.loc[:, 'Surface reelle bati'] = df['Surface reelle bati'].fillna(0)
     df.loc[:, 'Surface terrain'] = df['Surface terrain'].fillna(0)
@@ -146,11 +247,53 @@ def clean_dvf_data(df: pd.DataFrame) -> pd.DataFrame:
     filtre = (df['Type local'].isna()) | (df['Type local'] == 'Dépendance') 
     df = df[~filtre]
 
+    # on s'assure que toutes les dates soient au même format pour le tri, c'est mieux !
+    df.loc[:, 'Date mutation'] = pd.to_datetime(df['Date mutation'], format='%d/%m/%Y', errors='coerce')
+    return df
+
+
+def finalize_dvf_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derniers filtres ligne à ligne puis calcul des clés des biens.
+    
+    Parameters:
+        df (pd.DataFrame): DataFrame DVF dont les transactions multi-lignes ont été retirées
+    
+    Returns:
+        pd.DataFrame: DataFrame nettoyé
+    """
+    # On efface les lignes dont la valeur fonciere est inférieure à 1€ car ce n'est pas représentatif.
+    # On pourra sans doute augmenter cette valeur autour de 1000€ ou plus
+    filtre = df['Valeur fonciere'] <= 1
+    df = df[~filtre]
+    # Et on retire les lignes dont la surface reelle bati est nulle car seul le bati nous interesse
+    df = df[df['Surface reelle bati'] != 0]
+
+    # On va recréer l'index du dataframe pour qu'il soit propre
+    df = df.reset_index(drop=True)
+
+    # On calcule les clés des biens (code INSEE, adresse, référence cadastrale) sur les colonnes entières
+    return compute_dvf_keys(df)
+
+
+def clean_dvf_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nettoie le DataFrame DVF.
+    
+    Parameters:
+        df (pd.DataFrame): DataFrame contenant les données DVF
+    
+    Returns:
+        pd.DataFrame: DataFrame nettoyé
+    """
+    df = filter_dvf_rows(df)
+
+    # Supprimer les doublons (conserver la première occurrence)
+    df = df.drop_duplicates()
 
     # On regroupe les transactions par date et valeurs et on crée un id_transaction pour chacun de ces couples
-    df.loc[:, 'Date mutation'] = pd.to_datetime(df['Date mutation'], format='%d/%m/%Y', errors='coerce') # on s'assure que toutes les dates soient au même format pour le tri, c'est mieux !
     df = df.sort_values(by=['Date mutation', 'Valeur fonciere', 'Code departement', 'Code commune']).reset_index(drop=True) 
-    col_id_transaction = df.groupby(['Date mutation', 'Valeur fonciere', 'Code departement', 'Code commune', 'Code voie']).ngroup()
+    col_id_transaction = df.groupby(TRANSACTION_KEY).ngroup()
     df.insert(loc=0, column='id_transaction', value=col_id_transaction)
 
     # On ne garde que les transactions avec une ligne unique car il y a souvent les memes biens qui apparaissent 2 fois sur la même transaction
@@ -160,16 +303,233 @@ def clean_dvf_data(df: pd.DataFrame) -> pd.DataFrame:
     unique_id_transactions_list = unique_id_transactions_values.tolist()
     df =  df[df['id_transaction'].isin(unique_id_transactions_list)]
 
-    # On efface les lignes dont la valeur fonciere est inférieure à 1€ car ce n'est pas représentatif.
-    # On pourra sans doute augmenter cette valeur autour de 1000€ ou plus
-    filtre = df['Valeur fonciere'] <= 1
-    df = df[~filtre]
-    # Et on retire les lignes dont la surface reelle bati est nulle car seul le bati nous interesse
-    df = df[df['Surface reelle bati'] != 0]
+    return finalize_dvf_rows(df)
 
-    # On va recréer l'index du dataframe pour qu'il soit propre
-    df.reset_index(drop=True, inplace=True)
+
+def clean_dvf_data_low_memory(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nettoie un DataFrame DVF chargé par load_dvf_file_low_memory.
+    Mêmes règles que clean_dvf_data, mais les filtres ligne à ligne sont combinés en un seul masque (une seule copie),
+    les compléments sont faits en place et le filtre des transactions à ligne unique utilise groupby().transform('size')
+    au lieu d'un isin sur la liste Python des id. Le résultat a les mêmes types que clean_dvf_data.
+
+    Parameters:
+        df (pd.DataFrame): DataFrame contenant les données DVF (types DVF_LOW_MEMORY_DTYPES)
+
+    Returns:
+        pd.DataFrame: DataFrame nettoyé
+    """
+    # Nature de mutation 'Echange', valeur foncière manquante, type de local manquant ou 'Dépendance' (cf. filter_dvf_rows)
+    filtre = (
+        (df['Nature mutation'] != 'Echange')
+        & df['Valeur fonciere'].notna()
+        & df['Type local'].notna()
+        & (df['Type local'] != 'Dépendance')
+    )
+    # Copie superficielle : les colonnes remplacées ci-dessous ne modifient pas le DataFrame d'origine
+    df = df[filtre.to_numpy()].copy(deep=False)
+
+    df['Valeur fonciere'] = df['Valeur fonciere'].astype('int32')
+    for col in ['Surface reelle bati', 'Surface terrain', 'Nombre pieces principales']:
+        df[col] = df[col].fillna(0)
+    for col in DVF_FILLNA_TEXT_COLUMNS:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and '' not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories('')
+        df[col] = df[col].fillna('')
+
+    df.drop_duplicates(inplace=True)
+    df.sort_values(by=['Date mutation', 'Valeur fonciere', 'Code departement', 'Code commune'], inplace=True, ignore_index=True)
+
+    # observed=True : seules les combinaisons présentes des catégories forment des groupes
+    groupes = df.groupby(TRANSACTION_KEY, observed=True)
+    df.insert(loc=0, column='id_transaction', value=groupes.ngroup())
+    # Les lignes dont la clé contient un NaN n'appartiennent à aucun groupe (taille NaN) et sont écartées comme dans clean_dvf_data
+    taille = groupes['Valeur fonciere'].transform('size')
+    df = df[(taille == 1).to_numpy()]
+
+    return finalize_dvf_rows(to_default_dtypes(df))
+
+
+def _load_and_clean(file_path: str, low_memory: bool = False) -> pd.DataFrame:
+    """Lecture et nettoyage d'un fichier DVF, en mode standard ou mémoire réduite"""
+    if low_memory:
+        return clean_dvf_data_low_memory(load_dvf_file_low_memory(file_path))
+    return clean_dvf_data(load_dvf_file(file_path))
+
+
+def load_clean_dvf(file_path: str, columns: Optional[list] = None, departements: Optional[list] = None,
+                   use_staging: bool = True, low_memory: bool = False) -> pd.DataFrame:
+    """
+    Retourne le DataFrame nettoyé d'un fichier DVF en passant par le cache Parquet (data/staging).
+    Le fichier n'est relu et renettoyé que si le cache est absent ou invalide (fichier source ou CLEANING_VERSION modifié).
+    
+    Parameters:
+        file_path (str): Chemin vers le fichier DVF
+        columns (list): Colonnes à charger (toutes par défaut)
+        departements (list): Codes département à charger (tous par défaut)
+        use_staging (bool): Si False, lecture et nettoyage directs sans cache
+        low_memory (bool): Lecture et nettoyage en mode mémoire réduite (catégories, chaînes Arrow) si le cache est à refaire
+    
+    Returns:
+        pd.DataFrame: DataFrame nettoyé
+    """
+    if not use_staging:
+        df = _load_and_clean(file_path, low_memory)
+        if departements:
+            df = df[df['Code departement'].isin([str(d) for d in departements])].reset_index(drop=True)
+        return df[columns] if columns else df
+
+    if not is_staging_valid(file_path, CLEANING_VERSION):
+        write_staging(file_path, _load_and_clean(file_path, low_memory), CLEANING_VERSION)
+    # On relit toujours le cache pour que l'ordre des lignes (et donc les lots du journal de reprise) soit stable
+    return read_staging(file_path, columns=columns, departements=departements)
+
+
+def _measure_cleaning(file_path: str, low_memory: bool) -> dict:
+    """Lecture et nettoyage sans cache, mesurés dans le processus courant (voir benchmark_cleaning)"""
+    start_time = time.perf_counter()
+    df = _load_and_clean(file_path, low_memory)
+    return {
+        "mode": "low_memory" if low_memory else "standard",
+        "rows": len(df),
+        "seconds": round(time.perf_counter() - start_time, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "dataframe_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 1)
+    }
+
+
+def benchmark_cleaning(file_path: str) -> list:
+    """
+    Compare le temps et le pic mémoire de la lecture + nettoyage d'un fichier DVF en mode standard et mémoire réduite.
+    Chaque mode est exécuté dans un nouveau processus pour que le pic de RSS lui soit propre.
+
+    Parameters:
+        file_path (str): Chemin vers le fichier DVF
+
+    Returns:
+        list: Une mesure par mode (lignes, secondes, pic RSS du processus, taille du DataFrame nettoyé en Mo)
+    """
+    results = []
+    for low_memory in (False, True):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results.append(executor.submit(_measure_cleaning, file_path, low_memory).result())
+        logger.info(f"{os.path.basename(file_path)} : nettoyage {results[-1]}")
+    return results
+
+
+def _filter_streaming_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Filtres ligne à ligne + suppression des lignes sans clé de transaction complète (ignorées par le groupby)"""
+    df = filter_dvf_rows(df)
+    return df[df[TRANSACTION_KEY].notna().all(axis=1)]
+
+
+def _hash_rows(df: pd.DataFrame, columns: Optional[list] = None) -> np.ndarray:
+    """Empreinte 64 bits de chaque ligne (sur toutes les colonnes ou sur `columns`)"""
+    data = df if columns is None else df[columns]
+    return pd.util.hash_pandas_object(data, index=False).to_numpy()
+
+
+def iter_clean_dvf_chunks(file_path: str, chunksize: int = DEFAULT_CHUNKSIZE):
+    """
+    Nettoie le fichier DVF en streaming, morceau par morceau, avec le même résultat que clean_dvf_data.
+    
+    Les étapes qui portent sur plusieurs lignes (doublons, regroupement par transaction, transactions
+    à ligne unique) sont résolues par une première lecture qui ne conserve que deux empreintes 64 bits
+    par ligne : celle de la clé de transaction et celle de la ligne complète. Une transaction est gardée
+    si elle ne compte qu'une seule ligne distincte, quel que soit le morceau où ses lignes apparaissent.
+    La seconde lecture nettoie et renvoie chaque morceau. La mémoire utilisée est celle d'un morceau
+    plus 16 octets par ligne du fichier.
+    
+    Parameters:
+        file_path (str): Chemin vers le fichier DVF
+        chunksize (int): Nombre de lignes lues à la fois
     
+    Returns:
+        Iterator[pd.DataFrame]: Morceaux nettoyés (colonne id_transaction = empreinte de la transaction)
+    """
+    # Passe 1 : empreintes (clé de transaction, ligne) des lignes conservées par les filtres ligne à ligne
+    key_hashes, row_hashes = [], []
+    for chunk in iter_dvf_file(file_path, chunksize):
+        chunk = _filter_streaming_rows(chunk)
+        key_hashes.append(_hash_rows(chunk, TRANSACTION_KEY))
+        row_hashes.append(_hash_rows(chunk))
+    keys = np.concatenate(key_hashes) if key_hashes else np.empty(0, dtype=np.uint64)
+    rows = np.concatenate(row_hashes) if row_hashes else np.empty(0, dtype=np.uint64)
+    del key_hashes, row_hashes
+
+    # Lignes distinctes (équivalent de drop_duplicates), puis nombre de lignes distinctes par transaction
+    order = np.lexsort((rows, keys))
+    keys, rows = keys[order], rows[order]
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+    unique_keys, counts = np.unique(keys[distinct], return_counts=True)
+    single_keys = unique_keys[counts == 1]
+    del order, keys, rows, distinct, unique_keys, counts
+    logger.info(f"{file_path} : {len(single_keys)} transactions à ligne unique")
+    if len(single_keys) == 0:
+        return
+
+    # Passe 2 : on ne garde que la première occurrence des transactions à ligne unique
+    emitted = np.zeros(len(single_keys), dtype=bool)
+    for chunk in iter_dvf_file(file_path, chunksize):
+        chunk = _filter_streaming_rows(chunk)
+        chunk_keys = _hash_rows(chunk, TRANSACTION_KEY)
+        positions = np.searchsorted(single_keys, chunk_keys)
+        positions[positions == len(single_keys)] = 0
+        kept = single_keys[positions] == chunk_keys
+        _, first = np.unique(np.where(kept, positions, -1), return_index=True)
+        first_occurrence = np.zeros(len(chunk), dtype=bool)
+        first_occurrence[first] = True
+        kept &= first_occurrence & ~emitted[positions]
+        emitted[positions[kept]] = True
+
+        chunk = chunk[kept]
+        chunk.insert(loc=0, column='id_transaction', value=chunk_keys[kept].view(np.int64))
+        yield finalize_dvf_rows(chunk)
+
+
+def compute_dvf_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ajoute au DataFrame DVF les colonnes code_insee_commune, adresse_normalisee et reference_cadastrale_parcelle,
+    calculées colonne par colonne (sans boucle Python par ligne).
+    Les lignes dont le code INSEE n'est pas identifiable sont supprimées.
+    
+    Parameters:
+        df (pd.DataFrame): DataFrame DVF nettoyé
+    
+    Returns:
+        pd.DataFrame: DataFrame avec les colonnes calculées
+    """
+    # Code INSEE = code département sur 2 caractères + code commune sur 3 chiffres
+    # Les codes sont traités comme des chaînes pour conserver les départements corses 2A et 2B.
+    # Pour les DOM (971 à 976), le code commune DVF contient déjà le 3e chiffre du département : 971 + 101 => 97101
+    code_dept = df['Code departement'].astype('string').str.strip().str.upper().str.zfill(2).str[:2]
+    code_commune = df['Code commune'].astype('string').str.strip().str.zfill(3)
+    code_insee = code_dept + code_commune
+    code_insee_valide = code_insee.str.fullmatch(r'(\d{2}|2[AB])\d{3}').fillna(False).astype(bool)
+    nb_invalides = int((~code_insee_valide).sum())
+    if nb_invalides:
+        logger.info(f"{nb_invalides} lignes sans code INSEE identifiable sont ignorées")
+    df = df[code_insee_valide].copy()
+    df['code_insee_commune'] = code_insee[code_insee_valide].astype(object)
+
+    # Adresse normalisée = No voie + Type de voie + Voie, sans les parties vides
+    adresse = (
+        df['No voie'].fillna('').astype(str) + ' '
+        + df['Type de voie'].fillna('').astype(str) + ' '
+        + df['Voie'].fillna('').astype(str)
+    ).str.replace(r'\s+', ' ', regex=True).str.strip()
+    adresse = adresse.to_numpy(dtype=object)
+    df['adresse_normalisee'] = np.where(adresse != '', adresse, None)
+
+    # Référence cadastrale = Préfixe de section + Section + No plan
+    df['reference_cadastrale_parcelle'] = (
+        df['Prefixe de section'].fillna('').astype(str)
+        + df['Section'].fillna('').astype(str)
+        + df['No plan'].astype('string').fillna('')
+    ).astype(object)
+
+    df.reset_index(drop=True, inplace=True)
     return df
 
 
@@ -192,13 +552,16 @@ def save_dvf__df_to_csv(df: pd.DataFrame, output_path: str) -> None:
     
 
 
-def load_dvf_to_PG(df: pd.DataFrame, idx: Optional[int] = None):
+def load_dvf_to_PG(df: pd.DataFrame, idx: Optional[int] = None, commune_index: Optional[CommuneIndex] = None,
+                   dpe_batch_size: int = DPE_BATCH_SIZE):
     """
     Enregistre le DataFrame DVF dans la base de données PostgreSQL.
     
     Parameters:
         df (pd.DataFrame): DataFrame contenant les données DVF
         index (int): Index de départ pour l'enregistrement des transactions (par défaut 0)
+        commune_index (CommuneIndex): Dimension commune préchargée (chargée ici si absente)
+        dpe_batch_size (int): Nombre de lignes dont les DPE sont récupérés avant leur enregistrement
     
     Returns:
         None
@@ -209,177 +572,332 @@ def load_dvf_to_PG(df: pd.DataFrame, idx: Optional[int] = None):
         logger.info(f"Reprise du traitement à partir de l'index {idx}")
     else:
         start_index = 0
-        
-    for index, row in df.iterrows():
-        # On ignore les lignes dont l'index est inférieur à start_index
-        if index < start_index:
-            continue
-        logger.info(f"Traitement de la ligne d'index : {index}...")
-        try:
-            # Construction de l'adresse normalisée
-            adresse_parts = []
-            if pd.notna(row['No voie']) and row['No voie'].strip():
-                adresse_parts.append(row['No voie'].strip())
-            if pd.notna(row['Type de voie']) and row['Type de voie'].strip():
-                adresse_parts.append(row['Type de voie'].strip())
-            if pd.notna(row['Voie']) and row['Voie'].strip():
-                adresse_parts.append(row['Voie'].strip())
-            adresse_normalisee = ' '.join(adresse_parts) if adresse_parts else None
-        
-            # Construction du code INSEE complet
-            code_dept = safe_int_conversion(row['Code departement']) #convertit string en entier
-            code_commune = safe_int_conversion(row['Code commune']) #convertit string en entier
-            if code_dept is not None and code_commune is not None:
-                code_insee_complet = (code_dept * 1000) + code_commune
-                code_insee_commune = str(code_insee_complet).zfill(5)  # Formatage sur 5 chiffres
-            else:
-                logger.info(f"Le code insee commune n'est pas identifiable, l'enregistrement est ignorée")
-                continue    #On passe à la ligne suivante
-            
-            # Construction de la référence cadastrale
-            reference_cadastrale_parcelle = row['Prefixe de section'] + row['Section'] + str(row['No plan'])
-            id, score = retrieve_id_ban(adresse_normalisee, code_insee_commune)
+
+    # Résolution des communes en une seule jointure sur la dimension commune en mémoire
+    if commune_index is None:
+        commune_index = CommuneIndex.load()
+    df = commune_index.join(df[df.index >= start_index])
+    sans_commune = df['id_commune'].isna()
+    if sans_commune.any():
+        logger.info(f"{int(sans_commune.sum())} lignes ignorées : aucune commune pour leur couple (code INSEE, code postal)")
+        df = df[~sans_commune]
+
+    # Géocodage BAN par lots des adresses restant à traiter (une requête par paquet d'adresses distinctes)
+    with pipeline_metrics.stage('ban_geocoding', rows=len(df)):
+        df = retrieve_id_ban_batch(df)
+
+    # Les DPE sont récupérés par lots de lignes (requêtes concurrentes dans la limite du quota ADEME),
+    # chaque lot étant enregistré avant de passer au suivant : la progression en base est continue
+    # et une reprise (idx) ne refait que les lots restants
+    index = start_index
+    for batch_start in range(0, len(df), dpe_batch_size):
+        df_batch = df.iloc[batch_start:batch_start + dpe_batch_size]
+        with pipeline_metrics.stage('dpe_enrichment', rows=int(df_batch['id_ban'].notna().sum())):
+            dpes_by_ban = retrieve_dpe_by_identifiants_ban(df_batch['id_ban'])
+
+        for index, row in df_batch.iterrows():
+            # On ignore les lignes dont l'index est inférieur à start_index
+            if index < start_index:
+                continue
+            logger.info(f"Traitement de la ligne d'index : {index}...")
+            try:
+                # Les clés du bien sont précalculées par compute_dvf_keys lors du nettoyage
+                adresse_normalisee = row['adresse_normalisee']
+                code_insee_commune = row['code_insee_commune']
+                reference_cadastrale_parcelle = row['reference_cadastrale_parcelle']
+                id, score = row['id_ban'], row['score_ban']
            
             
 
-            bien = BienImmobilierCreate(
-                #code_insee_commune=code_insee_commune,
-                adresse_normalisee=adresse_normalisee,
-                #code_postal=row['Code postal'] if pd.notna(row['Code postal']) else None,
-                reference_cadastrale_parcelle=reference_cadastrale_parcelle,
-                type_bien=row['Type local'] if pd.notna(row['Type local']) else None,
-                surface_reelle_bati=row['Surface reelle bati'] if pd.notna(row['Surface reelle bati']) else None,
-                nombre_pieces_principales=row['Nombre pieces principales'] if pd.notna(row['Nombre pieces principales']) else None,
-                surface_terrain_totale=row['Surface terrain'] if pd.notna(row['Surface terrain']) else None,
-                source_info_principale="DVF",
-                #id_ban = id if id else None,
-                #score_ban = score if score else None
-            )
-
-            transaction = TransactionDVFCreate(
-                    id_bien=0,
-                    date_mutation=row['Date mutation'].date(),
-                    nature_mutation=row['Nature mutation'],
-                    valeur_fonciere=row['Valeur fonciere']
+                bien = BienImmobilierCreate(
+                    #code_insee_commune=code_insee_commune,
+                    adresse_normalisee=adresse_normalisee,
+                    #code_postal=row['Code postal'] if pd.notna(row['Code postal']) else None,
+                    reference_cadastrale_parcelle=reference_cadastrale_parcelle,
+                    type_bien=row['Type local'] if pd.notna(row['Type local']) else None,
+                    surface_reelle_bati=row['Surface reelle bati'] if pd.notna(row['Surface reelle bati']) else None,
+                    nombre_pieces_principales=row['Nombre pieces principales'] if pd.notna(row['Nombre pieces principales']) else None,
+                    surface_terrain_totale=row['Surface terrain'] if pd.notna(row['Surface terrain']) else None,
+                    source_info_principale="DVF",
+                    #id_ban = id if id else None,
+                    #score_ban = score if score else None
                 )
+
+                transaction = TransactionDVFCreate(
+                        id_bien=0,
+                        date_mutation=row['Date mutation'].date(),
+                        nature_mutation=row['Nature mutation'],
+                        valeur_fonciere=row['Valeur fonciere']
+                    )
             
-            with Session(engine) as session:
-                try:    
-                        # Récupération de l'identifiant_commune
-                        commune = commune_crud.get_by_code_insee_and_cp(
-                            session, 
-                            code_insee_commune, 
-                            row['Code postal']
-                        )
-                        # Si aucune commune n'est trouvée, on ignore l'enregistrement
-                        if not commune:
-                            logger.info(f"Aucune commune trouvée pour le code INSEE {code_insee_commune} et le code postal {row['Code postal']}. L'enregistrement est ignoré.")
-                            continue
-                        # Remarque : on suppose qu'il n'y a qu'une seule commune pour un code INSEE et un code postal
-                        id_commune = commune.id_commune if commune else None
-                        if id_commune is not None:
-                            # on met a jour l'id_commune du bien immobilier que l'on souhaite créer
-                            bien.id_commune = id_commune
-                        else:
-                            logger.info(f"Aucune commune trouvée pour le code INSEE {code_insee_commune} et le code postal {row['Code postal']}. L'enregistrement est ignoré.")
-                            continue
-
-                         # Vérifier si le bien existe déjà avec tous les champs
-                        existing_bien = bien_immobilier_crud.get_by_all_fields(session, bien)
-                        if existing_bien:
-                            logger.info(f"Bien existant trouvé avec ID: {existing_bien.id_bien}")
-                            created_bien = existing_bien
-                        else:
-                            created_bien = bien_immobilier_crud.create(session, bien)
-                            logger.info(f"Nouveau bien créé avec ID: {created_bien.id_bien}")
-                        logger.info(f"Ligne d'index {index} enregistrée avec succès pour le bien ID: {created_bien.id_bien}")
-                        # Maintenant que le bien est créé, on peut enregistrer la transaction
-                        transaction = TransactionDVFCreate(
-                            id_bien=created_bien.id_bien,
-                            date_mutation=row['Date mutation'].date(),
-                            nature_mutation=row['Nature mutation'],
-                            valeur_fonciere=row['Valeur fonciere']
-                        )
-                        # Vérifier si la transaction existe déjà
-                        existing_transaction = transaction_dvf_crud.get_by_all_fields(session, transaction)
-                        if existing_transaction:
-                            logger.info(f"Transaction existante trouvée avec ID: {existing_transaction.id_transaction}")
-                            created_transaction = existing_transaction
-                        else:
-                            created_transaction = transaction_dvf_crud.create(session, transaction)
-                            logger.info(f"Nouvelle transaction créée avec ID: {created_transaction.id_transaction}")
-
-                        logger.info(f"Transaction DVF {index} enregistrée avec succès pour le bien ID: {created_bien.id_bien}")
-                except Exception as e:
-                    logger.error(f"Erreur lors de la création du bien: {e}")
-                    session.rollback()  # Annule la transaction en cas d'erreur
-                    continue
+                with Session(engine) as session:
+                    try:    
+                            # L'identifiant de la commune vient de la jointure avec la dimension commune
+                            bien.id_commune = int(row['id_commune'])
+
+                            # Création du bien s'il n'existe pas (l'unicité est vérifiée par la contrainte sur la clé naturelle)
+                            with pipeline_metrics.stage('row.upsert_bien', rows=1):
+                                id_bien, bien_cree = bien_immobilier_crud.upsert(session, bien)
+                            if bien_cree:
+                                logger.info(f"Nouveau bien créé avec ID: {id_bien}")
+                            else:
+                                logger.info(f"Bien existant trouvé avec ID: {id_bien}")
+                            logger.info(f"Ligne d'index {index} enregistrée avec succès pour le bien ID: {id_bien}")
+                            # Maintenant que le bien est créé, on peut enregistrer la transaction
+                            transaction = TransactionDVFCreate(
+                                id_bien=id_bien,
+                                date_mutation=row['Date mutation'].date(),
+                                nature_mutation=row['Nature mutation'],
+                                valeur_fonciere=row['Valeur fonciere']
+                            )
+                            with pipeline_metrics.stage('row.upsert_transaction', rows=1):
+                                id_transaction, transaction_creee = transaction_dvf_crud.upsert(session, transaction)
+                            if transaction_creee:
+                                logger.info(f"Nouvelle transaction créée avec ID: {id_transaction}")
+                            else:
+                                logger.info(f"Transaction existante trouvée avec ID: {id_transaction}")
+
+                            logger.info(f"Transaction DVF {index} enregistrée avec succès pour le bien ID: {id_bien}")
+                    except Exception as e:
+                        logger.error(f"Erreur lors de la création du bien: {e}")
+                        session.rollback()  # Annule la transaction en cas d'erreur
+                        continue
             
-            # Ajout des donnees DPE si elles existent
-            logger.info(f"Recherche des dpes ayant l'identifiant ban : {id}")
-            if id:
-                dpes =retrieve_dpe_by_identifiant_ban(id)
-                if dpes:
-                    with Session(engine) as session:
-                        try:
-                            for dpe in dpes:
-                                dpe_data = DPECreate(
-                                    id_bien=created_bien.id_bien,
-                                    date_etablissement_dpe=dpe.get('date_etablissement_dpe'),
-                                    etiquette_dpe=dpe.get('etiquette_dpe'),
-                                    etiquette_ges=dpe.get('etiquette_ges'),
-                                    adresse_ban=dpe.get('adresse_ban'),
-                                    identifiant_ban=dpe.get('identifiant_ban'),
-                                    surface_habitable_logement=dpe.get('surface_habitable_logement'),
-                                    adresse_brut=dpe.get('adresse_brut'),
-                                    code_postal_brut=str(dpe.get('code_postal_brut')),
-                                    score_ban=dpe.get('score_ban'),
-                                    numero_dpe=dpe.get('numero_dpe')
-                                )
-                                # Vérifier si le DPE existe déjà
-                                existing_dpe = dpe_crud.get_by_numero_dpe(session, dpe_data.numero_dpe)
-                                if existing_dpe:
-                                    logger.info(f"DPE existant trouvé pour l'identifiant BAN: {dpe_data.identifiant_ban}")    
-                                else:
-                                    # Si le DPE n'existe pas, on l'enregistre
-                                    logger.info(f"Enregistrement du DPE pour l'identifiant BAN: {dpe_data.identifiant_ban}")
-                                    created_dpe = dpe_crud.create(session, dpe_data)
-                                    logger.info(f"DPE ajouté pour le bien ID: {created_bien.id_bien}")
-                        except Exception as e:
-                            logger.error(f"Erreur lors de l'enregistrement du DPE: {e}")
-                            session.rollback()
-                            continue                
-        except Exception as e:
-            logger.error(f"Erreur ligne idex : {index}: {e}")
+                # Ajout des donnees DPE si elles existent
+                logger.info(f"Recherche des dpes ayant l'identifiant ban : {id}")
+                if id:
+                    dpes = dpes_by_ban.get(id)
+                    if dpes:
+                        with Session(engine) as session:
+                            try:
+                                dpes_data = [
+                                    DPECreate(
+                                        id_bien=id_bien,
+                                        date_etablissement_dpe=dpe.get('date_etablissement_dpe'),
+                                        etiquette_dpe=dpe.get('etiquette_dpe'),
+                                        etiquette_ges=dpe.get('etiquette_ges'),
+                                        adresse_ban=dpe.get('adresse_ban'),
+                                        identifiant_ban=dpe.get('identifiant_ban'),
+                                        surface_habitable_logement=dpe.get('surface_habitable_logement'),
+                                        adresse_brut=dpe.get('adresse_brut'),
+                                        code_postal_brut=str(dpe.get('code_postal_brut')),
+                                        score_ban=dpe.get('score_ban'),
+                                        numero_dpe=dpe.get('numero_dpe')
+                                    )
+                                    for dpe in dpes
+                                ]
+                                # Les DPE déjà présents (même numéro) sont ignorés par la contrainte d'unicité
+                                with pipeline_metrics.stage('row.insert_dpe', rows=len(dpes_data)):
+                                    nb_dpe = dpe_crud.insert_many(session, dpes_data)
+                                logger.info(f"{nb_dpe} DPE ajoutés sur {len(dpes_data)} pour le bien ID: {id_bien}")
+                            except Exception as e:
+                                logger.error(f"Erreur lors de l'enregistrement du DPE: {e}")
+                                session.rollback()
+                                continue                
+            except Exception as e:
+                logger.error(f"Erreur ligne idex : {index}: {e}")
+            # Résumé périodique pendant les longs chargements
+            pipeline_metrics.maybe_emit(index=int(index))
     
     logger.info(f"Toutes les transactions DVF ont été traitées et enregistrées avec succès jusqu'à l'index : {index} !")
 
 
-def fill_dvf(idx: Optional[int] = None):
+def list_dvf_files() -> list:
+    """
+    Liste les fichiers DVF présents dans {DATA_DIR} ("ValeursFoncieres*.txt"), triés par nom.
+
+    Returns:
+        list: Chemins des fichiers DVF
+    """
+    return sorted(
+        os.path.join(DATA_DIR, file) for file in os.listdir(DATA_DIR)
+        if file.startswith("ValeursFoncieres") and file.endswith(".txt")
+    )
+
+
+def _load_and_clean_dvf_file(file_path: str, low_memory: bool = False) -> tuple:
+    """
+    Charge et nettoie un fichier DVF. Exécutée dans un processus du pool de fill_dvf_parallel.
+
+    Returns:
+        tuple: (chemin du fichier, DataFrame nettoyé, statistiques de chargement/nettoyage)
+    """
+    start_time = time.time()
+    df_cleaned = load_clean_dvf(file_path, low_memory=low_memory)
+    stats = {
+        "rows_cleaned": len(df_cleaned),
+        "load_clean_seconds": round(time.time() - start_time, 2)
+    }
+    return file_path, df_cleaned, stats
+
+
+def fill_dvf_parallel(max_workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE, low_memory: bool = False,
+                      dpe_source: str = DPE_SOURCE_API) -> dict:
+    """
+    Charge et nettoie les fichiers DVF en parallèle (un processus par fichier), puis les enregistre en base.
+
+    L'écriture reste dans le processus principal (un seul écrivain) : les biens communs à plusieurs années
+    sont dédoublonnés par le chargeur en masse sans accès concurrent à la base.
+    Au plus `max_workers` fichiers sont en cours de traitement ou en attente d'écriture, ce qui borne
+    le nombre de DataFrames nettoyés gardés en mémoire.
+
+    Parameters:
+        max_workers (int): Nombre de processus (par défaut : nombre de fichiers, limité au nombre de CPU)
+        batch_size (int): Nombre de lignes par lot pour l'enregistrement en masse
+        low_memory (bool): Nettoyage en mode mémoire réduite (voir clean_dvf_data_low_memory)
+        dpe_source (str): 'api' ou 'mirror' (copie locale des DPE ADEME, voir dpe_mirror.py)
+
+    Returns:
+        dict: Statistiques par fichier (lignes nettoyées, temps de chargement/nettoyage et d'écriture)
+    """
+    files = list_dvf_files()
+    if not files:
+        logger.info(f"Aucun fichier DVF trouvé dans {DATA_DIR}")
+        return {}
+    if max_workers is None:
+        max_workers = min(len(files), os.cpu_count() or 1)
+
+    start_time = time.time()
+    results = {}
+    remaining = iter(files)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_load_and_clean_dvf_file, file_path, low_memory) for _, file_path in zip(range(max_workers), remaining)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, df_cleaned, stats = future.result()
+                file = os.path.basename(file_path)
+                # Le chargement/nettoyage a eu lieu dans un autre processus : on reporte sa durée
+                pipeline_metrics.record('load_clean', stats['load_clean_seconds'], rows=stats['rows_cleaned'])
+                logger.info(f"{file} : chargé et nettoyé en {stats['load_clean_seconds']:.2f} s ({stats['rows_cleaned']} lignes)")
+                # Un fichier est écrit pendant que les autres processus continuent de charger/nettoyer
+                write_start = time.time()
+                df_cleaned = compute_dvf_fingerprints(df_cleaned, TRANSACTION_KEY)
+                stats["load"] = load_dvf_file_to_PG_bulk(
+                    file_path, df_cleaned, batch_size=batch_size, dpe_source=dpe_source, cleaning_version=CLEANING_VERSION
+                )
+                stats["write_seconds"] = round(time.time() - write_start, 2)
+                del df_cleaned
+                logger.info(f"{file} : enregistré en base en {stats['write_seconds']:.2f} s")
+                results[file] = stats
+                pipeline_metrics.emit(reset=True, file=file)
+
+                next_file = next(remaining, None)
+                if next_file is not None:
+                    pending.add(executor.submit(_load_and_clean_dvf_file, next_file, low_memory))
+
+    logger.info(f"{len(results)} fichiers DVF traités avec {max_workers} processus en {(time.time() - start_time):.2f} secondes")
+    return results
+
+
+def fill_dvf_delta(batch_size: int = DEFAULT_BATCH_SIZE, low_memory: bool = False, dpe_source: str = DPE_SOURCE_API) -> list:
+    """
+    Chargement incrémental des fichiers DVF : pour chaque fichier, les lignes nettoyées sont comparées
+    aux empreintes déjà chargées (table dvf_fingerprint) et seules les différences sont appliquées.
+
+    Parameters:
+        batch_size (int): Nombre de lignes par lot pour le chargement en masse
+        low_memory (bool): Nettoyage en mode mémoire réduite (voir clean_dvf_data_low_memory)
+        dpe_source (str): 'api' ou 'mirror' (copie locale des DPE ADEME, voir dpe_mirror.py)
+
+    Returns:
+        list: Rapport par fichier (lignes nouvelles, modifiées, supprimées, inchangées)
+    """
+    start_time = time.time()
+    reports = []
+    for file_path in list_dvf_files():
+        df_cleaned = compute_dvf_fingerprints(load_clean_dvf(file_path, low_memory=low_memory), TRANSACTION_KEY)
+        reports.append(apply_dvf_delta(df_cleaned, dvf_source_name(file_path), batch_size=batch_size, dpe_source=dpe_source))
+
+    total = {key: sum(report[key] for report in reports) for key in ('inserted', 'changed', 'removed', 'unchanged')}
+    logger.info(f"Chargement incrémental terminé en {(time.time() - start_time):.2f} secondes : {total}")
+    return reports
+
+
+def fill_dvf(idx: Optional[int] = None, bulk: bool = False, batch_size: int = DEFAULT_BATCH_SIZE,
+             streaming: bool = False, chunksize: int = DEFAULT_CHUNKSIZE,
+             parallel: bool = False, max_workers: Optional[int] = None, delta: bool = False,
+             low_memory: bool = False, dpe_source: str = DPE_SOURCE_API):
     """
     Fonction principale pour charger, nettoyer et enregistrer les données DVF dans la base de données PostgreSQL.
     
     Elle traite les fichiers contenu dans {DATA_DIR} qui commencent par "ValeursFoncieres-" et se terminent par ".txt".
     Elle charge les données dans un DataFrame, les nettoie, puis les enregistre dans la base de données postgreSQL.
-    
+
+    Parameters:
+        idx (int): Index de reprise pour l'enregistrement ligne à ligne
+        bulk (bool): Si True, enregistrement en masse par lots (COPY), avec reprise automatique au dernier lot validé
+        batch_size (int): Nombre de lignes par lot en mode bulk
+        streaming (bool): Si True, lecture et nettoyage par morceaux de `chunksize` lignes (mémoire bornée)
+        chunksize (int): Nombre de lignes lues à la fois en mode streaming
+        parallel (bool): Si True, chargement et nettoyage des fichiers en parallèle (voir fill_dvf_parallel)
+        max_workers (int): Nombre de processus en mode parallèle
+        delta (bool): Si True, seules les lignes nouvelles, modifiées ou supprimées depuis le dernier chargement sont appliquées
+        low_memory (bool): Si True, lecture (moteur pyarrow) et nettoyage en mode mémoire réduite (hors streaming)
+        dpe_source (str): En mode bulk, 'api' (appels ADEME par bien) ou 'mirror' (jointure SQL sur la copie locale dpe_ademe)
+
+    La table prix_m2_rollup (statistiques des évaluations) est mise à jour à la fin du chargement.
     """
+    if delta:
+        fill_dvf_delta(batch_size=batch_size, low_memory=low_memory, dpe_source=dpe_source)
+        refresh_price_rollup()
+        return
+
+    if parallel:
+        fill_dvf_parallel(max_workers=max_workers, batch_size=batch_size, low_memory=low_memory, dpe_source=dpe_source)
+        refresh_price_rollup()
+        return
+
     start_time = time.time()
     intermediate_time = start_time
-    for file in os.listdir(DATA_DIR):
-        if file.startswith("ValeursFoncieres") & file.endswith(".txt"):
-            
-            file_path = os.path.join(DATA_DIR, file)
-            df = load_dvf_file(file_path)
-            logger.info(f"{file} : Chargement du fichier DVF terminé en {(time.time() - intermediate_time):.2f} secondes. Nombre de lignes : {len(df)}")
-            df_cleaned = clean_dvf_data(df)
-            logger.info(f"{file} : Nettoyage du DataFrame terminé en {(time.time() - intermediate_time):.2f} secondes. Nombre de lignes après nettoyage : {len(df_cleaned)}")
-            load_dvf_to_PG(df_cleaned, idx=idx)
+    # Dimension commune chargée une seule fois pour tous les fichiers (le chargement en masse la résout en SQL)
+    with pipeline_metrics.stage('commune_index.load'):
+        commune_index = None if bulk else CommuneIndex.load()
+    for file_path in list_dvf_files():
+        file = os.path.basename(file_path)
+        if streaming:
+            nb_rows = 0
+            if bulk:
+                logger.info(f"{file} : chargement en streaming sans journal de reprise, un arrêt impose de recharger le fichier")
+            for df_cleaned in iter_clean_dvf_chunks(file_path, chunksize):
+                nb_rows += len(df_cleaned)
+                if bulk:
+                    # Empreintes enregistrées morceau par morceau : un chargement delta ultérieur ne recharge que les différences
+                    df_cleaned = compute_dvf_fingerprints(df_cleaned, TRANSACTION_KEY)
+                    load_dvf_to_PG_bulk(df_cleaned, batch_size=batch_size, source=dvf_source_name(file_path), dpe_source=dpe_source)
+                else:
+                    load_dvf_to_PG(df_cleaned, commune_index=commune_index)
             intermediate_time = time.time()
-            logger.info(f"{file} : Chargement en Base de Données terminé en {(intermediate_time - start_time):.2f} secondes.")
+            logger.info(f"{file} : {nb_rows} lignes nettoyées et chargées en streaming en {(intermediate_time - start_time):.2f} secondes.")
+            pipeline_metrics.emit(reset=True, file=file, rows=nb_rows)
+            continue
+        # Fichier nettoyé lu depuis le cache Parquet s'il est à jour
+        load_start = time.perf_counter()
+        df_cleaned = load_clean_dvf(file_path, low_memory=low_memory)
+        pipeline_metrics.record('load_clean', time.perf_counter() - load_start, rows=len(df_cleaned))
+        logger.info(f"{file} : Chargement et nettoyage du DataFrame terminés en {(time.time() - intermediate_time):.2f} secondes. Nombre de lignes après nettoyage : {len(df_cleaned)}")
+        if bulk:
+            # Reprise automatique au dernier lot validé (journal ingestion_checkpoint)
+            # Les empreintes des lignes servent de référence aux chargements incrémentaux suivants
+            df_cleaned = compute_dvf_fingerprints(df_cleaned, TRANSACTION_KEY)
+            load_dvf_file_to_PG_bulk(
+                file_path, df_cleaned, batch_size=batch_size, dpe_source=dpe_source, cleaning_version=CLEANING_VERSION
+            )
+        else:
+            load_dvf_to_PG(df_cleaned, idx=idx, commune_index=commune_index)
+        intermediate_time = time.time()
+        logger.info(f"{file} : Chargement en Base de Données terminé en {(intermediate_time - start_time):.2f} secondes.")
+        # Résumé des mesures du fichier (temps, débit et latences par étape, pic mémoire)
+        pipeline_metrics.emit(reset=True, file=file, rows=len(df_cleaned))
     logger.info("\nTous les fichiers DVF ont été traités et sauvegardés avec succès !")
+    # Statistiques de prix des évaluations : seules les communes touchées sont recalculées
+    refresh_price_rollup()
     logger.info("Fin du script.")
     end_time = time.time()
     logger.info(f"\nTemps total: {(end_time - start_time):.2f} secondes")
+    # Connexions réutilisées, retentatives et latences des API externes (BAN, ADEME)
+    logger.info(f"Client HTTP : {http_client.stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+# data_process/price_rollup.py
+
+# Statistiques pré-agrégées du prix au m² (table prix_m2_rollup) lues par les évaluations (services/eval_services.py).
+# Une ligne par (code INSEE, code postal, type de bien, étiquette DPE) : nombre de transactions,
+# somme et somme des carrés du prix au m², minimum et maximum. Ces valeurs sont additives.
+# Rafraîchissement incrémental après chaque ingestion : seules les communes dont des transactions ou des DPE
+# ont été ajoutés (identifiants au-delà du dernier rafraîchissement), ou dont des lignes ont été modifiées
+# ou supprimées en place (table prix_m2_rollup_dirty, alimentée par dvf_delta et par les
+# méthodes update/delete des CRUD, voir bddpg/crud/rollup_dirty.py) sont recalculées.
+# Les chargements (dvf_bulk, fill_dvf) n'insèrent qu'avec ON CONFLICT DO NOTHING : ils ne modifient pas de ligne existante.
+# La table prix_m2_cube contient les mêmes statistiques par tranche de surface de SURFACE_BUCKET m²,
+# pour servir les filtres de surface des évaluations ; elle est rafraîchie avec prix_m2_rollup.
+
+import time
+import logging
+from bddpg import engine
+from bddpg.models.prix_m2_rollup import SURFACE_BUCKET
+from common.metrics import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLES = ['prix_m2_rollup', 'prix_m2_cube']
+
+SELECT_STATE_SQL = "SELECT last_id_transaction, last_id_dpe FROM prix_m2_rollup_state WHERE id = 1"
+
+# Bornes figées au début du rafraîchissement : les lignes ajoutées pendant le calcul le seront au suivant.
+# Les identifiants sont attribués avant le commit : une transaction d'ingestion en cours peut valider plus tard
+# un identifiant inférieur au MAX lu, qui serait alors ignoré par tous les rafraîchissements suivants.
+# Le verrou SHARE attend la fin des écritures en cours et bloque les nouvelles le temps de lire les bornes
+# (transaction courte, validée aussitôt) : toute ligne d'identifiant inférieur ou égal aux bornes est alors visible.
+LOCK_INGESTION_TABLES_SQL = "LOCK TABLE transaction_dvf, dpe IN SHARE MODE"
+
+SELECT_WATERMARKS_SQL = """
+SELECT COALESCE((SELECT MAX(id_transaction) FROM transaction_dvf), 0),
+       COALESCE((SELECT MAX(id_dpe) FROM dpe), 0)
+"""
+
+# Table prix_m2_cube encore vide alors que prix_m2_rollup est alimentée (créée après le premier rafraîchissement)
+CUBE_MISSING_SQL = "SELECT NOT EXISTS (SELECT 1 FROM prix_m2_cube) AND EXISTS (SELECT 1 FROM prix_m2_rollup)"
+
+RECORD_STATE_SQL = """
+INSERT INTO prix_m2_rollup_state (id, last_id_transaction, last_id_dpe, refreshed_at)
+VALUES (1, %s, %s, NOW())
+ON CONFLICT (id) DO UPDATE
+SET last_id_transaction = EXCLUDED.last_id_transaction,
+    last_id_dpe = EXCLUDED.last_id_dpe,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Communes à recalculer lors d'un rafraîchissement incrémental
+CREATE_ROLLUP_COMMUNES_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS rollup_communes (
+    code_insee_commune VARCHAR(10),
+    code_postal VARCHAR(5),
+    PRIMARY KEY (code_insee_commune, code_postal)
+) ON COMMIT DELETE ROWS
+"""
+
+COLLECT_ROLLUP_COMMUNES_SQL = """
+INSERT INTO rollup_communes (code_insee_commune, code_postal)
+SELECT c.code_insee_commune, c.code_postal
+FROM commune c
+JOIN bien_immobilier bi ON bi.id_commune = c.id_commune
+WHERE bi.id_bien IN (
+    SELECT id_bien FROM transaction_dvf WHERE id_transaction > %(last_id_transaction)s AND id_transaction <= %(max_id_transaction)s
+    UNION
+    SELECT id_bien FROM dpe WHERE id_dpe > %(last_id_dpe)s AND id_dpe <= %(max_id_dpe)s
+)
+UNION
+SELECT code_insee_commune, code_postal FROM prix_m2_rollup_dirty
+ON CONFLICT DO NOTHING
+"""
+
+DELETE_ROLLUP_COMMUNES_SQL = """
+DELETE FROM {table} r
+USING rollup_communes k
+WHERE r.code_insee_commune = k.code_insee_commune AND r.code_postal = k.code_postal
+"""
+
+CLEAR_DIRTY_COMMUNES_SQL = """
+DELETE FROM prix_m2_rollup_dirty d
+USING rollup_communes k
+WHERE d.code_insee_commune = k.code_insee_commune AND d.code_postal = k.code_postal
+"""
+
+# Communes des biens dont des transactions vont être supprimées (appelé par dvf_delta dans la même transaction)
+MARK_DIRTY_COMMUNES_SQL = """
+INSERT INTO prix_m2_rollup_dirty (code_insee_commune, code_postal)
+SELECT DISTINCT c.code_insee_commune, c.code_postal
+FROM bien_immobilier bi
+JOIN commune c ON bi.id_commune = c.id_commune
+WHERE bi.id_bien = ANY(%s)
+ON CONFLICT DO NOTHING
+"""
+
+# Mêmes jointures et mêmes filtres que les évaluations (un couple transaction / DPE par ligne)
+INSERT_ROLLUP_SQL = """
+INSERT INTO prix_m2_rollup (
+    code_insee_commune, code_postal, type_bien, etiquette_dpe, nom_commune,
+    nb_transactions, somme_prix_m2, somme_prix_m2_carre, prix_m2_min, prix_m2_max
+)
+SELECT
+    c.code_insee_commune,
+    c.code_postal,
+    bi.type_bien,
+    COALESCE(dpe.etiquette_dpe, ''),
+    MIN(c.nom_commune),
+    COUNT(*),
+    SUM(p.prix_m2),
+    SUM(p.prix_m2 * p.prix_m2),
+    MIN(p.prix_m2),
+    MAX(p.prix_m2)
+FROM transaction_dvf t
+JOIN bien_immobilier bi ON t.id_bien = bi.id_bien
+JOIN commune c ON bi.id_commune = c.id_commune
+JOIN dpe ON bi.id_bien = dpe.id_bien
+{scope}
+CROSS JOIN LATERAL (SELECT t.valeur_fonciere::numeric / bi.surface_reelle_bati AS prix_m2) p
+WHERE bi.surface_reelle_bati > 0
+AND t.valeur_fonciere > 0
+AND bi.type_bien IN ('Maison', 'Appartement')
+GROUP BY c.code_insee_commune, c.code_postal, bi.type_bien, COALESCE(dpe.etiquette_dpe, '')
+"""
+
+# Statistiques par tranche de surface (surfaces entières en m²)
+INSERT_CUBE_SQL = """
+INSERT INTO prix_m2_cube (
+    code_insee_commune, code_postal, type_bien, etiquette_dpe, tranche_surface, nom_commune,
+    nb_transactions, somme_prix_m2, somme_prix_m2_carre, prix_m2_min, prix_m2_max
+)
+SELECT
+    c.code_insee_commune,
+    c.code_postal,
+    bi.type_bien,
+    COALESCE(dpe.etiquette_dpe, ''),
+    bi.surface_reelle_bati / {bucket} * {bucket},
+    MIN(c.nom_commune),
+    COUNT(*),
+    SUM(p.prix_m2),
+    SUM(p.prix_m2 * p.prix_m2),
+    MIN(p.prix_m2),
+    MAX(p.prix_m2)
+FROM transaction_dvf t
+JOIN bien_immobilier bi ON t.id_bien = bi.id_bien
+JOIN commune c ON bi.id_commune = c.id_commune
+JOIN dpe ON bi.id_bien = dpe.id_bien
+{scope}
+CROSS JOIN LATERAL (SELECT t.valeur_fonciere::numeric / bi.surface_reelle_bati AS prix_m2) p
+WHERE bi.surface_reelle_bati > 0
+AND t.valeur_fonciere > 0
+AND bi.type_bien IN ('Maison', 'Appartement')
+GROUP BY c.code_insee_commune, c.code_postal, bi.type_bien, COALESCE(dpe.etiquette_dpe, ''), bi.surface_reelle_bati / {bucket}
+"""
+
+ROLLUP_COMMUNES_SCOPE = """
+JOIN rollup_communes k ON k.code_insee_commune = c.code_insee_commune AND k.code_postal = c.code_postal
+"""
+
+
+def refresh_price_rollup(full: bool = False) -> dict:
+    """
+    Met à jour les tables prix_m2_rollup et prix_m2_cube.
+    En mode incrémental, seules les communes touchées depuis le dernier rafraîchissement sont recalculées
+    (suppression puis insertion de leurs lignes, dans une seule transaction).
+    Le premier rafraîchissement (et celui qui suit la création de prix_m2_cube) est toujours complet.
+
+    Parameters:
+        full (bool): Si True, les tables sont entièrement recalculées
+
+    Returns:
+        dict: Rapport (mode, communes recalculées, lignes écrites dans chaque table, durée)
+    """
+    start_time = time.time()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(LOCK_INGESTION_TABLES_SQL)
+        cursor.execute(SELECT_WATERMARKS_SQL)
+        max_id_transaction, max_id_dpe = cursor.fetchone()
+        connection.commit()
+
+        cursor.execute(SELECT_STATE_SQL)
+        state = cursor.fetchone()
+        cursor.execute(CUBE_MISSING_SQL)
+        full = full or state is None or cursor.fetchone()[0]
+
+        with pipeline_metrics.stage('price_rollup.refresh'):
+            if full:
+                nb_communes = None
+                cursor.execute(f"TRUNCATE {', '.join(ROLLUP_TABLES)}")
+                cursor.execute("DELETE FROM prix_m2_rollup_dirty")
+                cursor.execute(INSERT_ROLLUP_SQL.format(scope=""))
+                nb_rows = cursor.rowcount
+                cursor.execute(INSERT_CUBE_SQL.format(scope="", bucket=SURFACE_BUCKET))
+                nb_cube_rows = cursor.rowcount
+            else:
+                cursor.execute(CREATE_ROLLUP_COMMUNES_SQL)
+                cursor.execute(COLLECT_ROLLUP_COMMUNES_SQL, {
+                    'last_id_transaction': state[0],
+                    'max_id_transaction': max_id_transaction,
+                    'last_id_dpe': state[1],
+                    'max_id_dpe': max_id_dpe
+                })
+                nb_communes = cursor.rowcount
+                nb_rows = nb_cube_rows = 0
+                if nb_communes:
+                    for table in ROLLUP_TABLES:
+                        cursor.execute(DELETE_ROLLUP_COMMUNES_SQL.format(table=table))
+                    cursor.execute(INSERT_ROLLUP_SQL.format(scope=ROLLUP_COMMUNES_SCOPE))
+                    nb_rows = cursor.rowcount
+                    cursor.execute(INSERT_CUBE_SQL.format(scope=ROLLUP_COMMUNES_SCOPE, bucket=SURFACE_BUCKET))
+                    nb_cube_rows = cursor.rowcount
+                    cursor.execute(CLEAR_DIRTY_COMMUNES_SQL)
+
+            cursor.execute(RECORD_STATE_SQL, (max_id_transaction, max_id_dpe))
+            connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    report = {
+        'mode': 'full' if full else 'incremental',
+        'communes': nb_communes,
+        'rows': nb_rows,
+        'cube_rows': nb_cube_rows,
+        'seconds': round(time.time() - start_time, 2)
+    }
+    logger.info(f"Statistiques de prix pré-agrégées mises à jour : {report}")
+    return report
@@ -1,8 +1,8 @@
 # data_process/scraping/scrap_city.py 
 
-import requests
 from bs4 import BeautifulSoup
 import time
+from common.http_client import http_client
 
 base_url = "https://fr.wikipedia.org"
 
@@ -14,7 +14,7 @@ DELAY_FOR_REQUESTS = 0.5
 def verif_robots():
     """Vérifie les règles du fichier robots.txt pour le site"""
     robots_url = f"{base_url}/robots.txt"
-    response = requests.get(robots_url)
+    response = http_client.get(robots_url, headers=headers)
     print("Règles robots.txt : ")
     print(response.text[:1000])  
 
@@ -22,8 +22,7 @@ def verif_robots():
 def get_soup(url: str) -> BeautifulSoup:
     """Récupère le contenu HTML d'une page et le parse avec BeautifulSoup"""
     time.sleep(DELAY_FOR_REQUESTS)  # Pause pour éviter de surcharger le serveur
-    # On peut remplacer request par le module requests_ratelimiter
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url, headers=headers)
     response.raise_for_status()
     print(f"Page récupérée avec succès : {response.status_code}")
     html_content = response.text
@@ -1,9 +1,19 @@
 from .parser import safe_int_conversion, safe_decimal_conversion, safe_float_conversion, safe_date_conversion_pandas
+from common.rate_limiter import TokenBucket
+from .file_hash import file_sha256
+from common.metrics import PipelineMetrics, pipeline_metrics
+from common.http_client import HttpClient, http_client
 
 all = [
     'safe_int_conversion',
     'safe_decimal_conversion',
     'safe_float_conversion',
-    'safe_date_conversion_pandas'
+    'safe_date_conversion_pandas',
+    'TokenBucket',
+    'file_sha256',
+    'PipelineMetrics',
+    'pipeline_metrics',
+    'HttpClient',
+    'http_client'
 ]
 
@@ -0,0 +1,24 @@
+# data_process/utils/file_hash.py
+
+import hashlib
+
+# Taille des blocs lus pour le calcul de l'empreinte
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """
+    Calcule l'empreinte SHA-256 du contenu d'un fichier, lu par blocs.
+
+    Parameters:
+        file_path (str): Chemin du fichier
+        block_size (int): Taille des blocs lus
+
+    Returns:
+        str: Empreinte hexadécimale (64 caractères)
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
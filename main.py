@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from sqlmodel import SQLModel, select
 
@@ -8,6 +9,7 @@ from bddn4j import neo4j_service
 from api.auth_routes import router as auth_router
 from api.dpe_routes import router as dpe_router
 from api.eval_routes import router as eval_router
+from services.ademe_async_client import ademe_async_client
 
 
 # Crée ou met à jour les  les tables PostgreSQL avec SQLModel
@@ -15,7 +17,14 @@ from api.eval_routes import router as eval_router
 #SQLModel.metadata.create_all(postgres_engine)
 create_db_and_tables(drop=False)  # Ne pas supprimer les tables existantes
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Fermeture du pool de connexions asynchrone vers l'ADEME
+    await ademe_async_client.aclose()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="API Immobilier - Données DVF & Communes",
     description="API pour les données de DPE récents, et valeurs immobilières avec Neo4j (graphe des communes) et PostgreSQL (DVF, DPE)",
     version="1.0.0"
@@ -43,7 +52,7 @@ def welcome():
         },
         "endpoints": {
             "auth" : ["POST /auth/login", "POST /auth/register", "POST /auth/logout", "GET /auth/me", "GET /auth/users"], 
-            "dpe" : ["GET /dpe/recent", "GET /dpe/{num_dpe}"],
+            "dpe" : ["GET /dpe/recent", "GET /dpe/{num_dpe}", "GET /dpe/cache/stats", "GET /dpe/client/stats"],
             "eval": ["GET /eval/by_cp", "GET /eval/by_insee", "GET /eval/"],
              "info": ["GET /", "GET /health"],
         }
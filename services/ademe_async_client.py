@@ -0,0 +1,112 @@
+# services/ademe_async_client.py
+
+# Client HTTP asynchrone vers l'API ADEME, pour les routes FastAPI `async def`.
+# Un seul httpx.AsyncClient (pool de connexions keep-alive partagé) par processus, créé au premier appel
+# et fermé à l'arrêt de l'application (voir main.py).
+# Le débit vers l'ADEME est cadencé par un token bucket asynchrone réglé sur le quota (600 requêtes / 60 s) :
+# une rafale de requêtes attend son jeton au lieu de dépasser le quota. Un sémaphore borne en plus
+# le nombre d'appels simultanés (taille du pool de connexions) ; une réponse lente n'immobilise pas
+# de thread du serveur.
+# Les appels sont comptés par le client lui-même (mémoire bornée, voir common.metrics.StageStats)
+# et exposés par la route GET /dpe/client/stats.
+
+import time
+import asyncio
+import logging
+import httpx
+from typing import Optional
+from common.metrics import StageStats
+from common.rate_limiter import AsyncTokenBucket
+from config import ADEME_MAX_REQUESTS, ADEME_PERIOD
+
+logger = logging.getLogger(__name__)
+
+# Plafond de concurrence (connexions ouvertes) : le débit est borné par le token bucket, pas par ce nombre
+ADEME_MAX_CONCURRENT = 10
+DEFAULT_TIMEOUT = httpx.Timeout(10, connect=5)
+
+
+class AsyncAdemeClient:
+    """Client asynchrone partagé : pool de connexions httpx, token bucket du quota et sémaphore de concurrence"""
+
+    def __init__(self, max_concurrent: int = ADEME_MAX_CONCURRENT, timeout: httpx.Timeout = DEFAULT_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.rate_limiter = AsyncTokenBucket.from_quota(ADEME_MAX_REQUESTS, ADEME_PERIOD)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats = StageStats()
+        self._in_flight = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Créés dans la boucle d'événements du serveur, au premier appel
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrent, max_keepalive_connections=self.max_concurrent)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._client
+
+    async def get_json(self, url: str, params: Optional[dict] = None) -> dict:
+        """
+        Requête GET vers l'ADEME, en attendant un jeton du quota et une place si max_concurrent appels
+        sont déjà en cours.
+
+        Parameters:
+            url (str): URL appelée
+            params (dict): Paramètres de la requête
+
+        Returns:
+            dict: La réponse JSON
+
+        Raises:
+            httpx.HTTPError: Erreur réseau, délai dépassé ou statut HTTP en erreur
+        """
+        client = self._get_client()
+        async with self._semaphore:
+            await self.rate_limiter.acquire()
+            start = time.perf_counter()
+            self._in_flight += 1
+            try:
+                response = await client.get(url, params=params)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                self._stats.add(time.perf_counter() - start, error=True)
+                raise
+            finally:
+                self._in_flight -= 1
+            self._stats.add(time.perf_counter() - start)
+        return response.json()
+
+    def stats(self) -> dict:
+        """
+        Compteurs des appels à l'ADEME depuis le démarrage : appels, erreurs, latences (p50/p95/p99/max),
+        appels en cours et limite de concurrence.
+
+        Returns:
+            dict: Compteurs
+        """
+        summary = self._stats.summary()
+        return {
+            "calls": summary["calls"],
+            "errors": summary["errors"],
+            "wall_seconds": summary["wall_seconds"],
+            "p50_ms": summary["p50_ms"],
+            "p95_ms": summary["p95_ms"],
+            "p99_ms": summary["p99_ms"],
+            "max_ms": summary["max_ms"],
+            "in_flight": self._in_flight,
+            "max_concurrent": self.max_concurrent
+        }
+
+    async def aclose(self) -> None:
+        """Ferme le pool de connexions (arrêt de l'application)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+
+# Instance globale
+ademe_async_client = AsyncAdemeClient()
@@ -1,14 +1,52 @@
+import asyncio
+import logging
 from datetime import date, timedelta
+from typing import Optional
+import httpx
 import requests
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from bddpg import DPEAdeme, dpe_crud, get_session_sync
+from bddpg.models.dpe_ademe import MIRROR_COLUMNS
+from common.http_client import http_client
 from schemas import success_response, error_response
+from .response_cache import ResponseCache
+from .ademe_async_client import ademe_async_client
+
+# Durées de cache (secondes) : un DPE publié ne change quasiment jamais,
+# la liste des DPE récents d'un code postal évolue au fil des publications
+RECENT_DPE_TTL = 5 * 60
+RECENT_DPE_STALE_TTL = 10 * 60
+NUM_DPE_TTL = 24 * 60 * 60
+NUM_DPE_STALE_TTL = 7 * 24 * 60 * 60
+
+# Taille des pages demandées à l'ADEME pour le flux NDJSON des DPE récents
+RECENT_STREAM_PAGE_SIZE = 1000
+
+# Origine d'un DPE renvoyé par numéro (metadata 'source' de la réponse)
+SOURCE_LOCAL = 'local'
+SOURCE_ADEME = 'ademe'
+# Réponse locale limitée aux champs stockés en base (metadata 'fields')
+FIELDS_REDUCED = 'reduced'
+
+logger = logging.getLogger(__name__)
+
+
+def _is_success(response) -> bool:
+    """Seules les réponses réussies sont mises en cache (pas les erreurs réseau ni les DPE introuvables)"""
+    return response is not None and response.get('success', False)
+
 
 class DPEServices:
     """
     Classe pour interagir avec l'API DPE (Diagnostic de Performance Énergétique).
+    Les réponses de l'API ADEME sont gardées en cache (voir response_cache.py).
+    Chaque service existe en version bloquante (requests) et asynchrone (préfixe `a`, httpx) pour les routes `async def`.
     """
 
     base_url_dpe = "https://data.ademe.fr/data-fair/api/v1/datasets/dpe03existant/lines"
-   
+    cache = ResponseCache()
+
 
     @staticmethod
     def retrieve_recent_dpe_by_cp(cp: str, nb_jour) -> list:
@@ -22,13 +60,79 @@ class DPEServices:
         Returns:
             list: Liste des DPE récupérés ou None en cas d'erreur.
         """
+        date_etablissement = DPEServices._recent_date(cp, nb_jour)
+        return DPEServices.cache.get_or_load(
+            ('recent', cp, date_etablissement),
+            lambda: DPEServices._fetch_recent_dpe_by_cp(cp, date_etablissement),
+            ttl=RECENT_DPE_TTL, stale_ttl=RECENT_DPE_STALE_TTL, cacheable=_is_success
+        )
+
+    @staticmethod
+    async def aretrieve_recent_dpe_by_cp(cp: str, nb_jour) -> list:
+        """Version asynchrone de retrieve_recent_dpe_by_cp"""
+        date_etablissement = DPEServices._recent_date(cp, nb_jour)
+        return await DPEServices.cache.aget_or_load(
+            ('recent', cp, date_etablissement),
+            lambda: DPEServices._afetch_recent_dpe_by_cp(cp, date_etablissement),
+            ttl=RECENT_DPE_TTL, stale_ttl=RECENT_DPE_STALE_TTL, cacheable=_is_success
+        )
+
+    @staticmethod
+    def stream_recent_dpe_by_cp(cp: str, nb_jour, limit: Optional[int] = None):
+        """
+        Récupère TOUS les DPE d'un code postal pour les x derniers jours, page par page (liens `next` de l'API),
+        sans les garder en mémoire. Les paramètres sont vérifiés immédiatement (ValueError), les pages sont
+        demandées au fur et à mesure de l'itération.
+
+        Args:
+            cp (str): code postal au format nnnnn.
+            nb_jour (int): Nombre de jours pour lesquels récupérer les DPE récents.
+            limit (int): Nombre maximal de DPE (les pages suivantes ne sont pas demandées)
+
+        Returns:
+            AsyncIterator[tuple]: (nombre total de DPE annoncé par l'ADEME, DPE de la page)
+
+        Raises:
+            ValueError: code postal invalide ou limit négatif
+        """
+        date_etablissement = DPEServices._recent_date(cp, nb_jour)
+        if limit is not None and limit < 0:
+            raise ValueError("La limite doit être positive.")
+        params = DPEServices._recent_params(cp, date_etablissement)
+        params['size'] = RECENT_STREAM_PAGE_SIZE if limit is None else max(1, min(limit, RECENT_STREAM_PAGE_SIZE))
+        # Pagination par liens `next` (sans limite de 10 000 résultats)
+        params.pop('page')
+        return DPEServices._apages(params, limit)
+
+    @staticmethod
+    async def _apages(params: dict, limit: Optional[int]):
+        url = DPEServices.base_url_dpe
+        sent = 0
+        while url and (limit is None or sent < limit):
+            result = await ademe_async_client.get_json(url, params)
+            results = result.get('results', [])
+            if limit is not None:
+                results = results[:limit - sent]
+            if not results:
+                return
+            sent += len(results)
+            yield result.get('total', 0), results
+            # L'URL `next` contient déjà tous les paramètres
+            url, params = result.get('next'), None
+
+    @staticmethod
+    def _recent_date(cp: str, nb_jour) -> str:
+        """Vérifie le code postal et renvoie la date à partir de laquelle on récupère les DPE ('YYYY-MM-DD')"""
         # Vérification du format du code postal
         if not cp or len(cp) != 5 or not cp.isdigit():
             raise ValueError("Le code postal doit être une chaîne de 5 chiffres.")
-        
+
         # Déterminationd e la date à partir de laquelle on récupère des données
-        date_etablissement = (date.today() - timedelta(days=nb_jour)).strftime('%Y-%m-%d')
+        return (date.today() - timedelta(days=nb_jour)).strftime('%Y-%m-%d')
 
+    @staticmethod
+    def _recent_params(cp: str, date_etablissement: str) -> dict:
+        """Paramètres de la requête ADEME des DPE récents d'un code postal"""
         #Définition des champs de réponse
             # On ne récupère que les champs nécessaires pour éviter de surcharger la réponse
             # On pourra utiliser le numéro de dpe pour récupérer les détails si nécessaire
@@ -44,37 +148,60 @@ class DPEServices:
         "identifiant_ban"
         ]
         # Préparation des paramètres de la requête
-        params = {
+        return {
             'qs': f"code_postal_ban:{cp} AND date_etablissement_dpe:[{date_etablissement} TO *]",
             'size': 100,
             'page': 1,
             'select': f"{','.join(response_fields)}"
         }
-        
+
+    @staticmethod
+    def _recent_response(result: dict, cp: str, date_etablissement: str) -> dict:
+        """Réponse standard à partir de la réponse ADEME des DPE récents"""
+        if result:
+            results = result.get('results', [])
+            return success_response(
+                data=results,
+                message=f"{result.get('total', 0)} DPE récupérés pour le code postal {cp} depuis le {date_etablissement}",
+                count=result.get('total', 0),
+                # Seule la première page est renvoyée : la liste complète est disponible en flux (stream=true)
+                metadata={'returned': len(results), 'complete': len(results) >= result.get('total', 0)}
+            )
+        else:
+            return error_response(
+                message=f"Aucun DPE trouvé pour le code postal {cp} depuis le {date_etablissement}",
+                data=None
+            )
+
+    @staticmethod
+    def _fetch_recent_dpe_by_cp(cp: str, date_etablissement: str) -> dict:
+        """Interroge l'API ADEME pour les DPE d'un code postal établis depuis date_etablissement ('YYYY-MM-DD')"""
         try:
-            response = requests.get(DPEServices.base_url_dpe, params=params, timeout=10)
+            response = http_client.get(DPEServices.base_url_dpe, params=DPEServices._recent_params(cp, date_etablissement), timeout=10)
             response.raise_for_status()
-            result = response.json()
-            if result:
-                return success_response(
-                    data=result.get('results', []),
-                    message=f"{result.get('total', 0)} DPE récupérés pour le code postal {cp} depuis le {date_etablissement}",
-                    count=result.get('total', 0),
-                )
-            else:
-                return error_response(
-                    message=f"Aucun DPE trouvé pour le code postal {cp} depuis le {date_etablissement}",
-                    data=None
-                )
+            return DPEServices._recent_response(response.json(), cp, date_etablissement)
         except requests.RequestException as e:
             print(f"Erreur Request API DPE: {str(e)}")
             return None
-            
+
+    @staticmethod
+    async def _afetch_recent_dpe_by_cp(cp: str, date_etablissement: str) -> dict:
+        """Version asynchrone de _fetch_recent_dpe_by_cp"""
+        try:
+            result = await ademe_async_client.get_json(DPEServices.base_url_dpe, DPEServices._recent_params(cp, date_etablissement))
+            return DPEServices._recent_response(result, cp, date_etablissement)
+        except httpx.HTTPError as e:
+            print(f"Erreur Request API DPE: {str(e)}")
+            return None
+
 
     @staticmethod
     def retrieve_dpe_by_num_dpe(num_dpe: str) -> dict:
         """
         Récupère un DPE spécifique par son numéro de DPE.
+        Le DPE est d'abord cherché en base (tables dpe puis dpe_ademe) ; l'API ADEME n'est appelée
+        qu'en cas d'absence, et le DPE récupéré est alors enregistré dans dpe_ademe.
+        metadata['source'] indique l'origine de la réponse ('local' ou 'ademe').
 
         Args:
             num_dpe (str): Numéro de DPE à rechercher.
@@ -82,35 +209,167 @@ class DPEServices:
         Returns:
             dict: tout le DPE trouvé ou None si non trouvé.
         """
+        DPEServices._check_num_dpe(num_dpe)
+        return DPEServices.cache.get_or_load(
+            ('num_dpe', num_dpe),
+            lambda: DPEServices._load_dpe_by_num_dpe(num_dpe),
+            ttl=NUM_DPE_TTL, stale_ttl=NUM_DPE_STALE_TTL, cacheable=_is_success
+        )
+
+    @staticmethod
+    async def aretrieve_dpe_by_num_dpe(num_dpe: str) -> dict:
+        """Version asynchrone de retrieve_dpe_by_num_dpe"""
+        DPEServices._check_num_dpe(num_dpe)
+        return await DPEServices.cache.aget_or_load(
+            ('num_dpe', num_dpe),
+            lambda: DPEServices._aload_dpe_by_num_dpe(num_dpe),
+            ttl=NUM_DPE_TTL, stale_ttl=NUM_DPE_STALE_TTL, cacheable=_is_success
+        )
+
+    @staticmethod
+    def _check_num_dpe(num_dpe: str) -> None:
         # Vérification du format du numéro de DPE
         if not num_dpe or len(num_dpe)!=  13:
             raise ValueError("Le numéro de DPE doit être une chaîne de 13 caractères alphanumériques.")
-        
+
+    @staticmethod
+    def _load_dpe_by_num_dpe(num_dpe: str) -> dict:
+        """Cherche le DPE en base, puis à l'ADEME en cas d'absence (le résultat est enregistré en base)"""
+        response = DPEServices._local_dpe_by_num_dpe(num_dpe)
+        if response is None:
+            response = DPEServices._fetch_dpe_by_num_dpe(num_dpe)
+            DPEServices._save_ademe_response(response)
+        return response
+
+    @staticmethod
+    async def _aload_dpe_by_num_dpe(num_dpe: str) -> dict:
+        """Version asynchrone de _load_dpe_by_num_dpe (les accès base sont faits dans un thread)"""
+        response = await asyncio.to_thread(DPEServices._local_dpe_by_num_dpe, num_dpe)
+        if response is None:
+            response = await DPEServices._afetch_dpe_by_num_dpe(num_dpe)
+            await asyncio.to_thread(DPEServices._save_ademe_response, response)
+        return response
+
+    @staticmethod
+    def _local_dpe_by_num_dpe(num_dpe: str) -> Optional[dict]:
+        """
+        Cherche un DPE par son numéro dans la table dpe (DPE rattachés aux biens DVF)
+        puis dans la copie locale dpe_ademe (une recherche dans l'index chacune).
+        La réponse a la forme de celle de l'ADEME (liste d'un enregistrement, champs nommés comme dans l'API),
+        mais seuls les champs stockés en base (MIRROR_COLUMNS) sont renseignés : metadata 'fields' vaut 'reduced'.
+
+        Returns:
+            dict: Réponse standard (source 'local') ou None si le DPE n'est pas en base
+        """
+        try:
+            with get_session_sync() as session:
+                dpe = dpe_crud.get_by_numero_dpe(session, num_dpe) or session.get(DPEAdeme, num_dpe)
+        except SQLAlchemyError as e:
+            # Base indisponible : on se rabat sur l'API ADEME
+            logger.warning(f"Recherche locale du DPE {num_dpe} impossible: {e}")
+            return None
+        if dpe is None:
+            return None
+        record = {col: getattr(dpe, col) for col in MIRROR_COLUMNS}
+        # Dates au format de l'API ADEME ('YYYY-MM-DD')
+        if record['date_etablissement_dpe'] is not None:
+            record['date_etablissement_dpe'] = record['date_etablissement_dpe'].isoformat()
+        return success_response(
+            data=[record],
+            message=f"DPE {num_dpe} récupéré avec succès",
+            count=1,
+            metadata={'source': SOURCE_LOCAL, 'fields': FIELDS_REDUCED}
+        )
+
+    @staticmethod
+    def _save_ademe_response(response: Optional[dict]) -> None:
+        """Enregistre dans dpe_ademe le DPE renvoyé par l'ADEME (pour servir les appels suivants en local)"""
+        if not _is_success(response):
+            return
+        rows = [
+            {
+                **{col: dpe.get(col) for col in MIRROR_COLUMNS},
+                # Mêmes troncatures que la copie locale (dpe_mirror.copy_dpe_page)
+                'code_postal_brut': str(dpe['code_postal_brut'])[:10] if dpe.get('code_postal_brut') is not None else None,
+                'etiquette_dpe': dpe['etiquette_dpe'][:5] if dpe.get('etiquette_dpe') else None,
+                'etiquette_ges': dpe['etiquette_ges'][:5] if dpe.get('etiquette_ges') else None,
+            }
+            for dpe in response['data'] if dpe.get('numero_dpe')
+        ]
+        if not rows:
+            return
+        try:
+            with get_session_sync() as session:
+                session.execute(insert(DPEAdeme).values(rows).on_conflict_do_nothing(index_elements=['numero_dpe']))
+                session.commit()
+        except SQLAlchemyError as e:
+            logger.warning(f"Enregistrement local du DPE {rows[0]['numero_dpe']} impossible: {e}")
+
+    @staticmethod
+    def _num_dpe_params(num_dpe: str) -> dict:
         # Préparation des paramètres de la requête
-        params = {
+        return {
             'qs': f"numero_dpe:{num_dpe}",
             'size': 1,
             'page': 1
         }
-        
+
+    @staticmethod
+    def _num_dpe_response(result: dict, num_dpe: str) -> dict:
+        """Réponse standard à partir de la réponse ADEME d'un numéro de DPE"""
+        dpe = result.get('results', {})
+        nb_dpe = result.get('total', 0)
+        if nb_dpe > 0:
+            return success_response(
+                data=dpe,
+                message=f"DPE {num_dpe} récupéré avec succès",
+                count=nb_dpe,
+                metadata={'source': SOURCE_ADEME}
+            )
+        else:
+            return error_response(
+                message=f"Aucun DPE trouvé pour le numéro {num_dpe}",
+                data=None
+            )
+
+    @staticmethod
+    def _fetch_dpe_by_num_dpe(num_dpe: str) -> dict:
+        """Interroge l'API ADEME pour un numéro de DPE"""
         try:
-            response = requests.get(DPEServices.base_url_dpe, params=params, timeout=10)
+            response = http_client.get(DPEServices.base_url_dpe, params=DPEServices._num_dpe_params(num_dpe), timeout=10)
             response.raise_for_status()
-            result = response.json()
-            dpe = result.get('results', {})
-            nb_dpe = result.get('total', 0)
-            if nb_dpe > 0:
-                return success_response(
-                    data=dpe,
-                    message=f"DPE {num_dpe} récupéré avec succès",
-                    count=nb_dpe,
-                )
-            else:
-                return error_response(
-                    message=f"Aucun DPE trouvé pour le numéro {num_dpe}",
-                    data=None
-                )
-
+            return DPEServices._num_dpe_response(response.json(), num_dpe)
         except requests.RequestException as e:
             print(f"Erreur Request API DPE: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    async def _afetch_dpe_by_num_dpe(num_dpe: str) -> dict:
+        """Version asynchrone de _fetch_dpe_by_num_dpe"""
+        try:
+            result = await ademe_async_client.get_json(DPEServices.base_url_dpe, DPEServices._num_dpe_params(num_dpe))
+            return DPEServices._num_dpe_response(result, num_dpe)
+        except httpx.HTTPError as e:
+            print(f"Erreur Request API DPE: {str(e)}")
+            return None
+
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """
+        Compteurs du cache des réponses ADEME (hits, misses, taux de réponses servies par le cache...).
+
+        Returns:
+            dict: Réponse standard contenant les compteurs
+        """
+        return success_response(data=DPEServices.cache.stats(), message="Statistiques du cache DPE")
+
+    @staticmethod
+    def client_stats() -> dict:
+        """
+        Compteurs du client asynchrone ADEME (appels, erreurs, latences, appels en cours).
+
+        Returns:
+            dict: Réponse standard contenant les compteurs
+        """
+        return success_response(data=ademe_async_client.stats(), message="Statistiques du client ADEME")
@@ -1,13 +1,196 @@
+import math
 from typing import Optional
 from bddpg import get_session_sync, BienImmobilier, TransactionDVF, DPE
 from sqlmodel import select, desc
 from sqlalchemy import text
 from schemas import success_response, error_response
 from bddn4j import commune_graph_service
+from bddpg.models.prix_m2_rollup import SURFACE_BUCKET
+from .price_aggregation import aggregate_price_stats
 
 
 
+# Requête directe sur les transactions DVF et leurs DPE
+RAW_STATS_SQL = """
+SELECT 
+    c.code_postal,
+    c.code_insee_commune,
+    c.nom_commune,
+    bi.type_bien,
+    dpe.etiquette_dpe,
+    COUNT(*) as nb_transactions,
+    SUM(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)) as somme_prix_m2,
+    ROUND(AVG(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_moyen,
+    ROUND(MIN(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_min,
+    ROUND(MAX(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_max
+FROM transaction_dvf t
+JOIN bien_immobilier bi ON t.id_bien = bi.id_bien
+JOIN commune c ON bi.id_commune = c.id_commune
+JOIN dpe ON bi.id_bien = dpe.id_bien
+WHERE c.{zone} = :zone
+AND bi.surface_reelle_bati > 0
+AND t.valeur_fonciere > 0
+AND bi.type_bien IN ('Maison', 'Appartement')
+{conditions}
+GROUP BY c.code_insee_commune, c.code_postal, c.nom_commune, bi.type_bien, dpe.etiquette_dpe
+ORDER BY c.{order}, bi.type_bien, dpe.etiquette_dpe, prix_m2_moyen DESC;
+"""
+
+# Lecture de la table pré-agrégée prix_m2_rollup (voir data_process/price_rollup.py), mêmes colonnes
+ROLLUP_STATS_SQL = """
+SELECT
+    r.code_postal,
+    r.code_insee_commune,
+    r.nom_commune,
+    r.type_bien,
+    NULLIF(r.etiquette_dpe, '') as etiquette_dpe,
+    r.nb_transactions,
+    r.somme_prix_m2,
+    ROUND((r.somme_prix_m2 / r.nb_transactions)::numeric, 2) as prix_m2_moyen,
+    ROUND(r.prix_m2_min::numeric, 2) as prix_m2_min,
+    ROUND(r.prix_m2_max::numeric, 2) as prix_m2_max
+FROM prix_m2_rollup r
+WHERE r.{zone} = :zone
+{conditions}
+ORDER BY r.{order}, r.type_bien, etiquette_dpe, prix_m2_moyen DESC;
+"""
+
+# Lecture du cube prix_m2_cube : somme des tranches de surface retenues, mêmes colonnes
+CUBE_STATS_SQL = """
+SELECT
+    r.code_postal,
+    r.code_insee_commune,
+    MIN(r.nom_commune) as nom_commune,
+    r.type_bien,
+    NULLIF(r.etiquette_dpe, '') as etiquette_dpe,
+    SUM(r.nb_transactions) as nb_transactions,
+    SUM(r.somme_prix_m2) as somme_prix_m2,
+    ROUND((SUM(r.somme_prix_m2) / SUM(r.nb_transactions))::numeric, 2) as prix_m2_moyen,
+    ROUND(MIN(r.prix_m2_min)::numeric, 2) as prix_m2_min,
+    ROUND(MAX(r.prix_m2_max)::numeric, 2) as prix_m2_max
+FROM prix_m2_cube r
+WHERE r.{zone} = :zone
+{conditions}
+GROUP BY r.code_insee_commune, r.code_postal, r.type_bien, r.etiquette_dpe
+ORDER BY r.{order}, r.type_bien, etiquette_dpe, prix_m2_moyen DESC;
+"""
+
+# Date du dernier rafraîchissement des tables pré-agrégées, et absence de transactions ou de DPE ajoutés
+# (identifiants au-delà des bornes du rafraîchissement) ou de lignes modifiées ou supprimées depuis (prix_m2_rollup_dirty)
+ROLLUP_STATE_SQL = """
+SELECT
+    s.refreshed_at,
+    COALESCE((SELECT MAX(id_transaction) FROM transaction_dvf), 0) <= s.last_id_transaction
+    AND COALESCE((SELECT MAX(id_dpe) FROM dpe), 0) <= s.last_id_dpe
+    AND NOT EXISTS (SELECT 1 FROM prix_m2_rollup_dirty) AS up_to_date
+FROM prix_m2_rollup_state s
+WHERE s.id = 1
+"""
+
+# Origine des statistiques (metadata 'source' des évaluations)
+SOURCE_ROLLUP = "rollup"
+SOURCE_CUBE = "cube"
+SOURCE_RAW = "raw"
+
+STATS_SQL = {SOURCE_ROLLUP: ROLLUP_STATS_SQL, SOURCE_CUBE: CUBE_STATS_SQL, SOURCE_RAW: RAW_STATS_SQL}
+
+
 class EvalServices:
+
+    @staticmethod
+    def _surface_buckets(surface_min: Optional[float], surface_max: Optional[float]) -> Optional[tuple]:
+        """
+        Tranches du cube prix_m2_cube correspondant exactement à une fourchette de surfaces (surfaces entières).
+        La fourchette est alignée si surface_min est un multiple de SURFACE_BUCKET et surface_max + 1 aussi
+        (ex. 50 à 99 m² avec des tranches de 5 m²).
+
+        Returns:
+            tuple: (première tranche ou None, dernière tranche ou None), ou None si la fourchette n'est pas alignée
+        """
+        tranche_min = tranche_max = None
+        if surface_min:
+            tranche_min = math.ceil(surface_min)
+            if tranche_min % SURFACE_BUCKET:
+                return None
+        if surface_max:
+            upper = math.floor(surface_max) + 1
+            if upper % SURFACE_BUCKET:
+                return None
+            tranche_max = upper - SURFACE_BUCKET
+        return tranche_min, tranche_max
+
+    @staticmethod
+    def _price_stats(session, zone: str, zone_value: str, order: str,
+                     type_bien: Optional[str], surface_min: Optional[float], surface_max: Optional[float],
+                     etiquette_dpe: Optional[str]) -> tuple:
+        """
+        Statistiques du prix au m² par commune, code postal, type de bien et étiquette DPE d'une zone.
+        Sans filtre de surface, la table pré-agrégée prix_m2_rollup est lue (recherche par clé) ;
+        avec une fourchette de surfaces alignée sur les tranches, les tranches du cube prix_m2_cube sont additionnées ;
+        sinon (ou si les tables n'ont pas été rafraîchies depuis la dernière ingestion) la requête est faite
+        sur les tables DVF.
+
+        Args:
+            session: Session SQLModel
+            zone (str): Colonne de la zone ('code_postal' ou 'code_insee_commune')
+            zone_value (str): Valeur recherchée
+            order (str): Colonne de tri principale
+            type_bien, surface_min, surface_max, etiquette_dpe: Filtres de l'évaluation
+
+        Returns:
+            tuple: (lignes, source 'rollup', 'cube' ou 'raw', date du rafraîchissement des tables pré-agrégées lues ou None)
+        """
+        connection = session.connection()
+        buckets = EvalServices._surface_buckets(surface_min, surface_max)
+        if not surface_min and not surface_max:
+            source = SOURCE_ROLLUP
+        elif buckets is not None:
+            source = SOURCE_CUBE
+        else:
+            source = SOURCE_RAW
+        refreshed_at = None
+        if source != SOURCE_RAW:
+            state = connection.execute(text(ROLLUP_STATE_SQL)).first()
+            if state is None or not state.up_to_date:
+                source = SOURCE_RAW
+            else:
+                refreshed_at = state.refreshed_at.isoformat()
+        pre_aggregated = source != SOURCE_RAW
+        alias = "r" if pre_aggregated else "bi"
+
+        # On ajoute des conditions dynamiquement si nécessaire
+        # On utilise des paramètres pour éviter les injections SQL
+        conditions = []
+        params = {"zone": zone_value}
+
+        if type_bien:
+            conditions.append(f"AND {alias}.type_bien = :type_bien")
+            params["type_bien"] = type_bien
+
+        if source == SOURCE_CUBE:
+            tranche_min, tranche_max = buckets
+            if tranche_min is not None:
+                conditions.append("AND r.tranche_surface >= :tranche_min")
+                params["tranche_min"] = tranche_min
+            if tranche_max is not None:
+                conditions.append("AND r.tranche_surface <= :tranche_max")
+                params["tranche_max"] = tranche_max
+        elif source == SOURCE_RAW:
+            if surface_min:
+                conditions.append("AND bi.surface_reelle_bati >= :surface_min")
+                params["surface_min"] = surface_min
+
+            if surface_max:
+                conditions.append("AND bi.surface_reelle_bati <= :surface_max")
+                params["surface_max"] = surface_max
+
+        if etiquette_dpe:
+            conditions.append(f"AND {'r' if pre_aggregated else 'dpe'}.etiquette_dpe = :etiquette_dpe")
+            params["etiquette_dpe"] = etiquette_dpe
+
+        final_sql = STATS_SQL[source].format(zone=zone, order=order, conditions=" ".join(conditions))
+        results = connection.execute(text(final_sql), params).fetchall()
+        return results, source, refreshed_at
    
     @staticmethod
     def eval_by_cp(
@@ -39,63 +222,11 @@ class EvalServices:
         try:
             with get_session_sync() as session:
                 
-                # Entete de la requête SQL
-                begin_sql = """
-                SELECT 
-                    c.code_postal,
-                    c.code_insee_commune,
-                    c.nom_commune,
-                    bi.type_bien,
-                    dpe.etiquette_dpe,
-                    COUNT(*) as nb_transactions,
-                    ROUND(AVG(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_moyen,
-                    ROUND(MIN(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_min,
-                    ROUND(MAX(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_max
-                FROM transaction_dvf t
-                JOIN bien_immobilier bi ON t.id_bien = bi.id_bien
-                JOIN commune c ON bi.id_commune = c.id_commune
-                JOIN dpe ON bi.id_bien = dpe.id_bien
-                WHERE c.code_postal = :cp
-                AND bi.surface_reelle_bati > 0
-                AND t.valeur_fonciere > 0
-                AND bi.type_bien IN ('Maison', 'Appartement')
-                """
-
-                # On ajouute des conditions dynamiquement si nécessaire
-                # On utilise des paramètres pour éviter les injections SQL
-                conditions = []
-                params = {"cp": cp}
-                
-                if type_bien:
-                    conditions.append("AND bi.type_bien = :type_bien")
-                    params["type_bien"] = type_bien
-                
-                if surface_min:
-                    conditions.append("AND bi.surface_reelle_bati >= :surface_min")
-                    params["surface_min"] = surface_min
-                    
-                if surface_max:
-                    conditions.append("AND bi.surface_reelle_bati <= :surface_max")
-                    params["surface_max"] = surface_max
-                    
-                if etiquette_dpe:
-                    conditions.append("AND dpe.etiquette_dpe = :etiquette_dpe")
-                    params["etiquette_dpe"] = etiquette_dpe
-
-                # On définit la fin de la requête SQL
-                end_sql = """
-                GROUP BY c.code_postal, c.code_insee_commune, c.nom_commune, bi.type_bien, dpe.etiquette_dpe
-                ORDER BY c.code_insee_commune, bi.type_bien, dpe.etiquette_dpe, prix_m2_moyen DESC;
-                """
-                
-                # Onconstruit la raquête SQL finale
-                final_sql = begin_sql + " ".join(conditions) + end_sql
-                
-                # Debug
-                #print("Reaquête SQLSQL:", final_sql)
-                #print("Params:", params)
-                
-                results = session.connection().execute(text(final_sql), params).fetchall()
+                # Statistiques par commune, type de bien et étiquette DPE (table pré-agrégée si les filtres le permettent)
+                results, source, refreshed_at = EvalServices._price_stats(
+                    session, "code_postal", cp, "code_insee_commune",
+                    type_bien, surface_min, surface_max, etiquette_dpe
+                )
                 
                 if not results:
                     return error_response(
@@ -104,88 +235,22 @@ class EvalServices:
                     )
 
                 # On va grouper par Communes (code_insee) → Types de bien → Étiquettes DPE
-                communes = {}
-                total_transactions = 0
-                prix_global = []
-                
-                for row in results:
-                    code_insee = row.code_insee_commune
-                    type_bien_row = row.type_bien
-                    etiquette_dpe = row.etiquette_dpe or "Non renseigné"
-                    
-                    # 1. On crée la commune si elle n'existe pas
-                    if code_insee not in communes:
-                        communes[code_insee] = {
-                            "code_insee_commune": code_insee,
-                            "nom_commune": row.nom_commune,
-                            "types_biens": {},
-                            "total_transactions_commune": 0,
-                            "prix_m2_moyen_commune": 0
-                        }
-                    
-                    # 2. On crée le type de bien si il n'existe pas
-                    if type_bien_row not in communes[code_insee]["types_biens"]:
-                        communes[code_insee]["types_biens"][type_bien_row] = {
-                            "total_transactions_type": 0,
-                            "prix_m2_moyen_type": 0,
-                            "etiquettes_dpe": {}
-                        }
-                    
-                    # 3. On ajoute les stats par étiquette DPE
-                    communes[code_insee]["types_biens"][type_bien_row]["etiquettes_dpe"][etiquette_dpe] = {
-                        "nb_transactions": int(row.nb_transactions),
-                        "prix_m2_moyen": float(row.prix_m2_moyen) if row.prix_m2_moyen else 0.0,
-                        "prix_m2_min": float(row.prix_m2_min) if row.prix_m2_min else 0.0,
-                        "prix_m2_max": float(row.prix_m2_max) if row.prix_m2_max else 0.0
-                    }
-                    
-                    # 4. On calcule le nb de transactions par type de bien
-                    communes[code_insee]["types_biens"][type_bien_row]["total_transactions_type"] += int(row.nb_transactions)
-                    
-                    # 5. On calcule le nb de transactions par commune
-                    communes[code_insee]["total_transactions_commune"] += int(row.nb_transactions)
-                    
-                    # 6. puis sur l'ensemble
-                    total_transactions += int(row.nb_transactions)
-                    
-                    if row.prix_m2_moyen:
-                        prix_global.extend([float(row.prix_m2_moyen)] * int(row.nb_transactions))
-
-                # 7. On Calcul du prix moyen par type de bien et par commune
-                for code_insee, commune_data in communes.items():
-                    commune_prix = []
-                    
-                    for type_bien_key, type_data in commune_data["types_biens"].items():
-                        type_prix = []
-                        
-                        # Prix moyen par type de bien basé sur les étiquettes DPE
-                        for etiquette, stats in type_data["etiquettes_dpe"].items():
-                            if stats["prix_m2_moyen"] > 0:
-                                # Pondération par nombre de transactions
-                                type_prix.extend([stats["prix_m2_moyen"]] * stats["nb_transactions"])
-                                commune_prix.extend([stats["prix_m2_moyen"]] * stats["nb_transactions"])
-                        
-                        # Prix moyen par type de bien
-                        type_data["prix_m2_moyen_type"] = round(
-                            sum(type_prix) / len(type_prix) if type_prix else 0, 2
-                        )
-                    
-                    # Prix moyen par commune
-                    commune_data["prix_m2_moyen_commune"] = round(
-                        sum(commune_prix) / len(commune_prix) if commune_prix else 0, 2
-                    )
-
-                # 7. On calcule le prix global sur l'ensemble de stransactions recueillies
-                prix_global_moyen = sum(prix_global) / len(prix_global) if prix_global else 0.0
+                # Moyennes pondérées par le nombre de transactions, à partir des sommes SQL
+                aggregation = aggregate_price_stats(results, "code_insee_commune", "code_insee_commune")
+                communes = aggregation["zones"]
+                total_transactions = aggregation["total_transactions"]
+                prix_global_moyen = aggregation["prix_m2_global_moyen"]
                 
                 # On contruit le resultat final
                 result = {
                     "code_postal": cp,
                     "total_transactions": total_transactions,
-                    "prix_m2_global_moyen": round(prix_global_moyen, 2),
+                    "prix_m2_global_moyen": prix_global_moyen,
                     "nb_communes": len(communes),
                     "communes": communes,
                     "metadata": {
+                        "source": source,
+                        "refreshed_at": refreshed_at,
                         "filtres_appliques": {
                             "type_bien": type_bien,
                             "surface_min": surface_min,
@@ -246,64 +311,11 @@ class EvalServices:
         try:
             with get_session_sync() as session:
                 
-                # Entete de la requête SQL
-                begin_sql = """
-                SELECT 
-                    c.code_postal,
-                    c.code_insee_commune,
-                    c.nom_commune,
-                    bi.type_bien,
-                    dpe.etiquette_dpe,
-                    COUNT(*) as nb_transactions,
-                    ROUND(AVG(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_moyen,
-                    ROUND(MIN(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_min,
-                    ROUND(MAX(t.valeur_fonciere::numeric / NULLIF(bi.surface_reelle_bati, 0)), 2) as prix_m2_max
-                FROM transaction_dvf t
-                JOIN bien_immobilier bi ON t.id_bien = bi.id_bien
-                JOIN commune c ON bi.id_commune = c.id_commune
-                JOIN dpe ON bi.id_bien = dpe.id_bien
-                WHERE c.code_insee_commune = :code_insee
-                AND bi.surface_reelle_bati > 0
-                AND t.valeur_fonciere > 0
-                AND bi.type_bien IN ('Maison', 'Appartement')
-                """
-
-                # On ajouute des conditions dynamiquement si nécessaire
-                # On utilise des paramètres pour éviter les injections SQL
-                conditions = []
-                params = {"code_insee": code_insee}
-                
-                if type_bien:
-                    conditions.append("AND bi.type_bien = :type_bien")
-                    params["type_bien"] = type_bien
-                
-                if surface_min:
-                    conditions.append("AND bi.surface_reelle_bati >= :surface_min")
-                    params["surface_min"] = surface_min
-                    
-                if surface_max:
-                    conditions.append("AND bi.surface_reelle_bati <= :surface_max")
-                    params["surface_max"] = surface_max
-                    
-                if etiquette_dpe:
-                    conditions.append("AND dpe.etiquette_dpe = :etiquette_dpe")
-                    params["etiquette_dpe"] = etiquette_dpe
-
-                # On définit la fin de la requête SQL
-                end_sql = """
-                GROUP BY c.code_insee_commune, c.code_postal, c.nom_commune, bi.type_bien, dpe.etiquette_dpe
-                ORDER BY c.code_postal, bi.type_bien, dpe.etiquette_dpe, prix_m2_moyen DESC;
-                """
-                
-                # Onconstruit la raquête SQL finale
-                final_sql = begin_sql + " ".join(conditions) + end_sql
-                
-                # Debug
-                print("Reaquête SQLSQL:", final_sql)
-                print("Params:", params)
-                
-                results = session.connection().execute(text(final_sql), params).fetchall()
-                print(results)
+                # Statistiques par code postal, type de bien et étiquette DPE (table pré-agrégée si les filtres le permettent)
+                results, source, refreshed_at = EvalServices._price_stats(
+                    session, "code_insee_commune", code_insee, "code_postal",
+                    type_bien, surface_min, surface_max, etiquette_dpe
+                )
                 if not results:
                     return error_response(
                         message=f"Aucune transaction trouvée pour le code insee {code_insee}",
@@ -311,88 +323,22 @@ class EvalServices:
                     )
 
                 # On va grouper par code_postal → Types de bien → Étiquettes DPE
-                cp_communes = {}
-                total_transactions = 0
-                prix_global = []
-                
-                for row in results:
-                    code_postal = row.code_postal
-                    type_bien_row = row.type_bien
-                    etiquette_dpe = row.etiquette_dpe or "Non renseigné"
-                    
-                    # 1. On crée la commune si elle n'existe pas
-                    if code_postal not in cp_communes:
-                        cp_communes[code_postal] = {
-                            "code_postal_commune": code_postal,
-                            "nom_commune": row.nom_commune,
-                            "types_biens": {},
-                            "total_transactions_commune": 0,
-                            "prix_m2_moyen_commune": 0
-                        }
-                    
-                    # 2. On crée le type de bien si il n'existe pas
-                    if type_bien_row not in cp_communes[code_postal]["types_biens"]:
-                        cp_communes[code_postal]["types_biens"][type_bien_row] = {
-                            "total_transactions_type": 0,
-                            "prix_m2_moyen_type": 0,
-                            "etiquettes_dpe": {}
-                        }
-                    
-                    # 3. On ajoute les stats par étiquette DPE
-                    cp_communes[code_postal]["types_biens"][type_bien_row]["etiquettes_dpe"][etiquette_dpe] = {
-                        "nb_transactions": int(row.nb_transactions),
-                        "prix_m2_moyen": float(row.prix_m2_moyen) if row.prix_m2_moyen else 0.0,
-                        "prix_m2_min": float(row.prix_m2_min) if row.prix_m2_min else 0.0,
-                        "prix_m2_max": float(row.prix_m2_max) if row.prix_m2_max else 0.0
-                    }
-                    
-                    # 4. On calcule le nb de transactions par type de bien
-                    cp_communes[code_postal]["types_biens"][type_bien_row]["total_transactions_type"] += int(row.nb_transactions)
-                    
-                    # 5. On calcule le nb de transactions par commune
-                    cp_communes[code_postal]["total_transactions_commune"] += int(row.nb_transactions)
-                    
-                    # 6. puis sur l'ensemble
-                    total_transactions += int(row.nb_transactions)
-                    
-                    if row.prix_m2_moyen:
-                        prix_global.extend([float(row.prix_m2_moyen)] * int(row.nb_transactions))
-
-                # 7. On Calcul du prix moyen par type de bien et par commune
-                for code_postal, commune_data in cp_communes.items():
-                    commune_prix = []
-                    
-                    for type_bien_key, type_data in commune_data["types_biens"].items():
-                        type_prix = []
-                        
-                        # Prix moyen par type de bien basé sur les étiquettes DPE
-                        for etiquette, stats in type_data["etiquettes_dpe"].items():
-                            if stats["prix_m2_moyen"] > 0:
-                                # Pondération par nombre de transactions
-                                type_prix.extend([stats["prix_m2_moyen"]] * stats["nb_transactions"])
-                                commune_prix.extend([stats["prix_m2_moyen"]] * stats["nb_transactions"])
-                        
-                        # Prix moyen par type de bien
-                        type_data["prix_m2_moyen_type"] = round(
-                            sum(type_prix) / len(type_prix) if type_prix else 0, 2
-                        )
-                    
-                    # Prix moyen par commune
-                    commune_data["prix_m2_moyen_commune"] = round(
-                        sum(commune_prix) / len(commune_prix) if commune_prix else 0, 2
-                    )
-
-                # 7. On calcule le prix global sur l'ensemble de stransactions recueillies
-                prix_global_moyen = sum(prix_global) / len(prix_global) if prix_global else 0.0
+                # Moyennes pondérées par le nombre de transactions, à partir des sommes SQL
+                aggregation = aggregate_price_stats(results, "code_postal", "code_postal_commune")
+                cp_communes = aggregation["zones"]
+                total_transactions = aggregation["total_transactions"]
+                prix_global_moyen = aggregation["prix_m2_global_moyen"]
                 
                 # On contruit le resultat final
                 result = {
                     "code_insee": code_insee,
                     "total_transactions": total_transactions,
-                    "prix_m2_global_moyen": round(prix_global_moyen, 2),
+                    "prix_m2_global_moyen": prix_global_moyen,
                     "nb_communes": len(cp_communes),
                     "communes": cp_communes,
                     "metadata": {
+                        "source": source,
+                        "refreshed_at": refreshed_at,
                         "filtres_appliques": {
                             "type_bien": type_bien,
                             "surface_min": surface_min,
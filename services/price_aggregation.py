@@ -0,0 +1,107 @@
+# services/price_aggregation.py
+
+# Agrégation hiérarchique des statistiques de prix au m² des évaluations (services/eval_services.py) :
+# zone (commune ou code postal) → type de bien → étiquette DPE.
+# Chaque ligne SQL apporte le nombre de transactions et la somme des prix au m² de son groupe ;
+# chaque niveau cumule ces sommes, d'où des moyennes pondérées exactes (et non des moyennes de moyennes)
+# avec une mémoire proportionnelle au nombre de groupes et non au nombre de transactions.
+
+from typing import Iterable
+
+
+class WeightedMean:
+    """Moyenne pondérée cumulée : somme des prix au m² et nombre de transactions"""
+
+    __slots__ = ('total', 'count')
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, total: float, count: int) -> None:
+        """Ajoute un groupe (somme de ses prix au m², nombre de transactions)"""
+        self.total += total
+        self.count += count
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def aggregate_price_stats(rows: Iterable, zone_column: str, zone_label: str) -> dict:
+    """
+    Regroupe les lignes de statistiques par zone → type de bien → étiquette DPE.
+
+    Args:
+        rows (Iterable): Lignes SQL (colonnes nom_commune, type_bien, etiquette_dpe, nb_transactions,
+            somme_prix_m2, prix_m2_moyen, prix_m2_min, prix_m2_max et la colonne de zone)
+        zone_column (str): Colonne de regroupement ('code_insee_commune' ou 'code_postal')
+        zone_label (str): Nom du champ de la zone dans le résultat
+
+    Returns:
+        dict: {'zones': statistiques par zone, 'total_transactions': int, 'prix_m2_global_moyen': float}
+    """
+    zones = {}
+    zone_means = {}
+    type_means = {}
+    global_mean = WeightedMean()
+    total_transactions = 0
+
+    for row in rows:
+        zone = getattr(row, zone_column)
+        type_bien = row.type_bien
+        etiquette_dpe = row.etiquette_dpe or "Non renseigné"
+        nb_transactions = int(row.nb_transactions)
+
+        # 1. On crée la zone si elle n'existe pas
+        if zone not in zones:
+            zones[zone] = {
+                zone_label: zone,
+                "nom_commune": row.nom_commune,
+                "types_biens": {},
+                "total_transactions_commune": 0,
+                "prix_m2_moyen_commune": 0
+            }
+            zone_means[zone] = WeightedMean()
+
+        # 2. On crée le type de bien s'il n'existe pas
+        types_biens = zones[zone]["types_biens"]
+        if type_bien not in types_biens:
+            types_biens[type_bien] = {
+                "total_transactions_type": 0,
+                "prix_m2_moyen_type": 0,
+                "etiquettes_dpe": {}
+            }
+            type_means[(zone, type_bien)] = WeightedMean()
+
+        # 3. On ajoute les stats par étiquette DPE
+        types_biens[type_bien]["etiquettes_dpe"][etiquette_dpe] = {
+            "nb_transactions": nb_transactions,
+            "prix_m2_moyen": float(row.prix_m2_moyen) if row.prix_m2_moyen else 0.0,
+            "prix_m2_min": float(row.prix_m2_min) if row.prix_m2_min else 0.0,
+            "prix_m2_max": float(row.prix_m2_max) if row.prix_m2_max else 0.0
+        }
+
+        # 4. Nombre de transactions par type de bien, par zone et sur l'ensemble
+        types_biens[type_bien]["total_transactions_type"] += nb_transactions
+        zones[zone]["total_transactions_commune"] += nb_transactions
+        total_transactions += nb_transactions
+
+        # 5. Sommes pondérées de chaque niveau
+        if row.somme_prix_m2:
+            somme_prix_m2 = float(row.somme_prix_m2)
+            type_means[(zone, type_bien)].add(somme_prix_m2, nb_transactions)
+            zone_means[zone].add(somme_prix_m2, nb_transactions)
+            global_mean.add(somme_prix_m2, nb_transactions)
+
+    # 6. Prix moyens par type de bien et par zone
+    for (zone, type_bien), mean in type_means.items():
+        zones[zone]["types_biens"][type_bien]["prix_m2_moyen_type"] = round(mean.mean, 2)
+    for zone, mean in zone_means.items():
+        zones[zone]["prix_m2_moyen_commune"] = round(mean.mean, 2)
+
+    return {
+        "zones": zones,
+        "total_transactions": total_transactions,
+        "prix_m2_global_moyen": round(global_mean.mean, 2)
+    }
@@ -0,0 +1,193 @@
+# services/response_cache.py
+
+# Cache mémoire (dans le processus) des réponses des services appelant des API externes.
+# LRU borné en nombre d'entrées et en taille, durée de vie (TTL) choisie à chaque appel.
+# Stale-while-revalidate : une entrée expirée depuis moins de `stale_ttl` secondes est renvoyée
+# immédiatement pendant qu'un thread (ou une tâche asyncio, voir aget_or_load) la recharge en arrière-plan.
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires_at', 'stale_until', 'refreshing')
+
+    def __init__(self, value: Any, size: int, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.size = size
+        self.expires_at = now + ttl
+        self.stale_until = now + ttl + stale_ttl
+        self.refreshing = False
+
+
+class ResponseCache:
+    """
+    Cache LRU avec TTL et stale-while-revalidate, partagé entre threads.
+    Les compteurs (hits, stale_hits, misses...) sont exposés par stats().
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._tasks = set()
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: float, stale_ttl: float = 0,
+                    cacheable: Callable[[Any], bool] = lambda value: value is not None) -> Any:
+        """
+        Renvoie la valeur en cache pour `key`, ou l'obtient avec `loader` et la met en cache.
+
+        Parameters:
+            key: Clé de la requête (ex. ('recent', cp, date))
+            loader: Fonction sans argument qui interroge la source
+            ttl (float): Durée de validité en secondes
+            stale_ttl (float): Durée supplémentaire pendant laquelle une valeur expirée est servie et rechargée en arrière-plan
+            cacheable: Indique si une valeur chargée peut être mise en cache (ex. pas les erreurs)
+
+        Returns:
+            La valeur en cache ou chargée
+        """
+        status, value = self._lookup(key)
+        if status == 'miss':
+            value = loader()
+            if cacheable(value):
+                self._store(key, value, ttl, stale_ttl)
+        elif status == 'refresh':
+            threading.Thread(
+                target=self._refresh, args=(key, loader, ttl, stale_ttl, cacheable), daemon=True
+            ).start()
+        return value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float = 0,
+                           cacheable: Callable[[Any], bool] = lambda value: value is not None) -> Any:
+        """
+        Version asynchrone de get_or_load : `loader` est une coroutine, le rechargement
+        d'une valeur expirée est une tâche de la boucle d'événements.
+        """
+        status, value = self._lookup(key)
+        if status == 'miss':
+            value = await loader()
+            if cacheable(value):
+                self._store(key, value, ttl, stale_ttl)
+        elif status == 'refresh':
+            task = asyncio.create_task(self._arefresh(key, loader, ttl, stale_ttl, cacheable))
+            # Référence conservée jusqu'à la fin de la tâche (sinon elle peut être collectée)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    def _lookup(self, key: Hashable) -> tuple:
+        """
+        Recherche une entrée et met à jour les compteurs.
+
+        Returns:
+            tuple: (statut, valeur) ; statut 'hit' (valeur fraîche), 'stale' (expirée, déjà en rechargement),
+                'refresh' (expirée, à recharger par l'appelant) ou 'miss'
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry.stale_until:
+                self._counters['misses'] += 1
+                return 'miss', None
+            self._entries.move_to_end(key)
+            if now < entry.expires_at:
+                self._counters['hits'] += 1
+                return 'hit', entry.value
+            self._counters['stale_hits'] += 1
+            if entry.refreshing:
+                return 'stale', entry.value
+            entry.refreshing = True
+            return 'refresh', entry.value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], ttl: float, stale_ttl: float, cacheable) -> None:
+        """Recharge une entrée expirée (thread d'arrière-plan)"""
+        try:
+            value = loader()
+        except Exception as e:
+            value = None
+            logger.warning(f"Erreur lors du rechargement de {key} : {e}")
+        self._refreshed(key, value, ttl, stale_ttl, cacheable)
+
+    async def _arefresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float, cacheable) -> None:
+        """Recharge une entrée expirée (tâche asyncio)"""
+        try:
+            value = await loader()
+        except Exception as e:
+            value = None
+            logger.warning(f"Erreur lors du rechargement de {key} : {e}")
+        self._refreshed(key, value, ttl, stale_ttl, cacheable)
+
+    def _refreshed(self, key: Hashable, value: Any, ttl: float, stale_ttl: float, cacheable) -> None:
+        with self._lock:
+            self._counters['refreshes'] += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refreshing = False
+        if cacheable(value):
+            self._store(key, value, ttl, stale_ttl)
+        else:
+            with self._lock:
+                self._counters['refresh_errors'] += 1
+
+    def _store(self, key: Hashable, value: Any, ttl: float, stale_ttl: float) -> None:
+        # Taille estimée par la sérialisation JSON de la réponse
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = _Entry(value, size, ttl, stale_ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._counters['evictions'] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Retire une entrée du cache"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self) -> None:
+        """Vide le cache (les compteurs sont conservés)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Compteurs du cache.
+
+        Returns:
+            dict: entrées, taille, hits, stale_hits, misses, évictions, rechargements et taux de réponses servies par le cache
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            entries, size = len(self._entries), self._bytes
+        served = counters['hits'] + counters['stale_hits']
+        total = served + counters['misses']
+        return {
+            'entries': entries,
+            'bytes': size,
+            **counters,
+            'hit_rate': round(served / total, 3) if total else None
+        }